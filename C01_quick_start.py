@@ -2,9 +2,16 @@
 # PromptTemplate：負責生成提示詞（prompt）
 # StrOutputParser：將模型輸出的內容轉為字串
 # Ollama：串接本地模型（例如 gemma）
+# TieredLLMCache：LLM 回應快取，相同的提示詞第二次之後直接回傳，不必再等模型生成
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.globals import set_llm_cache
 from langchain_community.llms import Ollama
+from llm_cache import TieredLLMCache
+
+# 💾 啟用全域 LLM 快取（存在 llm_cache.db）
+# 若想讓「意思相近」的問題也共用答案，可加上 embedding=OllamaEmbeddings(model="nomic-embed-text")
+set_llm_cache(TieredLLMCache())
 
 # 🦙 載入 Ollama 本地模型
 # 使用 gemma 模型（gemma3 是你自定義下載的名稱）
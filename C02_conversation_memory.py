@@ -1,13 +1,14 @@
 from langchain_community.llms import Ollama
 from langchain.chains import ConversationChain
-from langchain.memory import ConversationBufferMemory
+from history_budget import HistoryCompactor, CompactingConversationMemory
 from langchain_core.prompts import PromptTemplate
 
 # 🦙 使用 gemma3 模型
 llm = Ollama(model="gemma3")
 
 # 🧠 建立記憶體，記錄上下文對話
-memory = ConversationBufferMemory(return_messages=True)
+# 📏 載入記憶時依 gemma3 的 token 預算壓縮：保留最近幾輪，較舊的對話改用滾動摘要代替
+memory = CompactingConversationMemory(compactor=HistoryCompactor(llm), return_messages=True)
 
 # ✨ 自訂提示模板：要求用繁體中文回答
 custom_prompt = PromptTemplate.from_template("""
@@ -2,7 +2,8 @@ from langchain.agents import Tool, initialize_agent
 from langchain.agents.agent_types import AgentType
 from langchain.tools import tool
 from langchain_community.llms import Ollama
-import math
+from safe_calc import evaluate, format_number, normalize_expression
+from tool_cache import ToolCache, run_agent
 
 # 🦙 使用 Ollama 模型（gemma3）
 llm = Ollama(model="gemma3")
@@ -12,9 +13,9 @@ llm = Ollama(model="gemma3")
 def square_root(x: str) -> str:
     """計算一個數字的平方根"""
     try:
-        clean_x = x.strip().replace("'", "").replace('"', '')
-        return str(math.sqrt(float(clean_x)))
-    except:
+        # 🧮 以安全的算式引擎解析輸入（會去掉引號，也接受像 12*12 這樣的算式），解析結果有快取
+        return format_number(evaluate(f"sqrt({normalize_expression(x)})"))
+    except (ValueError, ArithmeticError, TypeError):
         return "請提供一個數字"
 
 # 📦 建立工具清單（也可以加上其他工具）
@@ -22,14 +23,19 @@ tools = [
     Tool.from_function(func=square_root, name="Square Root", description="計算數字的平方根")
 ]
 
+# 🧰 工具結果快取：同樣的輸入只計算一次，平方根的結果不會變，跨執行保留 30 天
+tool_cache = ToolCache(ttls={"Square Root": 30 * 24 * 3600})
+
 # 🤖 建立 Agent，並設定成反應式（REACT）模式
 agent = initialize_agent(
-    tools=tools,
+    tools=tool_cache.wrap(tools),
     llm=llm,
     agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
     verbose=True
 )
 
 # 🔍 測試 Agent 問題
-response = agent.invoke("請幫我算出 144 的平方根是多少")
+# 🔁 run_agent 會在 Agent 重複同樣的動作時提早結束，並記錄每一步工具的耗時
+response = run_agent(agent, "請幫我算出 144 的平方根是多少", tool_cache)
 print("回應：", response)
+print("🧰 工具呼叫紀錄：", tool_cache.steps)
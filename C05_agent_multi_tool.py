@@ -1,7 +1,9 @@
 from langchain.agents import Tool, initialize_agent, AgentType
 from langchain_community.llms import Ollama
 from langchain.tools import tool
-import math
+from safe_calc import evaluate, format_number, normalize_expression
+from tool_cache import ToolCache, run_agent
+from parallel_agent import ParallelToolAgent
 
 # 🧠 模型（請根據你本地支援的 Ollama 模型改名）
 llm = Ollama(model="gemma3")
@@ -11,9 +13,9 @@ llm = Ollama(model="gemma3")
 def square_root(x: str) -> str:
     """計算輸入數字的平方根"""
     try:
-        clean_x = x.strip().replace('"', '').replace("'", '')
-        return str(math.sqrt(float(clean_x)))
-    except:
+        # 🧮 以安全的算式引擎解析輸入（會去掉引號，也接受像 12*12 這樣的算式），解析結果有快取
+        return format_number(evaluate(f"sqrt({normalize_expression(x)})"))
+    except (ValueError, ArithmeticError, TypeError):
         return "請提供一個正確的數字"
 
 # 🛠 自訂工具 2：假裝搜尋工具（這裡先模擬，日後可整合 Google/Bing API）
@@ -30,16 +32,31 @@ tools = [
     Tool.from_function(func=fake_search, name="Search", description="搜尋常識問題")
 ]
 
+# 🧰 工具結果快取：平方根跨執行保留 30 天，搜尋結果保留 1 小時
+tool_cache = ToolCache(ttls={"Square Root": 30 * 24 * 3600, "Search": 3600})
+
 # 🤖 建立 Agent（使用 ReAct 模式）
 agent = initialize_agent(
-    tools=tools,
+    tools=tool_cache.wrap(tools),
     llm=llm,
     agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
     verbose=True
 )
 
 # 🔍 測試
-response = agent.invoke("請問144的平方根是多少？")
+response = run_agent(agent, "請問144的平方根是多少？", tool_cache)
 print("平方根結果：", response)
-response = agent.invoke("蘋果創辦人是誰？")
+response = run_agent(agent, "蘋果創辦人是誰？", tool_cache)
 print("搜尋結果：", response)
+
+# ⚡ 並行工具模式：模型可以在同一步列出多個互不相關的工具呼叫，一起執行後再回到 LLM
+# 兩個子問題只需要兩次 LLM 來回（一次決定動作、一次整理答案），而不是四次
+parallel_agent = ParallelToolAgent(
+    llm=llm,
+    tools=tool_cache.wrap(tools),
+    tool_timeouts={"Search": 10},  # 搜尋工具最多等 10 秒
+    tool_cache=tool_cache
+)
+response = parallel_agent.invoke("請問144的平方根是多少？另外蘋果創辦人是誰？")
+print("並行結果：", response["output"], f"（LLM 呼叫 {response['llm_calls']} 次）")
+print("🧰 工具快取統計：", tool_cache.stats())
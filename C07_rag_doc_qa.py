@@ -1,40 +1,47 @@
-from langchain_community.document_loaders import TextLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
 from langchain_ollama import OllamaLLM, OllamaEmbeddings
-from langchain.chains import RetrievalQA
+from embedding_cache import CachedEmbeddings
+from batch_embeddings import BatchedEmbeddings
+from rag_index import IncrementalIndex
+from mmr import as_mmr_retriever
+from streaming_qa import StreamingRetrievalQA
 from langchain_community.llms import Ollama
+from langchain_core.globals import set_llm_cache
+from llm_cache import TieredLLMCache
 
-# 1️⃣ 讀取文件
-loader = TextLoader("reference.txt", encoding="utf-8")
-documents = loader.load()
+# 💾 啟用 LLM 回應快取：相同的問題（含檢索到的段落）不必再等模型重新生成
+set_llm_cache(TieredLLMCache())
 
-# 2️⃣ 文件切割
+# 1️⃣ 設定文件切割方式
 text_splitter = RecursiveCharacterTextSplitter(
     chunk_size=600,
     chunk_overlap=100,
     add_start_index=True
 )
-docs = text_splitter.split_documents(documents)
 
-# 3️⃣ 建立向量資料庫（改成 Chroma）
-embedding = OllamaEmbeddings(model="nomic-embed-text")
-vectorstore = Chroma.from_documents(docs, embedding)
+# 2️⃣ 建立向量資料庫（持久化的 Chroma，只重新處理有變動的檔案）
+# 🗃️ 外層包一層嵌入快取，重新執行時不必重算沒有變動的段落
+# 🚚 快取沒命中的段落再以批次、並行的方式送給 Ollama
+embedding = CachedEmbeddings(BatchedEmbeddings(OllamaEmbeddings(model="nomic-embed-text")))
+index = IncrementalIndex(embedding, text_splitter, collection_name="reference_qa")
+print("📚 索引同步結果：", index.sync(["reference.txt"]))
+vectorstore = index.vectorstore
+print("🗃️ 嵌入快取統計：", embedding.stats())
 
-# 4️⃣ 啟動 QA 系統
+# 3️⃣ 啟動 QA 系統
 llm = Ollama(model="gemma3")
-retriever = vectorstore.as_retriever(
-    search_type="mmr",  # 多樣性導向
-    search_kwargs={"k": 3}  # 取回3個相關段落以供組合
+# 🎯 向量化 MMR：先取回 fetch_k 個候選，再以多樣性導向挑出 k 個
+retriever = as_mmr_retriever(
+    vectorstore,
+    k=3,  # 取回3個相關段落以供組合
+    fetch_k=20,  # MMR 的候選數量
+    lambda_mult=0.5  # 越接近 1 越重視相關性，越接近 0 越重視多樣性
 )
 
-qa = RetrievalQA.from_chain_type(
-    llm=llm,
-    retriever=retriever,
-    return_source_documents=True
-)
+# 🌊 串流式問答：先列出來源段落，再逐字顯示回答，並記錄首字延遲等指標
+qa = StreamingRetrievalQA(llm=llm, retriever=retriever)
 
-# 5️⃣ 發問
+# 4️⃣ 發問
 queries = [
     "LangChain 是什麼？",
     "LangChain 支援哪些向量資料庫？",
@@ -44,6 +51,15 @@ queries = [
 ]
 for query in queries:
     prompt = f"請用繁體中文回答：{query}"
-    result = qa.invoke({"query": prompt})
     print(f"\n🟦 問題：{query}")
-    print("✅ 回答：", result["result"])
+    for event in qa.stream(prompt):
+        if event["type"] == "sources":
+            print("📄 來源：", "、".join(f"第 {doc.metadata.get('start_index', '?')} 字起" for doc in event["documents"]))
+            print("✅ 回答：", end="", flush=True)
+        elif event["type"] == "token":
+            print(event["text"], end="", flush=True)
+        else:
+            m = event["metrics"]
+            speed = "💾 快取命中" if m["cached"] else f"{m['tokens_per_sec']} tokens/sec"
+            print(f"\n⏱️ 檢索 {m['time_to_retrieval']}s｜首字 {m['time_to_first_token']}s｜{speed}")
+print("\n📊 串流統計：", qa.stats())
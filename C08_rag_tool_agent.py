@@ -1,29 +1,33 @@
-from langchain_community.document_loaders import TextLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
 from langchain_ollama import OllamaEmbeddings, OllamaLLM
 from langchain.agents import initialize_agent, Tool
 from langchain.chains import RetrievalQA
+from embedding_cache import CachedEmbeddings
+from batch_embeddings import BatchedEmbeddings
+from rag_index import IncrementalIndex
+from tool_cache import ToolCache, run_agent
+from parallel_agent import ParallelToolAgent
+from safe_calc import calculator
+from mmr import as_mmr_retriever
 
 # 1️⃣ 建立文件問答系統（RAG） → 我們稍後會把它包裝成一個 Agent 可用的工具 Tool
 
-# 讀取本地參考文件
-loader = TextLoader("reference.txt", encoding="utf-8")
-documents = loader.load()
-
 # 切割成可向量化的小段落
 text_splitter = RecursiveCharacterTextSplitter(chunk_size=600, chunk_overlap=100)
-docs = text_splitter.split_documents(documents)
 
 # 產生文件向量
-embedding = OllamaEmbeddings(model="nomic-embed-text")
-vectorstore = Chroma.from_documents(docs, embedding)
+# 🗃️ 外層包一層嵌入快取，重新執行時不必重算沒有變動的段落
+# 🚚 快取沒命中的段落再以批次、並行的方式送給 Ollama
+embedding = CachedEmbeddings(BatchedEmbeddings(OllamaEmbeddings(model="nomic-embed-text")))
+
+# 讀取本地參考文件並寫入持久化的 Chroma（只有變動的檔案會重新嵌入）
+index = IncrementalIndex(embedding, text_splitter, collection_name="reference_agent")
+index.sync(["reference.txt"])
+vectorstore = index.vectorstore
 
 # 將向量資料庫轉為檢索器
-retriever = vectorstore.as_retriever(
-    search_type="mmr",  # 多樣性優先檢索
-    search_kwargs={"k": 3}
-)
+# 🎯 使用向量化 MMR（多樣性優先檢索），候選數 fetch_k 與 lambda_mult 可調整
+retriever = as_mmr_retriever(vectorstore, k=3, fetch_k=20, lambda_mult=0.5)
 
 # 建立 RAG 問答鏈（給定問題 → 檢索 → 丟給 LLM 回答）
 rag_qa = RetrievalQA.from_chain_type(
@@ -35,16 +39,10 @@ rag_qa = RetrievalQA.from_chain_type(
 # 2️⃣ 建立自定義工具 Tool（例如一個簡單的計算機）
 # 👉 Tool 只是一個帶說明的函式，Agent 能根據描述決定是否使用它
 
-def simple_calculator(query: str) -> str:
-    try:
-        result = eval(query)
-        return f"{query} 的結果是：{result}"
-    except Exception as e:
-        return f"無法計算：{str(e)}"
-
+# 🧮 不使用 eval：算式先解析成 AST，只允許四則運算與 sqrt、pow 等白名單函式，解析結果有 LRU 快取
 calc_tool = Tool(
     name="Calculator",
-    func=simple_calculator,
+    func=calculator,
     description="使用這個工具來解決數學運算問題，例如 '3 + 5 * (2 - 1)'"
 )
 
@@ -60,8 +58,13 @@ rag_tool = Tool(
 # 4️⃣ 建立 Agent 並引入兩個工具：計算機 + 文件問答系統
 # 🧠 Agent 會根據問題內容自動決定使用哪個 Tool（Zero-shot 推理）
 
+# 🧰 工具結果快取：同一題內重複的 RAG 查詢只執行一次；文件問答結果跨執行保留 1 天
+# 📌 快取鍵包含索引版本：reference.txt 或切割設定改變後，舊的回答不會再被使用
+tool_cache = ToolCache(ttls={"Calculator": 30 * 24 * 3600, "RAG_DocQA": 24 * 3600},
+                       versions={"RAG_DocQA": index.version})
+
 agent_executor = initialize_agent(
-    tools=[calc_tool, rag_tool],
+    tools=tool_cache.wrap([calc_tool, rag_tool]),
     llm=OllamaLLM(model="gemma3"),
     agent_type="zero-shot-react-description",
     verbose=True
@@ -77,4 +80,19 @@ questions = [
 
 for q in questions:
     print(f"\n🟦 問題：{q}")
-    print("✅ 回答：", agent_executor.invoke(q))
+    result = run_agent(agent_executor, q, tool_cache)
+    print("✅ 回答：", result["output"])
+    print("⏱️ 工具耗時：", [(s["tool"], s["seconds"], s["source"]) for s in result["tool_steps"]])
+
+# 6️⃣ 並行工具模式：同一步同時查文件與計算，觀察結果合併後再交給 LLM 回答
+parallel_agent = ParallelToolAgent(
+    llm=OllamaLLM(model="gemma3"),
+    tools=tool_cache.wrap([calc_tool, rag_tool]),
+    tool_timeouts={"Calculator": 5, "RAG_DocQA": 60},  # 各工具的逾時秒數
+    tool_cache=tool_cache
+)
+q = "LangChain 的六大模組包括哪些？另外請幫我計算 (15 + 32) * 2 是多少？"
+print(f"\n🟦 問題：{q}")
+result = parallel_agent.invoke(q)
+print("✅ 回答：", result["output"], f"（LLM 呼叫 {result['llm_calls']} 次）")
+print("🧰 工具快取統計：", tool_cache.stats())
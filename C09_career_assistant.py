@@ -1,10 +1,12 @@
 import json
 from typing import List
-from langchain.output_parsers import PydanticOutputParser
 from pydantic import BaseModel, Field
 from langchain.prompts import ChatPromptTemplate
 from langchain_ollama import OllamaLLM
 
+from prompt_compiler import compile_prompt
+from structured_stream import StructuredStreamer
+
 # 定義求職建議格式
 class JobAdvice(BaseModel):
     suggested_roles: List[str] = Field(description="建議的職位名稱")
@@ -15,22 +17,30 @@ class JobAdvice(BaseModel):
 # 建立模型
 llm = OllamaLLM(model="gemma3")
 
-# 建立輸出內容解析器（將模型回應解析為 Pydantic 結構）
-parser = PydanticOutputParser(pydantic_object=JobAdvice)
-format_instructions = parser.get_format_instructions()
-
 # 建立 Prompt 模板，包含 system 訊息與使用者查詢，並嵌入格式說明
-prompt = ChatPromptTemplate.from_messages([
+# compile_prompt：模板預先解析，StructuredStreamer 代入的格式說明會直接寫進固定文字，之後每次只需代入 {query}
+prompt = compile_prompt(ChatPromptTemplate.from_messages([
     ("system", "你是一位職涯顧問，請根據使用者興趣給出個人化的求職建議，並以繁體中文回應。\n{format_instructions}"),
     ("human", "{query}")
-])
-final_prompt = prompt.partial(format_instructions=format_instructions)
+]))
+
+# ⚡ 串流式結構化輸出：格式說明只產生一次並快取，模型邊生成邊解析，欄位一出現就先顯示
+# 格式有誤時先在本機修復（多餘的逗號、```json 區塊、字串與清單互轉），最後才請模型重寫
+streamer = StructuredStreamer(prompt, llm, JobAdvice)
 
-# 將使用者查詢代入 Prompt，生成完整提示內容
 query = "我對利用物聯網、無人機、網路應用程式開發與AI資料分析技術應用於農業發展有興趣"
-formatted_prompt = final_prompt.invoke({"query": query})
+filled = set()
+for event in streamer.stream({"query": query}):
+    if event["type"] == "partial":
+        # 已經生成完的欄位（後面又出現了下一個欄位）才顯示，表單可以先填入這些欄位
+        done = list(event["data"])[:-1]
+        for field in done:
+            if field not in filled:
+                filled.add(field)
+                print(f"📝 {field}：{event['data'][field]}")
+    else:
+        response = event["result"]
+        if event["repaired"]:
+            print("🔧 模型輸出格式有誤，已" + ("請模型重寫" if event["reasked"] else "在本機修復"))
 
-# # 建立 LangChain 流程鏈：Prompt → 模型 → 輸出解析
-chain = final_prompt | llm | parser
-response = chain.invoke(formatted_prompt)
-print(json.dumps(response.dict(), ensure_ascii=False, indent=2))
+print(json.dumps(response.model_dump(), ensure_ascii=False, indent=2))
@@ -2,31 +2,40 @@ from langchain.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_ollama import OllamaLLM
 from langchain_core.runnables import RunnableParallel
+from parallel_batch import FanOutBatchRunner
+import asyncio
+from langchain_core.globals import set_llm_cache
+from llm_cache import TieredLLMCache
+from prompt_compiler import compile_prompt
+
+# 💾 啟用 LLM 回應快取：同一部電影的五個子問題再查一次時，直接從快取回傳
+set_llm_cache(TieredLLMCache())
 
 # ✅ 建立模型與字串解析器
 llm = OllamaLLM(model="gemma3")
 str_parser = StrOutputParser()
 
 # ✅ 各個子任務的 PromptTemplate + Chain
+# 🧩 compile_prompt：模板預先解析成固定文字與變數欄位，同一部電影的提示詞直接從快取取得，不必每次重新渲染
 
 # 查詢電影上映年份
-year_prompt = ChatPromptTemplate.from_template("請問電影《{movie}》是在哪一年上映的？")
+year_prompt = compile_prompt(ChatPromptTemplate.from_template("請問電影《{movie}》是在哪一年上映的？"))
 find_year_chain = year_prompt | llm | str_parser
 
 # 查詢導演
-director_prompt = ChatPromptTemplate.from_template("請問電影《{movie}》的導演是誰？")
+director_prompt = compile_prompt(ChatPromptTemplate.from_template("請問電影《{movie}》的導演是誰？"))
 find_director_chain = director_prompt | llm | str_parser
 
 # 查詢主要演員
-actors_prompt = ChatPromptTemplate.from_template("電影《{movie}》的主要演員有哪些？")
+actors_prompt = compile_prompt(ChatPromptTemplate.from_template("電影《{movie}》的主要演員有哪些？"))
 find_actors_chain = actors_prompt | llm | str_parser
 
 # 查詢電影類型
-genre_prompt = ChatPromptTemplate.from_template("請問電影《{movie}》屬於哪一種類型？")
+genre_prompt = compile_prompt(ChatPromptTemplate.from_template("請問電影《{movie}》屬於哪一種類型？"))
 find_genre_chain = genre_prompt | llm | str_parser
 
 # 查詢簡短劇情
-summary_prompt = ChatPromptTemplate.from_template("請簡要介紹電影《{movie}》的劇情")
+summary_prompt = compile_prompt(ChatPromptTemplate.from_template("請簡要介紹電影《{movie}》的劇情"))
 find_summary_chain = summary_prompt | llm | str_parser
 
 # ✅ 合併為一個 Parallel Chain
@@ -42,3 +51,17 @@ movie_info_chain = RunnableParallel(
 result = movie_info_chain.invoke({"movie": "天能"})
 for key, value in result.items():
     print(f"{key.upper()}:\n{value}\n")
+
+# ✅ 批次模式：一次查詢整份片單
+# 所有子鏈共用最多 4 個並行請求，gemma3 每秒最多 4 個請求；每部電影查完就先印出來
+runner = FanOutBatchRunner(movie_info_chain, max_concurrency=4, rate_limits={"gemma3": 4})
+movies = ["天能", "全面啟動", "星際效應", "天能"]  # 重複的電影會直接使用快取的子結果
+
+async def print_catalogue():
+    async for index, inputs, info in runner.astream([{"movie": m} for m in movies]):
+        print(f"🎬 《{inputs['movie']}》（第 {index + 1} 部）")
+        for key, value in info.items():
+            print(f"{key.upper()}:\n{value}\n")
+
+asyncio.run(print_catalogue())
+print("📊 批次統計：", runner.stats)
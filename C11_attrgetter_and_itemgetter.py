@@ -3,20 +3,22 @@ from langchain_core.output_parsers import StrOutputParser
 from langchain_ollama import OllamaLLM
 from langchain_core.runnables import RunnableParallel
 
+from prompt_compiler import compile_prompt
+
 llm = OllamaLLM(model="gemma3")
 # 建立模型與文字解析器
 str_parser = StrOutputParser()
 
-# 建立針對「國家」的提詞模板與處理流程
-country_template = ChatPromptTemplate.from_template('{city} 位於哪一個國家？')
+# 建立針對「國家」的提詞模板與處理流程（compile_prompt：預先解析模板，相同城市的提示詞直接從快取取得）
+country_template = compile_prompt(ChatPromptTemplate.from_template('{city} 位於哪一個國家？'))
 find_country_chain = country_template | llm | str_parser
 
 # 建立針對「語言」的提詞模板與處理流程
-lang_template = ChatPromptTemplate.from_template('在 {city} 講哪一種語言？')
+lang_template = compile_prompt(ChatPromptTemplate.from_template('在 {city} 講哪一種語言？'))
 find_lang_chain = lang_template | llm | str_parser
 
 # 建立摘要用的提示模板，將前兩個鏈的輸出填入 {country} 和 {lang}
-summary_template = ChatPromptTemplate.from_template('{country}{lang}')
+summary_template = compile_prompt(ChatPromptTemplate.from_template('{country}{lang}'))
 
 # 建立一條新的鏈：先執行兩條鏈（國家與語言），再把結果帶入 summary_template 組成提示
 summary_chain = (
@@ -1,21 +1,17 @@
+import os
+
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_ollama import OllamaLLM
-from langchain_core.runnables import RunnableLambda, RunnableBranch
+from langchain_ollama import OllamaEmbeddings, OllamaLLM
+from langchain_core.runnables import RunnableLambda
+
+from embedding_cache import CachedEmbeddings
+from fake_models import HashingEmbeddings
+from semantic_router import SemanticRouter
 
 llm = OllamaLLM(model="gemma3")
 parser = StrOutputParser()
 
-# 任務分類器：依關鍵字分類
-task_classifier = RunnableLambda(lambda x: {
-    "question": x["question"].strip(),
-    "task": (
-        "translate" if any(k in x["question"] for k in ["翻譯", "英文", "translate"])
-        else "explain" if any(k in x["question"] for k in ["解釋", "意思", "代表"])
-        else "default"
-    )
-})
-
 # 各類任務 Prompt 模板
 translate_prompt = ChatPromptTemplate.from_messages([("system", "你是翻譯助手，只輸出英文翻譯結果。"), ("human", "{question}")])
 explain_prompt = ChatPromptTemplate.from_messages([("system", "你是知識助理，用繁體中文解釋。"), ("human", "{question}")])
@@ -26,17 +22,33 @@ translate_chain = translate_prompt | llm | parser
 explain_chain = explain_prompt | llm | parser
 default_chain = default_prompt | llm | parser
 
-# 分支處理邏輯
-task_router = RunnableBranch(
-    (lambda x: x["task"] == "translate", translate_chain),
-    (lambda x: x["task"] == "explain", explain_chain),
-    default_chain
-)
+# 🧭 以嵌入向量分類任務：每條路線只需要幾個範例問題，新增路線就是多給一組範例
+# 比關鍵字判斷準確（「這句用英文怎麼說」「黑洞是什麼」不必寫到關鍵字），路由結果有快取，分派是 dict 查詢
+# 不想啟動嵌入模型時，可設定 ROUTER_EMBEDDING=hashing 改用 fake_models.py 的確定性雜湊嵌入
+if os.environ.get("ROUTER_EMBEDDING") == "hashing":
+    embedding = HashingEmbeddings()
+else:
+    embedding = CachedEmbeddings(OllamaEmbeddings(model="nomic-embed-text"))
+
+task_router = SemanticRouter(embedding, default=default_chain, threshold=0.1)
+task_router.add_route("translate", [
+    "幫我翻譯這句話：今天天氣很好", "把這段文字翻成英文", "這句話的英文怎麼說", "請翻譯成英文：我喜歡貓",
+    "translate this sentence into English", "用英文怎麼講「謝謝你的幫忙」", "幫我改寫成英文版本", "英譯：早安",
+], translate_chain)
+task_router.add_route("explain", [
+    "請解釋一下什麼是量子糾纏", "這個成語是什麼意思", "區塊鏈代表什麼", "什麼是機器學習？",
+    "為什麼天空是藍色的", "幫我說明光合作用的原理", "通貨膨脹是怎麼回事", "API 的定義是什麼",
+], explain_chain)
+# 預設路線也給範例，「推薦英文電影」這類問題才不會只因為提到英文就被分到翻譯
+task_router.add_route("default", [
+    "你推薦什麼電影？", "今天晚餐吃什麼好", "幫我寫一首詩", "跟我聊聊天吧", "推薦幾本好看的小說", "週末去哪裡玩比較好",
+], default_chain)
 
-# 總流程：分類 → 分支
-chain = task_classifier | task_router
+# 總流程：整理輸入 → 分類並直接執行對應的 chain
+chain = RunnableLambda(lambda x: {"question": x["question"].strip()}) | task_router.as_runnable()
 
 # 測試
 print("【翻譯例子】", chain.invoke({"question": "幫我翻譯這句話：我很喜歡打電動"}))
 print("【解釋例子】", chain.invoke({"question": "請解釋一下什麼是量子糾纏"}))
 print("【其他例子】", chain.invoke({"question": "你推薦什麼電影？"}))
+print("🧭 路由統計：", task_router.stats)
@@ -1,43 +1,65 @@
+import os
+
 from langchain_core.runnables import ConfigurableField
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import PromptTemplate, ChatPromptTemplate
 from langchain_ollama import OllamaLLM
 
-# 定義三種 Prompt 模板
-prompt = PromptTemplate.from_template("用繁體中文像朋友聊天回應我這段話：{topic}").configurable_alternatives(
+from model_pool import ModelPool
+from prompt_compiler import compile_prompt
+
+KEEP_ALIVE = "30m"
+
+# 定義三種 Prompt 模板（compile_prompt：每個組合的模板只解析一次，相同話題的提示詞直接從快取取得）
+prompt = compile_prompt(PromptTemplate.from_template("用繁體中文像朋友聊天回應我這段話：{topic}")).configurable_alternatives(
     ConfigurableField(id="prompt", name="Prompt", description="提詞組合"),
     default_key="friendly",
-    formal=PromptTemplate.from_template("用繁體中文正式地回應我這段話：{topic}"),
-    wiseman=ChatPromptTemplate.from_messages([
+    formal=compile_prompt(PromptTemplate.from_template("用繁體中文正式地回應我這段話：{topic}")),
+    wiseman=compile_prompt(ChatPromptTemplate.from_messages([
         ("system", "你是一個睿智的老人"),
         ("human", "用說故事的方式，用繁體中文回應我的這段話：{topic}")
-    ]),
+    ])),
 )
 
 # 定義三種 Ollama 模型（gemma3、llama3 和 mistral）
-llm = OllamaLLM(model="gemma3").configurable_alternatives(
+# keep_alive：用完後讓模型繼續常駐 30 分鐘（預設 5 分鐘就卸載，下次切回來又要冷啟動）
+llm = OllamaLLM(model="gemma3", keep_alive=KEEP_ALIVE).configurable_alternatives(
     ConfigurableField(id="llm", name="LLM", description="語言模型"),
     default_key="gemma3",
-    llama3=OllamaLLM(model="llama3"),
-    mistral=OllamaLLM(model="mistral")
+    llama3=OllamaLLM(model="llama3", keep_alive=KEEP_ALIVE),
+    mistral=OllamaLLM(model="mistral", keep_alive=KEEP_ALIVE)
 )
 
+# 🔥 模型常駐池：追蹤哪些模型已載入，啟動時先預熱預設模型，並記錄載入與切換的延遲
+# max_resident 對應 Ollama 能同時常駐的模型數（OLLAMA_MAX_LOADED_MODELS，實際受顯示記憶體限制）
+pool = ModelPool({"gemma3": "gemma3", "llama3": "llama3", "mistral": "mistral"}, keep_alive=KEEP_ALIVE,
+                 max_resident=int(os.environ.get("OLLAMA_MAX_LOADED_MODELS", 1)))
+print("🔥 預熱模型：", pool.warm(["gemma3"]))
+
 # 串接整個 chain：Prompt → LLM → Parser
 chain = prompt | llm | StrOutputParser()
 
 # 測試預設組合（friendly + gemma3）
-print("🟢 預設組合（friendly + gemma3）：", chain.invoke({"topic": "請問如何規劃人生方向？"}))
+print("🟢 預設組合（friendly + gemma3）：", pool.invoke(chain, "gemma3", {"topic": "請問如何規劃人生方向？"}))
 
 # 測試：改成 formal + llama3
-chain_custom = chain.with_config(configurable={
-    "prompt": "formal",
-    "llm": "llama3"
-})
-print("\n🔵 切換組合（ formal + llama3 ）：", chain_custom.invoke({"topic": "請問如何規劃人生方向？"}))
+# 模型改由 pool 指定（與這裡的 configurable 合併），才能記錄切換的延遲
+chain_custom = chain.with_config(configurable={"prompt": "formal"})
+print("\n🔵 切換組合（ formal + llama3 ）：", pool.invoke(chain_custom, "llama3", {"topic": "請問如何規劃人生方向？"}))
 
 # 測試：改成 wiseman + mistral
-chain_custom = chain.with_config(configurable={
-    "prompt": "wiseman",
-    "llm": "mistral"
-})
-print("\n🔵 切換組合（ wiseman + mistral ）：", chain_custom.invoke({"topic": "請問如何規劃人生方向？"}))
+chain_custom = chain.with_config(configurable={"prompt": "wiseman"})
+print("\n🔵 切換組合（ wiseman + mistral ）：", pool.invoke(chain_custom, "mistral", {"topic": "請問如何規劃人生方向？"}))
+
+# ⚡ 混合不同模型的多個請求：依模型分組，每個模型只切換一次，結果仍依原本的順序回傳
+jobs = [
+    ("gemma3", {"topic": "今天工作好累"}),
+    ("llama3", {"topic": "該不該換工作？"}),
+    ("gemma3", {"topic": "推薦一本書"}),
+    ("mistral", {"topic": "怎麼開始學寫程式？"}),
+    ("llama3", {"topic": "週末要做什麼？"}),
+]
+for (key, inputs), answer in zip(jobs, pool.batch(chain, jobs)):
+    print(f"\n🟣 {key}｜{inputs['topic']}：{answer}")
+
+print("\n📊 模型切換統計：", pool.metrics())
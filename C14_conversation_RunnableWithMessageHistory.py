@@ -1,16 +1,24 @@
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_core.output_parsers import StrOutputParser
-from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain_ollama import ChatOllama
+from session_store import SessionStore, BoundedChatMessageHistory
+from history_budget import HistoryCompactor
 
-# 模擬簡單的記憶儲存系統（以 dict 暫存）
-memory_store = {}
+# 記憶儲存系統：有上限的 session 儲存區（取代無限成長的 dict）
+# - 最多 1000 個 session（LRU），閒置 30 分鐘就淘汰，被淘汰的 session 會寫入 session_store.db，之後可再載回
+# - 每個 session 最多保留 100 則訊息、約 8000 個 token，超過時從最舊的對話開始裁切
+memory_store = SessionStore(
+    max_sessions=1000,
+    idle_ttl=30 * 60,
+    max_messages=100,
+    max_tokens=8000,
+    spill_path="session_store.db",
+)
+memory_store.start_sweeper(interval=60)  # 🧹 背景每分鐘淘汰閒置的 session
 
-def get_session_history(session_id: str) -> ChatMessageHistory:
-    if session_id not in memory_store:
-        memory_store[session_id] = ChatMessageHistory()
-    return memory_store[session_id]
+def get_session_history(session_id: str) -> BoundedChatMessageHistory:
+    return memory_store.get(session_id)
 
 # 建立 Prompt 模板（含歷史訊息插槽）
 prompt = ChatPromptTemplate.from_messages([
@@ -23,8 +31,12 @@ prompt = ChatPromptTemplate.from_messages([
 llm = ChatOllama(model="gemma3")
 parser = StrOutputParser()
 
+# 歷史壓縮：送進 prompt 前，把 history 壓縮到 gemma3 的 token 預算內
+# 保留最近的對話，較舊的對話改用快取的滾動摘要代替，每一輪的 prompt 長度因此大致固定
+compactor = HistoryCompactor(llm)
+
 # 建立可串接記憶的對話 chain
-chain = prompt | llm | parser
+chain = compactor.as_runnable() | prompt | llm | parser
 
 chain_with_history = RunnableWithMessageHistory(
     chain,
@@ -1,19 +1,23 @@
 # ✅ 載入 LangChain 所需模組
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_community.chat_message_histories import SQLChatMessageHistory
+from sql_history import WindowedSQLChatMessageHistory, list_sessions
 from langchain.memory import ConversationSummaryBufferMemory
 from langchain.chains import ConversationChain
 from langchain_ollama import OllamaLLM
 from langchain.prompts import PromptTemplate
-import sqlite3
-from langchain.chains.summarize import load_summarize_chain
-from langchain_core.documents import Document
+from incremental_summary import IncrementalSummarizer
 from langchain_core.runnables import RunnableLambda
 from operator import itemgetter
 
 # ✅ 初始化本地Ollama模型
 llm = OllamaLLM(model="gemma3")
 
+# ✅ 對話紀錄資料庫設定
+DB_URL = "sqlite:///historyMemory.db"
+HISTORY_TABLE = "chat_memory"
+HISTORY_WINDOW = 40  # ⬅️ 記憶只載入最近 40 則訊息，對話再長載入時間也固定
+HISTORY_PAGE = 20    # ⬅️ /歷史 指令一次顯示的訊息數
+
 # ✅ 建立「對話摘要」的提示模板
 # 🔍 這段 prompt 會在每次記憶更新時使用，幫我們把舊摘要與新對話一起傳給模型，再由模型輸出新的摘要
 summary_prompt = ChatPromptTemplate.from_template(
@@ -30,10 +34,12 @@ def create_chain(assistant):
     ])
 
     # 🔍 建立 SQLite 聊天記憶資料庫，依據助理名稱儲存每段對話
-    history_db = SQLChatMessageHistory(
+    # 🔍 使用可分頁讀取的版本：有 (session_id, id) 索引，只讀取最近 HISTORY_WINDOW 則訊息
+    history_db = WindowedSQLChatMessageHistory(
         session_id=assistant,
-        connection_string='sqlite:///historyMemory.db',
-        table_name="chat_memory"
+        connection=DB_URL,
+        table_name=HISTORY_TABLE,
+        window_size=HISTORY_WINDOW
     )
 
     # 🔍 使用 ConversationSummaryBufferMemory：將舊對話自動濃縮摘要，保留核心內容
@@ -45,52 +51,36 @@ def create_chain(assistant):
         max_token_limit=1000  # ⬅️ 可控制摘要長度（視模型支援度調整）
     )
 
-    # 🔍 判斷是否已經有摘要記憶，若沒有且有舊對話記錄，則第一次手動建立摘要
-    current_summary = memory.load_memory_variables({}).get("history", "")
-    if not current_summary:
-        messages = history_db.messages
-        if messages:
-            summary_text = summarize_existing_history(messages)
-            memory.moving_summary_buffer = summary_text  # ⬅️ 填入記憶摘要
-            print(f"🧠 從歷史資料中產生摘要如下：\n{summary_text}\n")
-        else:
-            print("🧠 尚無記憶紀錄，這是你們的第一次對話。\n")
+    # 🔍 從摘要檢查點接續：只把上次摘要之後的新訊息折疊進摘要（一次小的 LLM 呼叫）
+    if history_db.message_count():
+        summary_text = refresh_summary(memory)
+        print(f"🧠 從歷史資料中產生摘要如下：\n{summary_text}\n")
+    else:
+        print("🧠 尚無記憶紀錄，這是你們的第一次對話。\n")
 
     return chat_prompt, memory
 
 # ✅ 顯示所有曾經建立過記憶的助理名稱
+# 🔍 直接讀取 chat_memory_sessions 表（每個助理一列），不必掃描整張對話表
 def list_assistants():
-    conn = sqlite3.connect("historyMemory.db")
-    cursor = conn.cursor()
-    try:
-        cursor.execute("SELECT DISTINCT session_id FROM chat_memory")
-        assistants = [row[0] for row in cursor.fetchall()]
-    except sqlite3.OperationalError:
-        assistants = []  # ⬅️ 若表格尚未建立，回傳空陣列
-    conn.close()
-    return assistants
+    return list_sessions(DB_URL, HISTORY_TABLE)
 
 # ✅ 自訂中文摘要的 Prompt 模板
 custom_stuff_prompt = PromptTemplate.from_template(
     "你是一個善於中文總結的助理。請閱讀以下對話內容，並用繁體中文簡要總結出對話的重點：\n\n{text}\n\n繁體中文摘要："
 )
 
-# ✅ 將整段舊對話進行摘要（只用於第一次建立記憶）
-def summarize_existing_history(messages):
-    if not messages:
-        return ""
-    
-    # 🔍 將歷史訊息合併為文字，每句開頭加上角色名稱
-    text = "\n\n".join([f"{'使用者' if m.type == 'human' else '助理'}：{m.content}" for m in messages])
-    docs = [Document(page_content=text)]
-
-    # 🔍 使用 summarize chain 加上我們自定的繁體中文提示
-    summarize_chain = load_summarize_chain(
-        llm=llm,
-        chain_type="stuff",
-        prompt=custom_stuff_prompt
-    )
-    return summarize_chain.run(docs)
+# ✅ 增量式摘要器：摘要檢查點（摘要 + 最後一則訊息 id）存在 chat_memory_summaries 表
+# 🔍 新訊息不多時用 summary_prompt 折疊進舊摘要；積壓太多時改用 custom_stuff_prompt 做 map-reduce
+summarizer = IncrementalSummarizer(llm, update_prompt=summary_prompt, chunk_prompt=custom_stuff_prompt)
+
+# ✅ 更新摘要記憶，並讓記憶只載入檢查點之後的訊息
+def refresh_summary(memory):
+    history_db = memory.chat_memory
+    summary_text = summarizer.summarize(history_db)
+    memory.moving_summary_buffer = summary_text  # ⬅️ 填入記憶摘要
+    history_db.since_id = history_db.get_summary_checkpoint()[1]
+    return summary_text
 
 # ✅ 主程式開始（互動入口）
 if __name__ == "__main__":
@@ -136,21 +126,20 @@ if __name__ == "__main__":
         if not msg.strip():
             break
 
-        # 🔍 若輸入 /記憶，強制重新摘要對話內容
+        # 🔍 若輸入 /記憶，把上次摘要之後的新對話折疊進摘要記憶
         if msg.strip() == "/記憶":
-            messages = memory.chat_memory.messages
-            if messages:
-                summary_text = summarize_existing_history(messages)
-                memory.moving_summary_buffer = summary_text  # 更新摘要記憶
+            if memory.chat_memory.message_count():
+                summary_text = refresh_summary(memory)
                 print(f"\n🧠 已更新摘要記憶內容如下：\n{summary_text}\n")
             else:
                 print("\n🧠 (目前尚無摘要記憶)\n")
             continue
 
-        # 🔍 若輸入 /歷史，顯示所有歷史對話訊息
+        # 🔍 若輸入 /歷史，顯示最近 HISTORY_PAGE 則歷史對話訊息
         if msg.strip() == "/歷史":
-            print("\n🗂️ SQLite 對話歷史：")
-            for message in memory.chat_memory.messages:
+            total = memory.chat_memory.message_count()
+            print(f"\n🗂️ SQLite 對話歷史（最近 {min(total, HISTORY_PAGE)} / 共 {total} 則）：")
+            for message in memory.chat_memory.get_last_messages(HISTORY_PAGE):
                 role = "🧑‍🦱 使用者" if message.type == "human" else "🤖 助理"
                 print(f"{role}：{message.content}")
             print()
@@ -8,6 +8,7 @@ from langchain_community.tools import DuckDuckGoSearchRun
 from langchain_core.prompts import PromptTemplate, ChatPromptTemplate
 from langchain_community.llms import Ollama  # 或使用 OpenAI
 import os
+from tool_cache import ToolCache, run_agent
 
 # ✅ 初始化 LLM（這裡用本地 Ollama 模型）
 llm = Ollama(model="gemma3")
@@ -24,9 +25,12 @@ tools = [
     )
 ]
 
+# 🧰 搜尋結果快取（唯一的一層）：同一次執行內重複的搜尋只查一次，跨執行保留 10 分鐘（新聞類資訊不宜保留太久）
+tool_cache = ToolCache(ttls={"duckduckgo_search": 10 * 60})
+
 # ✅ 建立 Agent
 agent = initialize_agent(
-    tools=tools,
+    tools=tool_cache.wrap(tools),
     llm=llm,
     agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
     handle_parsing_errors=True,
@@ -35,5 +39,6 @@ agent = initialize_agent(
 
 # ✅ 測試提問
 question = "台灣 2025 年金曲獎獲獎人？請將所有的獎項與獲獎人整理成表格"
-response = agent.run(question)
+# 🔁 Agent 重複同樣的搜尋時提早結束，直接使用已取得的搜尋結果
+response = run_agent(agent, question, tool_cache)["output"]
 print(f"\n🤖 AI 回應：\n{response}")
@@ -1,19 +1,30 @@
-import requests
+import os
+import sys
 from langchain_ollama import OllamaLLM
 from langchain.tools import StructuredTool
 from pydantic import BaseModel, Field
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda
+from http_runtime import EndpointPolicy, http_runtime
+from weather_bulk import WeatherPrefetcher, summarize_counties, trim_weather
 
 # 定義輸入格式（使用 Pydantic）
 class Weather(BaseModel):
     city: str = Field(description="台灣縣市, 使用繁體中文")  # 使用者需要輸入的城市名稱
 
+# 天氣 API 網址（Google Apps Script）；測試時可用環境變數指向 ollama_stub.py 的 /weather
+WEATHER_API_URL = os.environ.get(
+    "WEATHER_API_URL",
+    "https://script.google.com/macros/s/AKfycbwIZI5Ha9vOhq3fACslYwnhFPM8pM3Dlb5R7l8aorSTyQiO8JVG56G_rYr60YbdvNs4/exec",
+)
+# 🌐 共用連線池：天氣資料 10 分鐘內有效，連線 3 秒、讀取 15 秒逾時，失敗重試 2 次
+http_runtime.set_policy(WEATHER_API_URL, EndpointPolicy(timeout=(3.05, 15), retries=2, ttl=10 * 60))
+
 # 定義取得天氣的函式，透過 Google Apps Script API 擷取資料
-def get_weather(city: str):
-    API_URL = f"https://script.google.com/macros/s/AKfycbwIZI5Ha9vOhq3fACslYwnhFPM8pM3Dlb5R7l8aorSTyQiO8JVG56G_rYr60YbdvNs4/exec?city={city}"
-    response = requests.get(API_URL)  # 送出 HTTP GET 請求
-    return response.json()  # 回傳 JSON 格式的天氣資料
+def get_weather(city: str, refresh: bool = False):
+    # 同一縣市 10 分鐘內只會真正呼叫一次 API，同時間的相同查詢也會合併成一次
+    return http_runtime.get_json(WEATHER_API_URL, params={"city": city}, refresh=refresh)  # 回傳 JSON 格式的天氣資料
 
 # ✅ 初始化本地 Ollama 模型（例如 gemma3）
 llm = OllamaLLM(model="gemma3")
@@ -35,10 +46,28 @@ weather_prompt = ChatPromptTemplate.from_template(weather_template)
 
 # ✅ 串接整體 Chain
 # 使用者輸入城市 → 工具取得天氣資料 → 套用提示模板 → 使用 LLM 處理 → 解析為文字
-chain = ({"weather": weather_data}     # 使用 tool 回傳資料後代入 prompt
+# ✂️ trim_weather 只保留提示詞需要的欄位，減少送進 LLM 的 token 數
+chain = ({"weather": weather_data | RunnableLambda(trim_weather)}  # 使用 tool 回傳資料後代入 prompt
          | weather_prompt              # 插入到 prompt 模板中
          | llm                         # 交由本地 LLM 產生回應
          | str_parser)                # 輸出純文字結果
 
 # ✅ 呼叫整體 Chain，這裡以「新北市」為例
 print(chain.invoke("臺中市"))
+
+# 📅 全台 22 縣市天氣日報：執行 python C18_weather_API.py --report
+if "--report" in sys.argv:
+    # 1. 同時預取所有縣市的天氣到共用快取，並在背景每 9 分鐘更新一次
+    prefetcher = WeatherPrefetcher(get_weather, max_workers=8)
+    weather_by_city = prefetcher.prefetch()
+    prefetcher.start(interval=9 * 60)
+    if prefetcher.errors:
+        print("⚠️ 查詢失敗的縣市：", prefetcher.errors)
+
+    # 2. 每個縣市一份摘要，一次並行送出（同時最多 4 個請求）
+    report_prompt = ChatPromptTemplate.from_template("請用兩句話摘要{city}今天的天氣與注意事項：{weather}")
+    summaries = summarize_counties(report_prompt | llm | str_parser, weather_by_city, max_concurrency=4)
+    for city, summary in summaries.items():
+        print(f"\n🌤️ {city}：{summary}")
+    print("\n🌐 HTTP 統計：", http_runtime.stats)
+    prefetcher.stop()
@@ -1,51 +1,71 @@
-from langchain_community.document_loaders import PyMuPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
 from langchain_ollama import OllamaLLM, OllamaEmbeddings
-from langchain.chains import RetrievalQA
+from embedding_cache import CachedEmbeddings
+from batch_embeddings import BatchedEmbeddings
+from rag_index import IncrementalIndex
+from streaming_qa import StreamingRetrievalQA
+from langchain_core.globals import set_llm_cache
+from llm_cache import TieredLLMCache
 
-# 1️⃣ 載入 PDF 檔案，這裡是客家幣相關文件 Hakka.pdf
-loader = PyMuPDFLoader("Hakka.pdf")
-documents = loader.load()
-
-# 2️⃣ 切割文件為小區塊，避免 LLM 無法處理過長文本
+# 1️⃣ 切割文件為小區塊，避免 LLM 無法處理過長文本
 # chunk_size：每塊字元上限；chunk_overlap：重疊範圍避免語意斷裂
 text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000,chunk_overlap=100)
-docs = text_splitter.split_documents(documents)
 
-# 3️⃣ 建立向量資料庫，使用 Ollama 本地模型進行嵌入（embedding）
-embedding = OllamaEmbeddings(model="nomic-embed-text")
-vectorstore = Chroma.from_documents(docs, embedding=embedding)
+# ⚠️ PDF 文字抽取會開啟多個子行程（process），在 Windows / macOS 上子行程會重新 import 本檔案
+# 因此主要流程（包含開啟快取資料庫、建立 Ollama 連線）要放在 if __name__ == "__main__": 之內，避免子行程重複執行
+if __name__ == "__main__":
+    # 2️⃣ 建立向量資料庫，使用 Ollama 本地模型進行嵌入（embedding）
+    # 🗃️ 外層包一層嵌入快取（embedding_cache.db），重新執行時只會嵌入新的段落
+    # 🚚 快取沒命中的段落再以批次、並行的方式送給 Ollama
+    embedding = CachedEmbeddings(BatchedEmbeddings(OllamaEmbeddings(model="nomic-embed-text")))
+
+    # 💾 啟用 LLM 回應快取：常見問題重複詢問時直接回傳上次的答案
+    set_llm_cache(TieredLLMCache())
 
-# 4️⃣ 設定本地大型語言模型 LLM，如 gemma3 / llama3 / mistral 等
-llm = OllamaLLM(model="gemma3")
+    # 3️⃣ 載入 PDF 檔案（客家幣相關文件 Hakka.pdf）並同步到持久化的 Chroma
+    # PDF 以頁為單位比對，只有內容變動的頁面才會重新切割與嵌入
+    index = IncrementalIndex(embedding, text_splitter, collection_name="hakka_pdf")
+    print("📚 索引同步結果：", index.sync(["Hakka.pdf"]))
+    vectorstore = index.vectorstore
+    print("🗃️ 嵌入快取統計：", embedding.stats())
 
-# 5️⃣ 建立 Retriever，用於語意相似度搜尋（MMR 可提高多樣性）
-retriever = vectorstore.as_retriever(
-    search_type="mmr",  # 可選 similarity 或 mmr（Maximal Marginal Relevance）
-    search_kwargs={"k": 10}  # 返回前 10 筆最相關段落
-)
+    # 4️⃣ 設定本地大型語言模型 LLM，如 gemma3 / llama3 / mistral 等
+    llm = OllamaLLM(model="gemma3")
 
-# 6️⃣ 使用 RetrievalQA 建立問答系統
-qa = RetrievalQA.from_chain_type(
-    llm=llm,
-    retriever=retriever,
-    return_source_documents=True  # 額外回傳來源段落
-)
+    # 5️⃣ 建立 Retriever：向量檢索 + 中文關鍵字（BM25）混合檢索
+    # 🔤 nomic-embed-text 對中文較弱，原本要取回 10 筆段落才夠；加上關鍵字比對後 5 筆就能涵蓋答案
+    # 兩邊各取 fetch_k 筆候選，再以 Reciprocal Rank Fusion 合併排名，prompt 更短、回答更快
+    retriever = index.as_hybrid_retriever(
+        k=5,  # 返回前 5 筆最相關段落
+        fetch_k=20  # 向量與關鍵字各取 20 筆候選
+    )
 
-# 7️⃣ 發問，模擬使用者輸入
-query = f"請問如何登記客家幣？"
-prompt = f'請以繁體中文回答下列問題：{query}'
+    # 6️⃣ 建立串流式問答系統：先回傳來源段落，再逐字輸出回答
+    qa = StreamingRetrievalQA(llm=llm, retriever=retriever)
 
-# 8️⃣ 執行 QA 查詢流程
-result = qa.invoke({"query": prompt})
+    # 7️⃣ 發問，模擬使用者輸入
+    query = f"請問如何登記客家幣？"
+    prompt = f'請以繁體中文回答下列問題：{query}'
 
-# 9️⃣ 輸出結果
-print("✅ 回答：", result["result"])
+    # 8️⃣ 執行 QA 查詢流程，9️⃣ 邊生成邊輸出結果
+    for event in qa.stream(prompt):
+        if event["type"] == "sources":
+            # 📄 來源段落最先送出，使用者不必等回答生成完才知道依據
+            pages = sorted({doc.metadata.get("page", 0) + 1 for doc in event["documents"]})
+            print("📄 參考頁面：", pages)
+            print("✅ 回答：", end="", flush=True)
+        elif event["type"] == "token":
+            print(event["text"], end="", flush=True)
+        else:
+            m = event["metrics"]
+            speed = "💾 快取命中" if m["cached"] else f"{m['tokens_per_sec']} tokens/sec"
+            print(f"\n⏱️ 檢索 {m['time_to_retrieval']}s｜首字 {m['time_to_first_token']}s｜"
+                  f"總計 {m['total_seconds']}s｜{speed}")
 
 '''
 說明：nomic-embed-text 模型限制與建議
 該模型為英文優化，但具備多語言支援能力（含繁體中文）
 適用於一般文本語意比對與搜尋，但中文語意理解可能略不如 OpenAI 商業模型
 若要強化中文語意檢索準確度，建議改用繁體中文專用模型如 bge-small-zh（需在 Ollama 安裝支援後使用）
+本範例同時以 CJK 雙字切詞的 BM25 關鍵字索引補強，兩者以 RRF 合併（見 lexical_index.py）
 '''
\ No newline at end of file
@@ -0,0 +1,55 @@
+import sys
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_ollama import OllamaLLM, OllamaEmbeddings
+from embedding_cache import CachedEmbeddings
+from batch_embeddings import BatchedEmbeddings
+from rag_index import IncrementalIndex
+from batch_qa import BatchRetrievalQA
+from langchain_core.globals import set_llm_cache
+from llm_cache import TieredLLMCache
+
+# 💾 啟用 LLM 回應快取：評測集重複執行時，相同的題目不必再等模型重新生成
+set_llm_cache(TieredLLMCache())
+
+# 1️⃣ 與 C07 相同的文件切割方式與持久化索引
+text_splitter = RecursiveCharacterTextSplitter(
+    chunk_size=600,
+    chunk_overlap=100,
+    add_start_index=True
+)
+embedding = CachedEmbeddings(BatchedEmbeddings(OllamaEmbeddings(model="nomic-embed-text")))
+index = IncrementalIndex(embedding, text_splitter, collection_name="reference_qa")
+print("📚 索引同步結果：", index.sync(["reference.txt"]))
+
+# 2️⃣ 建立批次問答系統
+# 📦 整批問題一次嵌入、一次檢索，重複取回的段落只保存一份，生成時最多同時送出 4 個請求
+qa = BatchRetrievalQA(
+    llm=OllamaLLM(model="gemma3"),
+    vectorstore=index.vectorstore,
+    k=3,  # 每題取回 3 個段落
+    fetch_k=20,  # MMR 的候選數量
+    search_type="mmr",
+    max_concurrency=4  # 同時生成的數量上限，依 Ollama 的 OLLAMA_NUM_PARALLEL 調整
+)
+
+# 3️⃣ 準備問題：可以傳入一個文字檔（每行一題），例如每晚的評測題庫
+if len(sys.argv) > 1:
+    with open(sys.argv[1], "r", encoding="utf-8") as f:
+        queries = [line.strip() for line in f if line.strip()]
+else:
+    queries = [
+        "LangChain 是什麼？",
+        "LangChain 支援哪些向量資料庫？",
+        "如何使用 LangChain 建立文件問答系統？",
+        "LangChain 的六大模組包括哪些？",
+        "哪些應用可以使用 LangChain 來實作？"
+    ]
+
+# 4️⃣ 批次發問，結果依照輸入順序回傳
+results = qa.batch([f"請用繁體中文回答：{query}" for query in queries])
+for query, result in zip(queries, results):
+    print(f"\n🟦 問題：{query}")
+    print("✅ 回答：", result["result"])
+
+print("\n📊 批次統計：", qa.stats)
+print("🗃️ 嵌入快取統計：", embedding.stats())
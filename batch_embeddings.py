@@ -0,0 +1,111 @@
+# 🚚 批次 + 並行的嵌入客戶端（Batched Embeddings）
+# 把大量段落切成批次，同時最多送出 max_concurrency 個批次給本機 Ollama
+# 依照每批的實際延遲自動調整批次大小；失敗的批次單獨重送，成功的批次不會重算
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+
+class BatchedEmbeddings(Embeddings):
+    """包裝任意 Embeddings，提供批次、並行上限（背壓）、自適應批次大小與重試"""
+
+    def __init__(self, embeddings: Embeddings, batch_size: int = 32, min_batch_size: int = 4,
+                 max_batch_size: int = 512, max_concurrency: int = 4,
+                 target_latency: float = 2.0, max_retries: int = 3, retry_backoff: float = 0.5):
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, "model", type(embeddings).__name__)
+        self.batch_size = batch_size
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._lock = threading.Lock()
+        self._stats = {"chunks": 0, "batches": 0, "retries": 0, "seconds": 0.0}
+
+    def _embed_batch(self, batch: List[str], delay: float = 0.0):
+        if delay:
+            time.sleep(delay)  # ⏳ 重試前先等一下，讓伺服器喘口氣
+        started = time.perf_counter()
+        vectors = self.embeddings.embed_documents(batch)
+        return vectors, time.perf_counter() - started
+
+    def _adapt(self, elapsed: float) -> None:
+        # 📏 AIMD：延遲低於目標就慢慢加大批次，超過目標就直接減半
+        with self._lock:
+            if elapsed > self.target_latency:
+                self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+            elif elapsed < self.target_latency / 2:
+                self.batch_size = min(self.max_batch_size, self.batch_size + max(1, self.batch_size // 4))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        results: List[List[float]] = [None] * len(texts)
+        started = time.perf_counter()
+        position = 0
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            pending = {}  # future -> (起始位置, 批次內容, 已重試次數)
+            while position < len(texts) or pending:
+                # 🚦 背壓：在途批次數量達到上限時，先等其中一批完成才送下一批
+                while position < len(texts) and len(pending) < self.max_concurrency:
+                    batch = texts[position:position + self.batch_size]
+                    pending[pool.submit(self._embed_batch, batch)] = (position, batch, 0)
+                    position += len(batch)
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    start, batch, attempt = pending.pop(future)
+                    try:
+                        vectors, elapsed = future.result()
+                    except Exception:
+                        if attempt >= self.max_retries:
+                            raise
+                        # 🔁 只重送失敗的這一批，並縮小之後的批次
+                        self._adapt(float("inf"))
+                        self._stats["retries"] += 1
+                        delay = self.retry_backoff * (2 ** attempt)
+                        pending[pool.submit(self._embed_batch, batch, delay)] = (start, batch, attempt + 1)
+                        continue
+                    results[start:start + len(batch)] = vectors
+                    self._stats["batches"] += 1
+                    self._adapt(elapsed)
+        self._stats["chunks"] += len(texts)
+        self._stats["seconds"] += time.perf_counter() - started
+        return results
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    def stats(self) -> dict:
+        """回傳累計的吞吐量統計（chunks/sec）與目前的批次大小"""
+        seconds = self._stats["seconds"]
+        return {
+            **self._stats,
+            "seconds": round(seconds, 3),
+            "chunks_per_sec": round(self._stats["chunks"] / seconds, 1) if seconds else 0.0,
+            "batch_size": self.batch_size,
+        }
+
+
+if __name__ == "__main__":
+    # 🧪 對本機假伺服器做一次吞吐量測試，不需要真的 Ollama
+    from langchain_ollama import OllamaEmbeddings
+    from ollama_stub import StubConfig, start_stub_server
+
+    config = StubConfig()
+    server, base_url = start_stub_server(config=config)
+    chunks = [f"第 {i} 個測試段落：客家幣登記流程與相關規定" for i in range(5000)]
+
+    single = OllamaEmbeddings(model="nomic-embed-text", base_url=base_url)
+    started = time.perf_counter()
+    for i in range(0, 200):
+        single.embed_query(chunks[i])
+    print(f"🐢 逐段嵌入：{200 / (time.perf_counter() - started):.1f} chunks/sec")
+
+    config.failure_rate = 0.05  # 模擬偶發失敗，驗證只重送失敗的批次
+    batched = BatchedEmbeddings(OllamaEmbeddings(model="nomic-embed-text", base_url=base_url))
+    vectors = batched.embed_documents(chunks)
+    print("🚚 批次並行：", batched.stats())
+    server.shutdown()
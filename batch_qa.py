@@ -0,0 +1,86 @@
+# 📦 批次 RAG 問答（一次處理大量問題，例如每晚的評測）
+# 逐題 qa.invoke 時，每個問題都要各自嵌入、各自檢索、依序等模型回答
+# BatchRetrievalQA 把一批問題：
+# - 用一次 embed_documents 批次呼叫嵌入（交給 BatchedEmbeddings 時會再自動分批、並行；CachedEmbeddings 以查詢類別快取）
+# - 用一次 Chroma collection.query 完成整批的 top-k 檢索，MMR 則以 mmr.py 的向量化版本重新排序
+# - 不同問題取回同一個段落時共用同一個 Document，只保存一份
+# - 以有上限的並行數送去生成，結果依輸入順序回傳
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from langchain.chains.retrieval_qa.prompt import PROMPT as DEFAULT_QA_PROMPT
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import BasePromptTemplate
+from langchain_core.vectorstores import VectorStore
+
+from mmr import maximal_marginal_relevance
+from streaming_qa import format_documents
+
+
+def _embed_questions(embeddings: Embeddings, questions: List[str]) -> List[List[float]]:
+    # 整批問題用一次批次呼叫嵌入；CachedEmbeddings 另外提供 embed_queries，讓問題以查詢類別快取，不會混進段落的快取
+    embed_queries = getattr(embeddings, "embed_queries", None)
+    return embed_queries(questions) if embed_queries is not None else embeddings.embed_documents(questions)
+
+
+class BatchRetrievalQA:
+    """整批嵌入、整批檢索、段落去重、限制並行數的生成，回傳格式與 RetrievalQA 相同"""
+
+    def __init__(self, llm, vectorstore: VectorStore, k: int = 3, fetch_k: int = 20,
+                 search_type: str = "mmr", lambda_mult: float = 0.5,
+                 prompt: BasePromptTemplate = DEFAULT_QA_PROMPT, max_concurrency: int = 4):
+        if search_type not in ("similarity", "mmr"):
+            raise ValueError(f"不支援的 search_type：{search_type}")
+        self.vectorstore = vectorstore
+        self.k = k
+        self.fetch_k = max(fetch_k, k) if search_type == "mmr" else k
+        self.search_type = search_type
+        self.lambda_mult = lambda_mult
+        self.max_concurrency = max_concurrency
+        self.answer_chain = prompt | llm | StrOutputParser()
+        self.stats = {"questions": 0, "retrieved_chunks": 0, "unique_chunks": 0}
+
+    def retrieve(self, questions: List[str]) -> List[List[Document]]:
+        """整批檢索，回傳每個問題的來源段落（相同段落共用同一個 Document）"""
+        vectors = _embed_questions(self.vectorstore.embeddings, questions)
+        include = ["documents", "metadatas"] + (["embeddings"] if self.search_type == "mmr" else [])
+        results = self.vectorstore._collection.query(
+            query_embeddings=vectors, n_results=self.fetch_k, include=include)
+
+        shared: Dict[str, Document] = {}
+        retrieved = []
+        for row, vector in enumerate(vectors):
+            ids = results["ids"][row]
+            order = range(len(ids))
+            if self.search_type == "mmr" and ids:
+                chosen = set(maximal_marginal_relevance(
+                    vector, results["embeddings"][row], self.lambda_mult, self.k))
+                order = [i for i in order if i in chosen]
+            documents = []
+            for i in order:
+                chunk_id = ids[i]
+                if chunk_id not in shared:
+                    shared[chunk_id] = Document(page_content=results["documents"][row][i],
+                                                metadata=results["metadatas"][row][i] or {}, id=chunk_id)
+                documents.append(shared[chunk_id])
+            retrieved.append(documents)
+        self.stats["retrieved_chunks"] += sum(len(docs) for docs in retrieved)
+        self.stats["unique_chunks"] += len(shared)
+        return retrieved
+
+    def batch(self, questions: List[str], batch_size: int = 256) -> List[Dict[str, Any]]:
+        """依輸入順序回傳 [{"query", "result", "source_documents"}]；每 batch_size 題為一批"""
+        outputs = []
+        for start in range(0, len(questions), batch_size):
+            window = questions[start:start + batch_size]
+            retrieved = self.retrieve(window)
+            inputs = [{"context": format_documents(docs), "question": q} for q, docs in zip(window, retrieved)]
+            # ⚠️ LLM.batch 在同一批內仍是逐一呼叫 _call，這裡改用執行緒池才會真的同時送出請求
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+                answers = list(pool.map(self.answer_chain.invoke, inputs))
+            outputs += [{"query": q, "result": answer, "source_documents": docs}
+                        for q, answer, docs in zip(window, answers, retrieved)]
+            self.stats["questions"] += len(window)
+        return outputs
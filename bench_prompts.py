@@ -0,0 +1,124 @@
+# ⏱️ 提示詞渲染基準測試（不需要 Ollama）
+# 比較課程範例的提示詞在大量請求下的渲染成本：
+# - stock_invoke：原本的 prompt.invoke（含變數驗證與 callbacks）
+# - stock_format：prompt.format_prompt（略過 Runnable 的 callbacks）
+# - compiled：prompt_compiler.py 的 CompiledPrompt，不使用快取（每次都重新渲染）
+# - compiled_cached：CompiledPrompt 加上渲染結果快取（請求在 --distinct 種輸入之間重複）
+# 使用方式：python bench_prompts.py --requests 20000 --distinct 100
+import argparse
+import json
+import random
+import time
+from typing import Any, Callable, Dict, List
+
+from langchain.output_parsers import PydanticOutputParser
+from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
+from pydantic import BaseModel, Field
+
+from prompt_compiler import compile_prompt
+
+
+class JobAdvice(BaseModel):
+    suggested_roles: List[str] = Field(description="建議的職位名稱")
+    required_skills: List[str] = Field(description="需要具備的技能")
+    learning_resources: List[str] = Field(description="推薦學習資源")
+    salary_estimate: str = Field(description="預估的薪資範圍")
+
+
+def build_cases(distinct: int) -> Dict[str, Dict[str, Any]]:
+    """課程範例中的提示詞，以及各自的 distinct 種輸入"""
+    movies = [f"電影{i}" for i in range(distinct)]
+    cities = [f"城市{i}" for i in range(distinct)]
+    topics = [f"請問如何規劃人生方向？（{i}）" for i in range(distinct)]
+    queries = [f"我對第 {i} 種農業科技應用有興趣" for i in range(distinct)]
+    format_instructions = PydanticOutputParser(pydantic_object=JobAdvice).get_format_instructions()
+    return {
+        "C10_year": {
+            "prompt": ChatPromptTemplate.from_template("請問電影《{movie}》是在哪一年上映的？"),
+            "inputs": [{"movie": m} for m in movies],
+        },
+        "C11_country": {
+            "prompt": ChatPromptTemplate.from_template("{city} 位於哪一個國家？"),
+            "inputs": [{"city": c} for c in cities],
+        },
+        "C13_friendly": {
+            "prompt": PromptTemplate.from_template("用繁體中文像朋友聊天回應我這段話：{topic}"),
+            "inputs": [{"topic": t} for t in topics],
+        },
+        "C13_wiseman": {
+            "prompt": ChatPromptTemplate.from_messages([
+                ("system", "你是一個睿智的老人"),
+                ("human", "用說故事的方式，用繁體中文回應我的這段話：{topic}"),
+            ]),
+            "inputs": [{"topic": t} for t in topics],
+        },
+        "C09_career": {
+            "prompt": ChatPromptTemplate.from_messages([
+                ("system", "你是一位職涯顧問，請根據使用者興趣給出個人化的求職建議，並以繁體中文回應。\n{format_instructions}"),
+                ("human", "{query}"),
+            ]).partial(format_instructions=format_instructions),
+            "inputs": [{"query": q} for q in queries],
+        },
+    }
+
+
+def timed(render: Callable[[Any], Any], requests: List[Dict[str, Any]]) -> Dict[str, float]:
+    started = time.perf_counter()
+    for inputs in requests:
+        render(inputs)
+    seconds = time.perf_counter() - started
+    return {"us_per_request": round(seconds / len(requests) * 1e6, 2),
+            "requests_per_sec": round(len(requests) / seconds)}
+
+
+def check_output(prompt, compiled, inputs: List[Dict[str, Any]]) -> None:
+    """確認編譯後的輸出與原本的 prompt.invoke 完全相同；另外代入 1 / 1.0 / True 等相等但文字不同的值"""
+    variants = [{name: value for name in x} for x in inputs[:1] for value in (1, 1.0, True, 0.0, -0.0, "1")]
+    for x in inputs[:10] + variants + variants:  # 第二輪走快取
+        expected, actual = prompt.invoke(x), compiled.invoke(x)
+        assert expected == actual, f"輸出不同：{x} -> {expected} / {actual}"
+
+
+def bench_case(prompt, inputs: List[Dict[str, Any]], requests: int, seed: int) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    stream = [rng.choice(inputs) for _ in range(requests)]
+    compiled = compile_prompt(prompt, cache_size=0)
+    cached = compile_prompt(prompt, cache_size=max(len(inputs), 1))
+    # 先確認輸出完全相同，比較才有意義
+    check_output(prompt, compiled, inputs)
+    check_output(prompt, cached, inputs)
+    results = {
+        "stock_invoke": timed(prompt.invoke, stream),
+        "stock_format": timed(lambda x: prompt.format_prompt(**x), stream),
+        "compiled": timed(compiled.invoke, stream),
+        "compiled_cached": timed(cached.invoke, stream),
+    }
+    base = results["stock_invoke"]["us_per_request"]
+    for stats in results.values():
+        stats["speedup"] = round(base / stats["us_per_request"], 1)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="提示詞渲染基準測試")
+    parser.add_argument("--requests", type=int, default=20_000, help="每種方式渲染的請求數")
+    parser.add_argument("--distinct", type=int, default=100, help="不同輸入的數量（重複越多，快取越有效）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="把結果寫成 JSON")
+    args = parser.parse_args()
+
+    report = {}
+    for name, case in build_cases(args.distinct).items():
+        report[name] = bench_case(case["prompt"], case["inputs"], args.requests, args.seed)
+        print(f"🧩 {name}")
+        for method, stats in report[name].items():
+            print(f"   {method:<16} {stats['us_per_request']:>9.2f} µs/req  "
+                  f"{stats['requests_per_sec']:>9,} req/s  x{stats['speedup']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": report}, f, ensure_ascii=False, indent=2)
+        print(f"💾 結果已寫入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
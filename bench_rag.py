@@ -0,0 +1,224 @@
+# ⏱️ RAG 檢索延遲基準測試（不需要 Ollama）
+# 使用確定性的 HashingEmbeddings 與 FakeLLM，從 reference.txt 與 Hakka.pdf 組出指定大小的語料，量測：
+# - 文件切割時間、嵌入吞吐量（chunks/sec）、Chroma 索引建立時間
+# - similarity、mmr（LangChain 內建）與 mmr_vec（mmr.py 向量化版本）在不同 k 值下的查詢延遲 p50 / p95 / p99
+#   hybrid（lexical_index.py 向量 + BM25）、mmap（chunk_store.py 暴力搜尋）的延遲，以及整條 RetrievalQA 的延遲
+# 結果寫成 JSON；加上 --baseline 可和上一次的結果比較，p95 變慢超過門檻時以非零狀態碼結束
+# 使用方式：python bench_rag.py --chars 500000 --chunk-sizes 600 1000 --output rag_benchmark.json
+import argparse
+import json
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from typing import Dict, List
+
+import numpy as np
+from langchain.chains import RetrievalQA
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from chunk_store import ChunkStore, ChunkStoreRetriever
+from fake_models import FakeLLM, HashingEmbeddings
+from lexical_index import HybridRetriever, InvertedIndex
+from mmr import as_mmr_retriever
+from pdf_stream import iter_pdf_pages
+
+QUERIES = [
+    "LangChain 是什麼？",
+    "LangChain 支援哪些向量資料庫？",
+    "如何使用 LangChain 建立文件問答系統？",
+    "LangChain 的六大模組包括哪些？",
+    "哪些應用可以使用 LangChain 來實作？",
+    "請問如何登記客家幣？",
+    "客家幣可以在哪裡使用？",
+    "客家幣的發行單位是誰？",
+]
+
+
+class PrecomputedEmbeddings(Embeddings):
+    """先算好的向量查表，讓「索引建立時間」不包含嵌入時間"""
+
+    def __init__(self, embedding: Embeddings, texts: List[str], vectors: List[List[float]]):
+        self.embedding = embedding
+        self.table = dict(zip(texts, vectors))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.table.get(t) or self.embedding.embed_query(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embedding.embed_query(text)
+
+
+def load_base_documents() -> List[Document]:
+    with open("reference.txt", "r", encoding="utf-8") as f:
+        docs = [Document(page_content=f.read(), metadata={"source": "reference.txt"})]
+    return docs + list(iter_pdf_pages("Hakka.pdf"))
+
+
+def build_corpus(base: List[Document], target_chars: int, seed: int) -> List[Document]:
+    """重複並打散原始段落，組出約 target_chars 字的語料（內容可重現）"""
+    rng = random.Random(seed)
+    paragraphs = [p for doc in base for p in doc.page_content.split("\n") if p.strip()]
+    docs, size, copy = [], 0, 0
+    while size < target_chars:
+        shuffled = paragraphs[:]
+        rng.shuffle(shuffled)
+        text = "\n".join(f"{p}（第 {copy} 版）" for p in shuffled)
+        docs.append(Document(page_content=text, metadata={"source": f"corpus-{copy}"}))
+        size += len(text)
+        copy += 1
+    return docs
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    ms = np.array(samples) * 1000
+    return {"p50_ms": round(float(np.percentile(ms, 50)), 3),
+            "p95_ms": round(float(np.percentile(ms, 95)), 3),
+            "p99_ms": round(float(np.percentile(ms, 99)), 3),
+            "n": len(samples)}
+
+
+def timed(fn, repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def bench_chunk_size(corpus: List[Document], chunk_size: int, args) -> dict:
+    result = {"chunk_size": chunk_size, "chunk_overlap": args.chunk_overlap}
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=args.chunk_overlap)
+
+    started = time.perf_counter()
+    chunks = splitter.split_documents(corpus)
+    result["split_seconds"] = round(time.perf_counter() - started, 4)
+    result["chunks"] = len(chunks)
+
+    embedding = HashingEmbeddings(size=args.dim)
+    texts = [c.page_content for c in chunks]
+    started = time.perf_counter()
+    vectors = embedding.embed_documents(texts)
+    seconds = time.perf_counter() - started
+    result["embed_seconds"] = round(seconds, 4)
+    result["embed_chunks_per_sec"] = round(len(texts) / seconds, 1)
+
+    store_embedding = PrecomputedEmbeddings(embedding, texts, vectors)
+    started = time.perf_counter()
+    vectorstore = Chroma(collection_name=f"bench-{uuid.uuid4().hex[:8]}", embedding_function=store_embedding)
+    for start in range(0, len(chunks), 1000):
+        vectorstore.add_documents(chunks[start:start + 1000],
+                                  ids=[f"chunk-{i}" for i in range(start, min(start + 1000, len(chunks)))])
+    result["index_seconds"] = round(time.perf_counter() - started, 4)
+
+    started = time.perf_counter()
+    lexical = InvertedIndex()
+    lexical.add([f"chunk-{i}" for i in range(len(chunks))], texts)
+    result["lexical_index_seconds"] = round(time.perf_counter() - started, 4)
+
+    started = time.perf_counter()
+    store_dir = tempfile.mkdtemp(prefix="chunk_store_")
+    store = ChunkStore.build(store_dir, ((f"chunk-{i}", c.page_content, c.metadata, v)
+                                         for i, (c, v) in enumerate(zip(chunks, vectors))))
+    result["chunk_store_seconds"] = round(time.perf_counter() - started, 4)
+
+    queries = (QUERIES * (args.queries // len(QUERIES) + 1))[:args.queries]
+    result["search"] = {}
+    for search_type in ("similarity", "mmr", "mmr_vec", "hybrid", "mmap"):
+        for k in args.k:
+            fetch_k = max(args.fetch_k, k)
+            if search_type == "mmr_vec":
+                retriever = as_mmr_retriever(vectorstore, k=k, fetch_k=fetch_k)
+            elif search_type == "mmap":
+                retriever = ChunkStoreRetriever(store=store, embedding=embedding, k=k)
+            elif search_type == "hybrid":
+                retriever = HybridRetriever(vectorstore=vectorstore, lexical=lexical, k=k, fetch_k=fetch_k)
+            else:
+                search_kwargs = {"k": k, "fetch_k": fetch_k} if search_type == "mmr" else {"k": k}
+                retriever = vectorstore.as_retriever(search_type=search_type, search_kwargs=search_kwargs)
+            retriever.invoke(queries[0])  # 暖機
+            samples = []
+            for q in queries:
+                samples += timed(lambda: retriever.invoke(q), 1)
+            result["search"][f"{search_type}@{k}"] = percentiles(samples)
+
+    qa = RetrievalQA.from_chain_type(
+        llm=FakeLLM(), retriever=vectorstore.as_retriever(search_type="mmr", search_kwargs={"k": 3}))
+    result["qa_mmr@3"] = percentiles([s for q in queries[:20] for s in timed(lambda: qa.invoke({"query": q}), 1)])
+    vectorstore.delete_collection()
+    store.close()
+    del store, retriever
+    shutil.rmtree(store_dir, ignore_errors=True)
+    return result
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> List[str]:
+    """列出 p95 比基準變慢超過 threshold 比例的項目"""
+    regressions = []
+    old_runs = {r["chunk_size"]: r for r in baseline.get("runs", [])}
+    for run in current["runs"]:
+        old = old_runs.get(run["chunk_size"])
+        if not old:
+            continue
+        for name, stats in {**run["search"], "qa_mmr@3": run["qa_mmr@3"]}.items():
+            before = old["search"].get(name) if name in run["search"] else old.get(name)
+            if before and stats["p95_ms"] > before["p95_ms"] * (1 + threshold):
+                regressions.append(f"chunk_size={run['chunk_size']} {name}: "
+                                   f"p95 {before['p95_ms']}ms → {stats['p95_ms']}ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG 檢索延遲基準測試")
+    parser.add_argument("--chars", type=int, default=500_000, help="語料總字數")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[600, 1000])
+    parser.add_argument("--chunk-overlap", type=int, default=100)
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 10])
+    parser.add_argument("--fetch-k", type=int, default=20, help="MMR 的候選數量")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="rag_benchmark.json")
+    parser.add_argument("--baseline", help="上一次的結果 JSON，用來偵測效能退步")
+    parser.add_argument("--threshold", type=float, default=0.2, help="p95 容許變慢的比例")
+    args = parser.parse_args()
+
+    corpus = build_corpus(load_base_documents(), args.chars, args.seed)
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "params": vars(args),
+        "corpus_chars": sum(len(d.page_content) for d in corpus),
+        "runs": [],
+    }
+    for chunk_size in args.chunk_sizes:
+        run = bench_chunk_size(corpus, chunk_size, args)
+        report["runs"].append(run)
+        print(f"📏 chunk_size={chunk_size}：{run['chunks']} 段，切割 {run['split_seconds']}s，"
+              f"嵌入 {run['embed_chunks_per_sec']} chunks/sec，建索引 {run['index_seconds']}s")
+        for name, stats in run["search"].items():
+            print(f"   🔍 {name:<16} p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms p99={stats['p99_ms']}ms")
+        print(f"   🤖 qa_mmr@3         p50={run['qa_mmr@3']['p50_ms']}ms p95={run['qa_mmr@3']['p95_ms']}ms")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"💾 結果已寫入 {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for line in regressions:
+            print("⚠️ 效能退步：", line)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# 🧱 精簡的段落儲存格式（Chunk Store），向量以 memory-map 方式讀取
+# 每個 Document 物件都帶著自己的字串與 metadata dict，再加上 Chroma 的向量，同一份語料在記憶體裡存了好幾份
+# ChunkStore 把一個語料存成幾個平坦的檔案：
+# - text.bin + text_offsets.npy：所有段落文字串成一個 UTF-8 blob，用位移陣列切出第 i 段（ID 也同樣存放）
+# - metadata.npy + chunk_store.json：metadata 依欄位存成整數代碼，實際的值只存一份（interning）
+# - vectors.f32：已正規化的 float32 向量矩陣，以 np.memmap 開啟
+# 多個行程開啟同一個目錄時共用作業系統的 page cache，不會各自複製一份；查詢直接在 mmap 上做 cosine top-k
+import json
+import mmap
+import os
+from typing import Any, Dict, Iterable, List, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+_MANIFEST = "chunk_store.json"
+
+
+def _offsets_path(path: str) -> str:
+    # text.bin -> text_offsets.npy；只換副檔名，目錄名稱裡有 ".bin" 也不受影響
+    return os.path.splitext(path)[0] + "_offsets.npy"
+
+
+class _BlobWriter:
+    """把一串字串寫成 UTF-8 blob + 位移陣列"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "wb")
+        self.offsets = [0]
+
+    def append(self, text: str) -> None:
+        data = text.encode("utf-8")
+        self.file.write(data)
+        self.offsets.append(self.offsets[-1] + len(data))
+
+    def close(self) -> None:
+        self.file.close()
+        np.save(_offsets_path(self.path), np.asarray(self.offsets, dtype=np.int64))
+
+
+class _Blob:
+    """唯讀的 blob，以 mmap 讀取，不把整份文字載入記憶體"""
+
+    def __init__(self, path: str):
+        self.offsets = np.load(_offsets_path(path), mmap_mode="r")
+        self._file = open(path, "rb")
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else b""
+
+    def __getitem__(self, i: int) -> str:
+        return self._data[int(self.offsets[i]):int(self.offsets[i + 1])].decode("utf-8")
+
+    def close(self) -> None:
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+
+class ChunkStore:
+    """唯讀的段落儲存區：文字 blob、欄位式 metadata、memory-mapped 向量"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, _MANIFEST), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.count = manifest["count"]
+        self.dim = manifest["dim"]
+        self.columns: List[str] = manifest["columns"]
+        self._values = [json.loads(v) for v in manifest["values"]]
+        self._texts = _Blob(os.path.join(directory, "text.bin"))
+        self._ids = _Blob(os.path.join(directory, "ids.bin"))
+        self._codes = np.load(os.path.join(directory, "metadata.npy"), mmap_mode="r")
+        self.vectors = np.memmap(os.path.join(directory, "vectors.f32"), dtype=np.float32, mode="r",
+                                 shape=(self.count, self.dim)) if self.count else np.zeros((0, self.dim), np.float32)
+
+    def close(self) -> None:
+        """關閉 blob 的檔案與 mmap；向量與 metadata 的 memmap 在沒有其他參照後由 numpy 釋放"""
+        self._texts.close()
+        self._ids.close()
+        self.vectors = self._codes = None
+
+    def __enter__(self) -> "ChunkStore":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    # ---------- build ----------
+    @classmethod
+    def build(cls, directory: str, records: Iterable[Tuple[str, str, Dict[str, Any], List[float]]]) -> "ChunkStore":
+        """由 (id, 文字, metadata, 向量) 逐筆寫入；向量在寫入時正規化，查詢時只需要內積"""
+        os.makedirs(directory, exist_ok=True)
+        texts = _BlobWriter(os.path.join(directory, "text.bin"))
+        ids = _BlobWriter(os.path.join(directory, "ids.bin"))
+        interned: Dict[str, int] = {}
+        columns: List[str] = []
+        rows: List[Dict[int, int]] = []
+        dim = 0
+        with open(os.path.join(directory, "vectors.f32"), "wb") as vectors:
+            for chunk_id, text, metadata, vector in records:
+                ids.append(chunk_id)
+                texts.append(text)
+                row = {}
+                for key, value in (metadata or {}).items():
+                    if key not in columns:
+                        columns.append(key)
+                    encoded = json.dumps(value, ensure_ascii=False, sort_keys=True)
+                    row[columns.index(key)] = interned.setdefault(encoded, len(interned))
+                rows.append(row)
+                vector = np.asarray(vector, dtype=np.float32)
+                dim = dim or len(vector)
+                norm = np.linalg.norm(vector)
+                vectors.write((vector / norm if norm else vector).tobytes())
+        texts.close()
+        ids.close()
+
+        codes = np.full((len(rows), len(columns)), -1, dtype=np.int32)  # -1 表示沒有這個欄位
+        for i, row in enumerate(rows):
+            for column, code in row.items():
+                codes[i, column] = code
+        np.save(os.path.join(directory, "metadata.npy"), codes)
+        with open(os.path.join(directory, _MANIFEST), "w", encoding="utf-8") as f:
+            json.dump({"count": len(rows), "dim": dim, "columns": columns,
+                       "values": sorted(interned, key=interned.get)}, f, ensure_ascii=False)
+        return cls(directory)
+
+    @classmethod
+    def from_vectorstore(cls, directory: str, vectorstore, page_size: int = 1000) -> "ChunkStore":
+        """把 Chroma 集合（例如 IncrementalIndex.vectorstore）匯出成 ChunkStore"""
+        collection = vectorstore._collection
+
+        def records():
+            for offset in range(0, collection.count(), page_size):
+                page = collection.get(include=["documents", "metadatas", "embeddings"],
+                                      limit=page_size, offset=offset)
+                yield from zip(page["ids"], page["documents"], page["metadatas"], page["embeddings"])
+        return cls.build(directory, records())
+
+    # ---------- read ----------
+    def __len__(self) -> int:
+        return self.count
+
+    def text(self, i: int) -> str:
+        return self._texts[i]
+
+    def metadata(self, i: int) -> Dict[str, Any]:
+        return {self.columns[c]: self._values[code] for c, code in enumerate(self._codes[i]) if code >= 0}
+
+    def document(self, i: int) -> Document:
+        return Document(page_content=self._texts[i], metadata=self.metadata(i), id=self._ids[i])
+
+    def search(self, query_vector: List[float], k: int = 4, block_size: int = 65536) -> List[Tuple[int, float]]:
+        """在 mmap 上分塊計算 cosine 相似度，回傳前 k 名 (段落索引, 分數)"""
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        query = query / norm if norm else query
+        best_idx = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, self.count, block_size):
+            scores = self.vectors[start:start + block_size] @ query
+            if len(scores) > k:
+                top = np.argpartition(-scores, k)[:k]
+            else:
+                top = np.arange(len(scores))
+            best_idx = np.concatenate([best_idx, top + start])
+            best_scores = np.concatenate([best_scores, scores[top]])
+            if len(best_idx) > k:
+                keep = np.argpartition(-best_scores, k)[:k]
+                best_idx, best_scores = best_idx[keep], best_scores[keep]
+        order = np.argsort(-best_scores, kind="stable")
+        return [(int(best_idx[i]), float(best_scores[i])) for i in order]
+
+
+class ChunkStoreRetriever(BaseRetriever):
+    """以 ChunkStore 暴力搜尋（brute-force）的檢索器"""
+
+    store: ChunkStore
+    embedding: Embeddings
+    k: int = 4
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        hits = self.store.search(self.embedding.embed_query(query), self.k)
+        return [self.store.document(i) for i, _ in hits]
+
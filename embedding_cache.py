@@ -0,0 +1,119 @@
+# 🗃️ 嵌入向量快取（Embedding Cache）
+# 以「嵌入模型名稱 + 段落文字的 SHA-256」作為鍵，把向量永久保存在 SQLite
+# RAG 範例重新啟動時，只有沒看過的段落才會真的送到 Ollama 計算嵌入
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class CachedEmbeddings(Embeddings):
+    """包裝任意 Embeddings，提供磁碟快取、LRU 淘汰與命中統計"""
+
+    def __init__(self, embeddings: Embeddings, db_path: str = "embedding_cache.db",
+                 max_entries: int = 200_000, model_name: str = None):
+        self.embeddings = embeddings
+        # 🔑 不同的嵌入模型產生的向量不能混用，所以模型名稱也是鍵的一部分
+        self.model_name = model_name or getattr(embeddings, "model", type(embeddings).__name__)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embedding_cache ("
+            "key TEXT PRIMARY KEY, model TEXT, vector BLOB, last_used REAL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_embedding_cache_last_used ON embedding_cache(last_used)"
+        )
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+
+    def _key(self, kind: str, text: str) -> str:
+        raw = f"{self.model_name}\0{kind}\0{text}".encode("utf-8")
+        return hashlib.sha256(raw).hexdigest()
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        # SQLite 的參數數量有限制，分批查詢
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            marks = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM embedding_cache WHERE key IN ({marks})", batch
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        if found:
+            now = time.time()
+            self._conn.executemany(
+                "UPDATE embedding_cache SET last_used = ? WHERE key = ?",
+                [(now, key) for key in found],
+            )
+        return found
+
+    def _store(self, items: Dict[str, List[float]]) -> None:
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO embedding_cache (key, model, vector, last_used) VALUES (?, ?, ?, ?)",
+            [(key, self.model_name, np.asarray(vec, dtype=np.float32).tobytes(), now)
+             for key, vec in items.items()],
+        )
+        self._size += len(items)
+        # 🧹 超過容量上限時，淘汰最久沒被使用的向量
+        overflow = self._size - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embedding_cache WHERE key IN "
+                "(SELECT key FROM embedding_cache ORDER BY last_used LIMIT ?)",
+                (overflow,),
+            )
+            self.evictions += overflow
+            self._size -= overflow
+
+    def _embed(self, kind: str, texts: List[str], embed_fn) -> List[List[float]]:
+        keys = [self._key(kind, text) for text in texts]
+        with self._lock:
+            cached = self._lookup(list(dict.fromkeys(keys)))
+            # 同一批裡重複的段落只需要算一次
+            missing = {}
+            for key, text in zip(keys, texts):
+                if key not in cached and key not in missing:
+                    missing[key] = text
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+            if missing:
+                vectors = embed_fn(list(missing.values()))
+                new_items = dict(zip(missing.keys(), vectors))
+                self._store(new_items)
+                cached.update(new_items)
+            self._conn.commit()
+        return [list(cached[key]) for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed("doc", texts, self.embeddings.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed("query", [text], lambda t: [self.embeddings.embed_query(t[0])])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """一次嵌入多個查詢：沒命中的查詢合成一次 embed_documents 批次送出，結果以 "query" 類別快取"""
+        return self._embed("query", texts, self.embeddings.embed_documents)
+
+    def stats(self) -> dict:
+        """回傳快取命中統計，方便觀察重新啟動時省下多少嵌入呼叫"""
+        total = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": self._size,
+            "evictions": self.evictions,
+        }
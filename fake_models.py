@@ -0,0 +1,73 @@
+# 🧪 不需要 Ollama 的假模型，用於本機測試、壓力測試與效能基準
+# HashingEmbeddings：把字元與相鄰兩字（bigram）雜湊到固定維度，結果完全可重現
+# 相同字詞越多的句子向量越接近，所以對中文也有基本的「語意」相似度
+# FakeLLM：回答由提示詞雜湊決定，可設定首字延遲與每個 token 的延遲，支援串流
+import time
+import zlib
+from typing import Any, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+
+class HashingEmbeddings(Embeddings):
+    """確定性的雜湊嵌入模型（feature hashing），維度預設與 nomic-embed-text 相同"""
+
+    def __init__(self, size: int = 768, model: str = "hashing-embed"):
+        self.size = size
+        self.model = model
+
+    def _features(self, text: str) -> List[str]:
+        chars = [c for c in text.lower() if not c.isspace()]
+        return chars + [a + b for a, b in zip(chars, chars[1:])]
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.size, dtype=np.float32)
+        for feature in self._features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            # 用雜湊值的最高位元決定正負號，降低碰撞造成的偏差
+            vector[h % self.size] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text).tolist() for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text).tolist()
+
+
+class FakeLLM(LLM):
+    """確定性的假 LLM：回答內容由提示詞決定，可模擬首字延遲與逐字生成的速度"""
+
+    model: str = "fake-llm"
+    answer_tokens: int = 32
+    first_token_latency: float = 0.0
+    token_latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-llm"
+
+    def _tokens(self, prompt: str) -> List[str]:
+        seed = zlib.crc32(prompt.encode("utf-8"))
+        return [f"字{(seed + i) % 97}" for i in range(self.answer_tokens)]
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None,
+              run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        return "".join(chunk.text for chunk in self._stream(prompt, stop, run_manager, **kwargs))
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None,
+                **kwargs: Any) -> Iterator[GenerationChunk]:
+        time.sleep(self.first_token_latency)
+        for i, token in enumerate(self._tokens(prompt)):
+            if i and self.token_latency:
+                time.sleep(self.token_latency)
+            chunk = GenerationChunk(text=token)
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
@@ -0,0 +1,124 @@
+# 📏 依 token 預算壓縮對話歷史（History Compaction）
+# 放在 prompt 之前：保留 system 訊息與最近幾輪對話，較舊的對話改用「滾動摘要」代替
+# 摘要會依 session 快取，只有最近的對話超過預算時才把一段舊對話折疊進摘要（一次小的 LLM 呼叫）
+# 因此不論聊多久，每一輪送進模型的 prompt 長度大致固定，延遲也不會隨對話變長而增加
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+
+from langchain.memory import ConversationBufferMemory
+from langchain_core.messages import BaseMessage, SystemMessage, get_buffer_string
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+
+from token_counter import count_message_tokens, count_tokens
+
+# 各模型的歷史訊息 token 預算（不含這一輪的使用者輸入與模型回應）
+MODEL_TOKEN_BUDGETS = {
+    "gemma3": 3000,
+    "llama3": 2500,
+    "mistral": 2500,
+}
+DEFAULT_TOKEN_BUDGET = 2000
+
+DEFAULT_SUMMARY_PROMPT = ChatPromptTemplate.from_template(
+    "這是目前的對話摘要：\n\n{summary}\n\n這是較早的對話內容：\n\n{new_lines}\n\n"
+    "請用繁體中文更新對話摘要，保留重要的事實與使用者偏好，越精簡越好："
+)
+
+
+class HistoryCompactor:
+    """把對話歷史壓縮到 token 預算內：system 訊息 + 滾動摘要 + 最近的對話"""
+
+    def __init__(self, llm, model: Optional[str] = None, budget: Optional[int] = None,
+                 summary_prompt: ChatPromptTemplate = DEFAULT_SUMMARY_PROMPT,
+                 low_watermark: float = 0.5, history_key: str = "history"):
+        model = model or getattr(llm, "model", None)
+        self.budget = budget or MODEL_TOKEN_BUDGETS.get(model, DEFAULT_TOKEN_BUDGET)
+        # 需要折疊時一次折到只剩 low_watermark 比例的預算，避免每一輪都要呼叫 LLM 更新摘要
+        self.low_watermark = low_watermark
+        self.history_key = history_key
+        self.summary_chain = summary_prompt | llm | StrOutputParser()
+        self._summaries: Dict[str, tuple] = {}  # session -> (第一則未折疊訊息的位置, 它的雜湊, 摘要)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _fingerprint(message: BaseMessage) -> str:
+        return hashlib.sha1(f"{message.type}\0{message.content}".encode("utf-8")).hexdigest()
+
+    def _locate(self, dialog: List[BaseMessage], position: int, anchor: str) -> int:
+        # 先看上次記錄的位置；對話紀錄本身被裁切過時，才從最新的訊息往回找
+        # （由後往前找：重複出現的相同訊息不會讓已折疊的內容又跑回來）
+        if position < len(dialog) and self._fingerprint(dialog[position]) == anchor:
+            return position
+        for i in range(len(dialog) - 1, -1, -1):
+            if self._fingerprint(dialog[i]) == anchor:
+                return i
+        return 0
+
+    def _cut_point(self, messages: List[BaseMessage], start: int, token_limit: int) -> int:
+        # 從最新的訊息往回數，找出不超過 token_limit 的最早位置，並讓保留段落從使用者發言開始
+        total, cut = 0, len(messages)
+        for i in range(len(messages) - 1, start - 1, -1):
+            total += count_message_tokens([messages[i]])
+            if total > token_limit:
+                break
+            cut = i
+        while cut < len(messages) and messages[cut].type != "human":
+            cut += 1
+        # 最近一輪對話一定保留：就算它本身就超過預算，也不能把整段對話都折進摘要
+        last_turn = next((i for i in range(len(messages) - 1, -1, -1) if messages[i].type == "human"),
+                         len(messages) - 1)
+        return min(cut, max(last_turn, 0))
+
+    def compact(self, messages: List[BaseMessage], session_key: str = "default") -> List[BaseMessage]:
+        system = [m for m in messages if m.type == "system"]
+        dialog = [m for m in messages if m.type != "system"]
+        budget = self.budget - count_message_tokens(system)
+        with self._lock:
+            position, anchor, summary = self._summaries.get(session_key, (0, "", ""))
+        if not dialog:
+            summary = ""  # 對話被清除，摘要作廢
+        folded = self._locate(dialog, position, anchor) if anchor else 0
+
+        recent = dialog[folded:]
+        cut = folded
+        if count_message_tokens(recent) + count_tokens(summary) > budget:
+            # 🧩 超過預算：把一段舊對話折疊進摘要，讓最近的對話只佔預算的一部分
+            cut = self._cut_point(dialog, folded, int(budget * self.low_watermark))
+        if cut > folded:
+            summary = self.summary_chain.invoke({
+                "summary": summary or "（尚無摘要）",
+                "new_lines": get_buffer_string(dialog[folded:cut], human_prefix="使用者", ai_prefix="助理"),
+            })
+            folded = cut
+            anchor = self._fingerprint(dialog[folded]) if folded < len(dialog) else ""
+            with self._lock:
+                self._summaries[session_key] = (folded, anchor, summary)
+
+        compacted = list(system)
+        if summary:
+            compacted.append(SystemMessage(content=f"先前對話的摘要：{summary}"))
+        return compacted + dialog[folded:]
+
+    def as_runnable(self) -> RunnableLambda:
+        """包成 Runnable，放在 prompt 前面；session 由 config 的 session_id 決定"""
+        def _compact(inputs: dict, config: RunnableConfig) -> dict:
+            session_key = (config.get("configurable") or {}).get("session_id", "default")
+            history = inputs.get(self.history_key) or []
+            return {**inputs, self.history_key: self.compact(history, session_key)}
+        return RunnableLambda(_compact, name="HistoryCompactor")
+
+
+class CompactingConversationMemory(ConversationBufferMemory):
+    """ConversationBufferMemory 的版本：載入記憶時先經過 HistoryCompactor 壓縮"""
+
+    compactor: Any = None
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        messages = self.compactor.compact(self.chat_memory.messages, session_key=str(id(self)))
+        if self.return_messages:
+            return {self.memory_key: messages}
+        return {self.memory_key: get_buffer_string(
+            messages, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix)}
@@ -0,0 +1,126 @@
+# 🌐 共用的 HTTP 工具執行環境（給天氣 API、網路搜尋等外部資料工具使用）
+# 原本每次呼叫都 requests.get() 一條新連線、沒有逾時、也沒有快取，同一個縣市一分鐘內可能查上百次
+# - 連線池與 keep-alive：所有請求共用同一個 requests.Session，依網址前綴掛上各自的 HTTPAdapter
+# - 每個端點（網址前綴）可設定逾時、重試次數與快取的有效時間（EndpointPolicy）
+# - 回應快取只在有效時間內使用；同時間相同的請求只會送出一次（single-flight），其他人等同一個結果
+# - aget_json / acached 以 asyncio.to_thread 提供非同步介面
+# - 可用 ollama_stub.py 的 /weather 端點在本機測試
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class EndpointPolicy:
+    """單一端點的連線設定：timeout 為 (連線, 讀取) 秒數，ttl 為回應快取的有效秒數（0 表示不快取）"""
+
+    def __init__(self, timeout: Tuple[float, float] = (3.05, 10.0), retries: int = 2,
+                 backoff: float = 0.5, ttl: float = 0.0):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.ttl = ttl
+
+
+class HttpRuntime:
+    """連線池 + 依端點設定的逾時與重試 + 有效期限快取 + 相同請求合併"""
+
+    def __init__(self, pool_size: int = 16, max_cache_entries: int = 1024,
+                 default_policy: Optional[EndpointPolicy] = None):
+        self.pool_size = pool_size
+        self.max_cache_entries = max_cache_entries
+        self.session = requests.Session()
+        self._policies: Dict[str, EndpointPolicy] = {}
+        self._cache: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()  # key -> (到期時間, 結果)
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {"upstream": 0, "cache_hits": 0, "coalesced": 0, "errors": 0}
+        default_policy = default_policy or EndpointPolicy()
+        self.set_policy("https://", default_policy)
+        self.set_policy("http://", default_policy)
+
+    def set_policy(self, prefix: str, policy: EndpointPolicy) -> None:
+        """為網址前綴設定連線政策；requests 會使用最長的相符前綴"""
+        retry = Retry(total=policy.retries, backoff_factor=policy.backoff,
+                      status_forcelist=(429, 500, 502, 503, 504), allowed_methods=("GET", "HEAD"))
+        self.session.mount(prefix, HTTPAdapter(pool_connections=self.pool_size,
+                                               pool_maxsize=self.pool_size, max_retries=retry))
+        self._policies[prefix] = policy
+
+    def policy_for(self, url: str) -> EndpointPolicy:
+        prefix = max((p for p in self._policies if url.startswith(p)), key=len, default="https://")
+        return self._policies[prefix]
+
+    # ---------- 快取 + single-flight ----------
+    def cached(self, key: Hashable, fetch: Callable[[], Any], ttl: float, refresh: bool = False) -> Any:
+        """有效期限內直接回傳快取；同一個 key 正在查詢時，等待同一個結果而不重複送出
+        refresh=True 時略過快取重新取得（背景更新用），但仍會與同時間的相同請求合併"""
+        now = time.monotonic()
+        with self._lock:
+            hit = None if refresh else self._cache.get(key)
+            if hit and hit[0] > now:
+                self._cache.move_to_end(key)
+                self.stats["cache_hits"] += 1
+                return hit[1]
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.stats["coalesced"] += 1
+        if not leader:
+            return future.result()
+
+        try:
+            with self._lock:
+                self.stats["upstream"] += 1
+            result = fetch()
+        except BaseException as e:
+            with self._lock:
+                self.stats["errors"] += 1
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            if ttl > 0:
+                self._cache[key] = (time.monotonic() + ttl, result)
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.max_cache_entries:
+                    self._cache.popitem(last=False)
+            del self._inflight[key]
+        future.set_result(result)
+        return result
+
+    def get_json(self, url: str, params: Optional[Dict[str, Any]] = None, refresh: bool = False) -> Any:
+        policy = self.policy_for(url)
+        key = ("GET", url, tuple(sorted((params or {}).items())))
+
+        def fetch():
+            response = self.session.get(url, params=params, timeout=policy.timeout)
+            response.raise_for_status()
+            return response.json()
+        return self.cached(key, fetch, policy.ttl, refresh)
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        with self._lock:
+            if key is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(key, None)
+
+    # ---------- async ----------
+    async def aget_json(self, url: str, params: Optional[Dict[str, Any]] = None, refresh: bool = False) -> Any:
+        return await asyncio.to_thread(self.get_json, url, params, refresh)
+
+    async def acached(self, key: Hashable, fetch: Callable[[], Any], ttl: float, refresh: bool = False) -> Any:
+        return await asyncio.to_thread(self.cached, key, fetch, ttl, refresh)
+
+
+# 整個行程共用一個執行環境，連線池與快取才有意義
+http_runtime = HttpRuntime()
@@ -0,0 +1,85 @@
+# 🧠 增量式對話摘要（Incremental Summary）
+# 原本每次 /記憶 或冷啟動，都把「所有」歷史訊息合成一份文件再做一次 stuff 摘要，對話越長越慢，最後會超出模型上下文
+# 這裡改成：摘要檢查點（摘要內容 + 已摘要到的訊息 id）存在對話紀錄旁邊，
+# 之後只把檢查點之後的新訊息折疊進舊摘要；積壓的新訊息太多時，才改用 map-reduce 分段摘要
+from typing import List, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.messages import BaseMessage
+from langchain_core.output_parsers import StrOutputParser
+
+from sql_history import WindowedSQLChatMessageHistory
+
+
+def format_messages(messages: List[BaseMessage]) -> str:
+    """每句開頭加上角色名稱，合併成一段文字"""
+    return "\n\n".join(f"{'使用者' if m.type == 'human' else '助理'}：{m.content}" for m in messages)
+
+
+class IncrementalSummarizer:
+    """依摘要檢查點，只摘要新增的訊息"""
+
+    def __init__(self, llm, update_prompt, chunk_prompt, max_fold_chars: int = 6000,
+                 page_size: int = 200):
+        # update_prompt 需要 {summary} 與 {new_lines}；chunk_prompt 需要 {text}（map 與 reduce 共用）
+        self.update_chain = update_prompt | llm | StrOutputParser()
+        self.chunk_chain = chunk_prompt | llm | StrOutputParser()
+        self.max_fold_chars = max_fold_chars
+        self.page_size = page_size
+
+    def _map_reduce(self, texts: List[str]) -> str:
+        # 🧩 map：各段平行摘要；reduce：摘要合起來仍太長就再分段摘要，直到剩一段
+        while len(texts) > 1:
+            partials = self.chunk_chain.batch([{"text": t} for t in texts])
+            texts, group, size = [], [], 0
+            for partial in partials:
+                if group and size + len(partial) > self.max_fold_chars:
+                    texts.append("\n\n".join(group))
+                    group, size = [], 0
+                group.append(partial)
+                size += len(partial)
+            texts.append("\n\n".join(group))
+            if len(texts) == 1:
+                return self.chunk_chain.invoke({"text": texts[0]})
+        return texts[0]
+
+    def _pending_documents(self, history: WindowedSQLChatMessageHistory,
+                           last_id) -> Tuple[List[Document], object]:
+        # 📄 分頁讀取檢查點之後的訊息，每段文字不超過 max_fold_chars
+        docs, lines, size = [], [], 0
+        while True:
+            page = history.get_messages_after(last_id, limit=self.page_size)
+            if not page:
+                break
+            for message_id, message in page:
+                line = format_messages([message])
+                if lines and size + len(line) > self.max_fold_chars:
+                    docs.append(Document(page_content="\n\n".join(lines)))
+                    lines, size = [], 0
+                lines.append(line)
+                size += len(line)
+                last_id = message_id
+        if lines:
+            docs.append(Document(page_content="\n\n".join(lines)))
+        return docs, last_id
+
+    def summarize(self, history: WindowedSQLChatMessageHistory) -> str:
+        """把檢查點之後的新訊息折疊進摘要，存回新的檢查點並回傳最新摘要"""
+        summary, last_id = history.get_summary_checkpoint()
+        docs, new_last_id = self._pending_documents(history, last_id)
+        if not docs:
+            return summary
+        if len(docs) == 1:
+            # ✅ 一般情況：新訊息不多，一次小的 LLM 呼叫就能更新摘要
+            new_lines = docs[0].page_content
+        else:
+            # 🧩 積壓太多：先 map-reduce 把新訊息濃縮，再折疊進舊摘要
+            new_lines = self._map_reduce([doc.page_content for doc in docs])
+        if summary:
+            summary = self.update_chain.invoke({"summary": summary, "new_lines": new_lines})
+        elif len(docs) == 1:
+            summary = self.chunk_chain.invoke({"text": new_lines})
+        else:
+            summary = new_lines
+        history.save_summary_checkpoint(summary, new_last_id)
+        return summary
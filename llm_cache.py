@@ -0,0 +1,183 @@
+# 💾 LLM 回應快取（兩層：完全相同 + 語意相近）
+# 第一層：SQLite，以（模型與生成參數, 完整提示詞）為鍵，完全相同的請求直接回傳上次的答案
+# 第二層（選用）：把提示詞嵌入成向量，相似度超過門檻的「近似重複問題」也能重用答案
+# 使用方式：from langchain_core.globals import set_llm_cache
+#          set_llm_cache(TieredLLMCache())   # 之後所有 Ollama / OllamaLLM 呼叫都會先查快取
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.embeddings import Embeddings
+from langchain_core.load import dumps, loads
+
+
+def _semantic_text(prompt: str) -> str:
+    """聊天模型的提示詞是序列化後的訊息串列，只取最後一則訊息的內容來比對語意"""
+    try:
+        messages = json.loads(prompt)
+        return messages[-1]["kwargs"]["content"]
+    except (ValueError, KeyError, IndexError, TypeError):
+        return prompt
+
+
+class TieredLLMCache(BaseCache):
+    """SQLite 完全比對快取 + 選用的語意快取，支援 TTL、容量上限（LRU）與命中率統計"""
+
+    def __init__(self, db_path: str = "llm_cache.db", ttl: Optional[float] = 7 * 24 * 3600,
+                 max_entries: int = 50_000, embedding: Embeddings = None,
+                 similarity_threshold: float = 0.95):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.embedding = embedding
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, llm_string TEXT, prompt TEXT, response TEXT, "
+            "vector BLOB, created_at REAL, last_used REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_last_used ON llm_cache(last_used)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_llm_string ON llm_cache(llm_string)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        # 語意層的記憶體索引：llm_string -> (keys, 正規化後的向量矩陣)，用到時才從資料庫載入
+        self._semantic_index: Dict[str, tuple] = {}
+        self._stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def _fresh(self, created_at: float) -> bool:
+        return self.ttl is None or time.time() - created_at <= self.ttl
+
+    def _hit(self, key: str, response: str) -> RETURN_VAL_TYPE:
+        self._conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+        self._conn.commit()
+        return [loads(item) for item in json.loads(response)]
+
+    def _embed(self, prompt: str) -> np.ndarray:
+        vector = np.asarray(self.embedding.embed_query(_semantic_text(prompt)), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _load_semantic(self, llm_string: str) -> tuple:
+        if llm_string not in self._semantic_index:
+            rows = self._conn.execute(
+                "SELECT key, vector FROM llm_cache WHERE llm_string = ? AND vector IS NOT NULL",
+                (llm_string,),
+            ).fetchall()
+            keys = [row[0] for row in rows]
+            matrix = (np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+                      if rows else None)
+            self._semantic_index[llm_string] = (keys, matrix)
+        return self._semantic_index[llm_string]
+
+    def _expire(self, key: str) -> None:
+        # ⌛ 過期的答案直接刪掉（呼叫時需持有 self._lock）
+        if self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,)).rowcount:
+            self._size -= 1
+            self._stats["expired"] += 1
+
+    def _semantic_lookup(self, query: np.ndarray, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        keys, matrix = self._load_semantic(llm_string)
+        if matrix is None:
+            return None
+        scores = matrix @ query
+        candidates = np.flatnonzero(scores >= self.similarity_threshold)
+        expired = set()
+        result = None
+        # 由最相似的開始試：最相近的答案過期了，就改用下一個仍有效的答案
+        for i in candidates[np.argsort(-scores[candidates], kind="stable")]:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM llm_cache WHERE key = ?", (keys[i],)
+            ).fetchone()
+            if row is not None and self._fresh(row[1]):
+                self._stats["semantic_hits"] += 1
+                result = self._hit(keys[i], row[0])
+                break
+            if row is not None:
+                self._expire(keys[i])
+            expired.add(int(i))
+        if expired:
+            self._conn.commit()
+            keep = [i for i in range(len(keys)) if i not in expired]
+            self._semantic_index[llm_string] = ([keys[i] for i in keep], matrix[keep] if keep else None)
+        return result
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = self._key(prompt, llm_string)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                if self._fresh(row[1]):
+                    self._stats["exact_hits"] += 1
+                    return self._hit(key, row[0])
+                self._expire(key)
+                self._conn.commit()
+                self._semantic_index.pop(llm_string, None)
+        if self.embedding is not None:
+            # 嵌入可能要一次網路呼叫，在鎖外面做，其他執行緒的查詢不必排隊等待
+            query = self._embed(prompt)
+            with self._lock:
+                result = self._semantic_lookup(query, llm_string)
+                if result is not None:
+                    return result
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = self._key(prompt, llm_string)
+        response = json.dumps([dumps(gen) for gen in return_val])
+        vector = self._embed(prompt) if self.embedding is not None else None
+        now = time.time()
+        with self._lock:
+            existed = self._conn.execute("SELECT 1 FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache "
+                "(key, llm_string, prompt, response, vector, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, llm_string, prompt, response,
+                 vector.tobytes() if vector is not None else None, now, now),
+            )
+            if not existed:
+                self._size += 1
+            # 🧹 超過容量上限時淘汰最久沒用到的答案
+            overflow = self._size - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN "
+                    "(SELECT key FROM llm_cache ORDER BY last_used LIMIT ?)",
+                    (overflow,),
+                )
+                self._size -= overflow
+                self._stats["evictions"] += overflow
+                self._semantic_index.clear()
+            elif vector is not None and not existed and llm_string in self._semantic_index:
+                keys, matrix = self._semantic_index[llm_string]
+                matrix = vector[None, :] if matrix is None else np.vstack([matrix, vector])
+                self._semantic_index[llm_string] = (keys + [key], matrix)
+            self._conn.commit()
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+            self._size = 0
+            self._semantic_index.clear()
+
+    def stats(self) -> dict:
+        """回傳各層命中次數與整體命中率"""
+        hits = self._stats["exact_hits"] + self._stats["semantic_hits"]
+        total = hits + self._stats["misses"]
+        return {**self._stats, "hit_rate": round(hits / total, 4) if total else 0.0,
+                "entries": self._size}
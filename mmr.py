@@ -0,0 +1,84 @@
+# 🎯 向量化的 MMR（Maximal Marginal Relevance）重新排序
+# LangChain 內建的 MMR 每選一筆就重新計算「所有候選 × 已選段落」的相似度，再用 Python 迴圈逐一比較
+# 這裡先把候選向量正規化成 float32，一次算好「查詢 × 候選」與「候選 × 候選」相似度矩陣
+# 之後每一輪只需用矩陣中的一欄更新「與已選段落的最大相似度」，再以 argmax 挑出下一筆
+# MMRRetriever 可直接取代 vectorstore.as_retriever(search_type="mmr")，fetch_k 與 lambda_mult 都能調整
+from typing import List
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def maximal_marginal_relevance(query_embedding, embedding_list, lambda_mult: float = 0.5,
+                               k: int = 4, dtype=np.float32) -> List[int]:
+    """回傳 MMR 選出的候選索引（依選取順序），結果與 langchain 的同名函式一致"""
+    candidates = np.asarray(embedding_list, dtype=dtype)
+    k = min(k, len(candidates))
+    if k <= 0:
+        return []
+    candidates = _normalize(candidates)
+    query = _normalize(np.asarray(query_embedding, dtype=dtype).reshape(-1))
+
+    similarity_to_query = candidates @ query
+    # 候選之間的相似度矩陣只算一次，之後每輪重複使用
+    pairwise = candidates @ candidates.T
+
+    idxs = [int(np.argmax(similarity_to_query))]
+    redundancy = pairwise[idxs[0]].copy()  # 每個候選與「已選段落」的最大相似度
+    selected = np.zeros(len(candidates), dtype=bool)
+    selected[idxs[0]] = True
+    while len(idxs) < k:
+        scores = lambda_mult * similarity_to_query - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        idxs.append(best)
+        selected[best] = True
+        np.maximum(redundancy, pairwise[best], out=redundancy)
+    return idxs
+
+
+class MMRRetriever(BaseRetriever):
+    """以向量化 MMR 重新排序的檢索器，候選段落與向量直接從 Chroma 一次取回"""
+
+    vectorstore: VectorStore
+    k: int = 4
+    fetch_k: int = 20
+    lambda_mult: float = 0.5
+
+    def _fetch_candidates(self, query: str):
+        embedding = self.vectorstore.embeddings.embed_query(query)
+        results = self.vectorstore._collection.query(
+            query_embeddings=[embedding],
+            n_results=self.fetch_k,
+            include=["metadatas", "documents", "embeddings"],
+        )
+        documents = [
+            Document(page_content=text, metadata=metadata or {}, id=doc_id)
+            for text, metadata, doc_id in zip(
+                results["documents"][0], results["metadatas"][0], results["ids"][0])
+        ]
+        return embedding, results["embeddings"][0], documents
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        embedding, vectors, documents = self._fetch_candidates(query)
+        if not documents:
+            return []
+        chosen = set(maximal_marginal_relevance(embedding, vectors, self.lambda_mult, self.k))
+        # 與 Chroma 內建 MMR 相同：回傳的順序依候選的相似度排序
+        return [doc for i, doc in enumerate(documents) if i in chosen]
+
+
+def as_mmr_retriever(vectorstore: VectorStore, k: int = 4, fetch_k: int = 20,
+                     lambda_mult: float = 0.5) -> MMRRetriever:
+    """對應 vectorstore.as_retriever(search_type="mmr", search_kwargs={...}) 的寫法"""
+    return MMRRetriever(vectorstore=vectorstore, k=k, fetch_k=max(fetch_k, k), lambda_mult=lambda_mult)
@@ -0,0 +1,175 @@
+# 🔥 模型常駐池（Warm Model Pool）：給 configurable_alternatives 切換模型使用
+# C13 以 with_config(configurable={"llm": "llama3"}) 在每個請求切換模型；Ollama 能同時常駐的模型有限（受顯示記憶體限制），
+# 切到沒有載入的模型就要等它冷啟動，混合不同模型的流量會出現很長的尾端延遲
+# ModelPool：
+# - 透過 /api/ps 追蹤伺服器上哪些模型目前常駐，並在本機記錄最近使用的順序
+# - warm()：啟動時預先載入設定的模型（不帶 prompt 的 /api/generate），並用 keep_alive 讓模型保持常駐
+# - batch()：依模型分組，已常駐的模型先跑，每個模型只切換一次；結果依原本的順序回傳
+# - metrics()：載入時間、切換次數，以及「需要切換」與「模型已常駐」兩種請求的延遲分位數
+# - 可用 ollama_stub.py 的 /api/generate、/api/ps 在本機測試
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import requests
+from langchain_core.runnables import Runnable
+
+from http_runtime import HttpRuntime, http_runtime
+
+
+def default_base_url() -> str:
+    """與 ollama 套件相同，優先使用環境變數 OLLAMA_HOST"""
+    host = os.environ.get("OLLAMA_HOST", "127.0.0.1:11434")
+    return host if host.startswith(("http://", "https://")) else f"http://{host}"
+
+
+def tagged(name: str) -> str:
+    """Ollama 的 /api/ps 回傳帶標籤的名稱（gemma3:latest）；沒寫標籤的模型名稱補上 :latest 才比對得到"""
+    return name if ":" in name else f"{name}:latest"
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"count": len(values), "p50": round(float(p50), 4), "p95": round(float(p95), 4),
+            "p99": round(float(p99), 4), "max": round(max(values), 4)}
+
+
+class ModelPool:
+    """追蹤常駐模型、預熱、依模型分組執行，並記錄載入與切換的延遲"""
+
+    def __init__(self, models: Dict[str, str], base_url: Optional[str] = None, keep_alive: str = "30m",
+                 max_resident: int = 1, field_id: str = "llm", max_concurrency: int = 4,
+                 runtime: HttpRuntime = http_runtime, load_timeout: float = 300.0):
+        # models：configurable_alternatives 的 key -> Ollama 模型名稱，例如 {"gemma3": "gemma3", "llama3": "llama3"}
+        # max_resident：伺服器能同時常駐的模型數量（OLLAMA_MAX_LOADED_MODELS / 顯示記憶體）
+        self.models = {key: tagged(name) for key, name in models.items()}
+        self.base_url = (base_url or default_base_url()).rstrip("/")
+        self.keep_alive = keep_alive
+        self.max_resident = max_resident
+        self.field_id = field_id
+        self.max_concurrency = max_concurrency
+        self.runtime = runtime
+        self.load_timeout = load_timeout
+        self._resident: "OrderedDict[str, None]" = OrderedDict()  # 模型名稱，最近使用的在最後
+        self._lock = threading.Lock()
+        self._latency: Dict[str, List[float]] = defaultdict(list)  # "switch" / "warm" / "load"
+        self._per_model: Dict[str, List[float]] = defaultdict(list)
+        self.switches = 0
+
+    # ---------- 常駐狀態 ----------
+    def refresh(self) -> List[str]:
+        """向伺服器查詢目前常駐的模型；查詢失敗時沿用本機的紀錄"""
+        try:
+            data = self.runtime.get_json(f"{self.base_url}/api/ps", refresh=True)
+        except requests.RequestException:
+            return self.resident()
+        names = [tagged(m.get("model") or m.get("name")) for m in data.get("models", [])]
+        with self._lock:
+            for name in list(self._resident):
+                if name not in names:
+                    del self._resident[name]
+            for name in names:
+                self._resident.setdefault(name, None)
+        return self.resident()
+
+    def resident(self) -> List[str]:
+        with self._lock:
+            return list(self._resident)
+
+    def is_resident(self, key: str) -> bool:
+        with self._lock:
+            return self.models[key] in self._resident
+
+    def _mark_used(self, key: str) -> bool:
+        """記錄模型被使用，回傳這次是否需要切換（模型原本不在常駐清單）"""
+        name = self.models[key]
+        with self._lock:
+            switched = name not in self._resident
+            self._resident[name] = None
+            self._resident.move_to_end(name)
+            while len(self._resident) > self.max_resident:
+                self._resident.popitem(last=False)
+            if switched:
+                self.switches += 1
+        return switched
+
+    # ---------- 預熱 ----------
+    def load(self, key: str) -> float:
+        """要求伺服器載入模型（不生成文字），回傳花費的秒數"""
+        started = time.perf_counter()
+        response = self.runtime.session.post(
+            f"{self.base_url}/api/generate",
+            json={"model": self.models[key], "keep_alive": self.keep_alive, "stream": False},
+            timeout=(3.05, self.load_timeout),
+        )
+        response.raise_for_status()
+        seconds = time.perf_counter() - started
+        with self._lock:
+            self._latency["load"].append(seconds)
+        self._mark_used(key)
+        return seconds
+
+    def warm(self, keys: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """啟動時預熱：依序載入前 max_resident 個模型（已常駐的略過），回傳 {key: 載入秒數}"""
+        self.refresh()
+        keys = list(keys or self.models)[:self.max_resident]
+        # 最後載入的模型最不容易被擠掉，所以把最重要（排在最前面）的留到最後
+        return {key: (0.0 if self.is_resident(key) else self.load(key)) for key in reversed(keys)}
+
+    def unload(self, key: str) -> None:
+        self.runtime.session.post(f"{self.base_url}/api/generate",
+                                  json={"model": self.models[key], "keep_alive": 0}, timeout=(3.05, 30))
+        with self._lock:
+            self._resident.pop(self.models[key], None)
+
+    # ---------- 執行 ----------
+    def _run(self, chain: Runnable, key: str, inputs: Any) -> Any:
+        switched = self._mark_used(key)
+        started = time.perf_counter()
+        # 以 invoke 的 config 指定模型：會與 chain 既有的 configurable（例如 prompt）合併，with_config 則會整個覆蓋
+        result = chain.invoke(inputs, config={"configurable": {self.field_id: key}})
+        seconds = time.perf_counter() - started
+        with self._lock:
+            self._latency["switch" if switched else "warm"].append(seconds)
+            self._per_model[key].append(seconds)
+        return result
+
+    def invoke(self, chain: Runnable, key: str, inputs: Any) -> Any:
+        """以指定的模型執行單一請求，並記錄延遲"""
+        return self._run(chain, key, inputs)
+
+    def batch(self, chain: Runnable, jobs: Sequence[Tuple[str, Any]]) -> List[Any]:
+        """jobs 為 [(模型 key, 輸入), ...]；依模型分組執行，每個模型只切換一次，結果依原順序回傳"""
+        groups: "OrderedDict[str, List[int]]" = OrderedDict()
+        for i, (key, _) in enumerate(jobs):
+            groups.setdefault(key, []).append(i)
+        resident = set(self.refresh())
+        # 已常駐的模型先跑，避免它們在等待期間被其他模型擠掉
+        order = sorted(groups, key=lambda k: self.models[k] not in resident)
+        results: List[Any] = [None] * len(jobs)
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            for key in order:
+                indices = groups[key]
+                # 第一個請求單獨執行（包含載入模型），其餘請求在模型常駐後並行
+                results[indices[0]] = self._run(chain, key, jobs[indices[0]][1])
+                rest = indices[1:]
+                for i, result in zip(rest, pool.map(lambda i: self._run(chain, key, jobs[i][1]), rest)):
+                    results[i] = result
+        return results
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "switches": self.switches,
+                "resident": list(self._resident),
+                "load": _percentiles(self._latency["load"]),
+                "switch": _percentiles(self._latency["switch"]),
+                "warm": _percentiles(self._latency["warm"]),
+                "per_model": {key: _percentiles(values) for key, values in self._per_model.items()},
+            }
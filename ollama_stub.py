@@ -0,0 +1,205 @@
+# 🧪 本機的假 Ollama 伺服器（stub server）
+# 實作 Ollama 的 /api/embed，回傳 HashingEmbeddings 的確定性向量
+# 可以設定每個請求與每個段落的延遲、失敗率，用來測試批次、並行與重試邏輯
+# 另外提供 GET /weather?city=臺中市，回傳假的一週天氣資料，用來測試 http_runtime.py 與 C18
+# /api/generate 與 /api/ps 模擬模型常駐：同時最多載入 max_loaded_models 個模型，切換到未載入的模型要等 load_latency 秒
+#   與真正的 Ollama 一樣，/api/ps 回傳帶標籤的名稱（gemma3:latest）
+#   用來測試 model_pool.py 與 C13（OLLAMA_HOST=http://127.0.0.1:11435 python C13_configurable_alternatives.py）
+# 使用方式：python ollama_stub.py --port 11435
+#          OllamaEmbeddings(model="nomic-embed-text", base_url="http://127.0.0.1:11435")
+#          WEATHER_API_URL=http://127.0.0.1:11435/weather python C18_weather_API.py
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from urllib.parse import parse_qs, urlparse
+
+from fake_models import HashingEmbeddings
+
+
+class StubConfig:
+    def __init__(self, request_latency: float = 0.02, item_latency: float = 0.001,
+                 failure_rate: float = 0.0, size: int = 768, load_latency: float = 0.5,
+                 max_loaded_models: int = 1, token_latency: float = 0.002, answer_tokens: int = 16):
+        self.request_latency = request_latency
+        self.item_latency = item_latency
+        self.failure_rate = failure_rate
+        self.load_latency = load_latency
+        self.max_loaded_models = max_loaded_models
+        self.token_latency = token_latency
+        self.answer_tokens = answer_tokens
+        self.loaded: "OrderedDict[str, float]" = OrderedDict()  # 模型 -> 最後使用時間（LRU 順序）
+        self.loads = 0
+        self.generate_requests = 0
+        self.load_lock = threading.Lock()  # 模擬同一時間只能載入一個模型
+        self.embeddings = HashingEmbeddings(size=size)
+        self.requests = 0
+        self.items = 0
+        self.weather_requests = 0
+        self.lock = threading.Lock()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    config: StubConfig = None
+
+    def log_message(self, format, *args):
+        pass  # 不要把每個請求都印到終端機
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        config = self.config
+        url = urlparse(self.path)
+        if url.path == "/weather":
+            city = parse_qs(url.query).get("city", ["臺北市"])[0]
+            with config.lock:
+                config.weather_requests += 1
+            time.sleep(config.request_latency)
+            if random.random() < config.failure_rate:
+                return self._send_json(500, {"error": "stub failure"})
+            return self._send_json(200, fake_weather(city))
+        if url.path == "/api/ps":
+            with config.lock:
+                models = list(config.loaded)
+            return self._send_json(200, {"models": [{
+                "name": name, "model": name, "size": 0, "size_vram": 0,
+                "digest": f"{zlib.crc32(name.encode('utf-8')):08x}",
+            } for name in models]})
+        self._send_json(404, {"error": f"unknown endpoint {url.path}"})
+
+    def do_POST(self):
+        config = self.config
+        payload = self._read_json()
+        if self.path == "/api/embed":
+            texts = payload.get("input", [])
+            if isinstance(texts, str):
+                texts = [texts]
+            with config.lock:
+                config.requests += 1
+                config.items += len(texts)
+            time.sleep(config.request_latency + config.item_latency * len(texts))
+            if random.random() < config.failure_rate:
+                return self._send_json(500, {"error": "stub failure"})
+            return self._send_json(200, {
+                "model": payload.get("model", ""),
+                "embeddings": config.embeddings.embed_documents(texts),
+            })
+        if self.path == "/api/generate":
+            return self._generate(payload)
+        self._send_json(404, {"error": f"unknown endpoint {self.path}"})
+
+    def _load(self, model: str) -> float:
+        """確保模型已載入，回傳這次花在載入的秒數（已常駐時為 0）"""
+        config = self.config
+        model = _tagged(model)
+        with config.load_lock:
+            with config.lock:
+                if model in config.loaded:
+                    config.loaded.move_to_end(model)
+                    return 0.0
+            time.sleep(config.load_latency)
+            with config.lock:
+                config.loads += 1
+                config.loaded[model] = time.time()
+                while len(config.loaded) > config.max_loaded_models:
+                    config.loaded.popitem(last=False)
+            return config.load_latency
+
+    def _generate(self, payload: dict) -> None:
+        config = self.config
+        model = payload.get("model", "")
+        with config.lock:
+            config.generate_requests += 1
+        if payload.get("keep_alive") in (0, "0", "0s"):
+            # keep_alive=0 代表卸載模型
+            with config.lock:
+                config.loaded.pop(_tagged(model), None)
+            return self._send_json(200, {"model": model, "response": "", "done": True, "done_reason": "unload"})
+        load_seconds = self._load(model)
+        prompt = payload.get("prompt") or ""
+        final = {"model": model, "response": "", "done": True,
+                 "done_reason": "stop" if prompt else "load", "load_duration": int(load_seconds * 1e9)}
+        if not prompt:
+            # 沒有 prompt 的請求只載入模型（Ollama 的預熱方式）
+            return self._send_json(200, final)
+        start = zlib.crc32(f"{model}:{prompt}".encode("utf-8")) % 100
+        tokens = [f"字{(start + i) % 100}" for i in range(config.answer_tokens)]
+        time.sleep(config.request_latency)
+        if not payload.get("stream", True):
+            time.sleep(config.token_latency * len(tokens))
+            return self._send_json(200, {**final, "response": "".join(tokens), "eval_count": len(tokens)})
+        # 串流回應為 NDJSON，一行一個 token，最後一行 done=true
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for token in tokens:
+            time.sleep(config.token_latency)
+            self.wfile.write(json.dumps({"model": model, "response": token, "done": False}).encode("utf-8") + b"\n")
+            self.wfile.flush()
+        self.wfile.write(json.dumps({**final, "eval_count": len(tokens)}).encode("utf-8") + b"\n")
+
+
+def _tagged(name: str) -> str:
+    # 與真正的 Ollama 相同：沒有標籤的模型名稱視為 :latest，/api/ps 也回傳帶標籤的名稱
+    return name if ":" in name else f"{name}:latest"
+
+
+def fake_weather(city: str, days: int = 7) -> dict:
+    """依城市名稱產生固定的一週天氣，並帶有一些提示詞用不到的欄位"""
+    seed = zlib.crc32(city.encode("utf-8"))
+    weathers = ["晴", "多雲", "陰", "短暫陣雨", "午後雷陣雨"]
+    return {
+        "city": city,
+        "source": "stub",
+        "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "forecast": [{
+            "date": f"day-{i + 1}",
+            "weather": weathers[(seed + i) % len(weathers)],
+            "min_temp": 18 + (seed + i) % 6,
+            "max_temp": 26 + (seed + i) % 7,
+            "rain_prob": (seed * (i + 1)) % 100,
+            "wind_direction": "偏北風",
+            "station_id": f"{seed % 100000:05d}",
+            "icon_url": f"https://example.com/icons/{(seed + i) % 5}.png",
+        } for i in range(days)],
+    }
+
+
+def start_stub_server(port: int = 0, config: StubConfig = None):
+    """在背景執行緒啟動假伺服器，回傳 (server, base_url)；port=0 代表自動挑選空閒埠號"""
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": config or StubConfig()})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="假的 Ollama 伺服器")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--load-latency", type=float, default=0.5, help="載入未常駐模型的秒數")
+    parser.add_argument("--max-loaded-models", type=int, default=1, help="同時常駐的模型數量")
+    args = parser.parse_args()
+    server, url = start_stub_server(args.port, StubConfig(failure_rate=args.failure_rate,
+                                                          load_latency=args.load_latency,
+                                                          max_loaded_models=args.max_loaded_models))
+    print(f"🧪 假 Ollama 伺服器已啟動：{url}（Ctrl+C 結束）")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
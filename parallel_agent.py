@@ -0,0 +1,159 @@
+# ⚡ 可一次發出多個工具呼叫的 ReAct Agent
+# initialize_agent 的 ReAct 迴圈每一輪只能執行一個 Action，兩個互不相關的工具就要來回問兩次 LLM
+# ParallelToolAgent 讓模型在同一步列出多組 Action / Action Input：
+# - 各個工具在執行緒池中同時執行，每個工具有自己的逾時時間（從工具開始執行起算），逾時的結果以訊息代替，不會卡住整個 Agent
+# - 所有 Observation 依原本的順序合併回 scratchpad，再交給 LLM 進行下一步
+# - 可搭配 tool_cache.py 的 ToolCache（工具結果快取）與 RepeatDetector（重複動作偵測）
+import contextvars
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.agents import AgentAction
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+from langchain_core.tools import BaseTool
+
+from tool_cache import RepeatDetector, ToolCache
+
+PARALLEL_REACT_PROMPT = PromptTemplate.from_template(
+    """Answer the following questions as best you can. You have access to the following tools:
+
+{tools}
+
+Use the following format:
+
+Question: the input question you must answer
+Thought: you should always think about what to do
+Action: the action to take, should be one of [{tool_names}]
+Action Input: the input to the action
+(If several independent actions are needed, list every Action/Action Input pair in the same step; they run at the same time)
+Observation: the result of each action
+... (this Thought/Action/Action Input/Observation can repeat N times)
+Thought: I now know the final answer
+Final Answer: the final answer to the original input question
+
+Begin!
+
+Question: {input}
+Thought:{agent_scratchpad}"""
+)
+
+_ACTION = re.compile(
+    r"Action\s*\d*\s*:\s*(.*?)\s*\n\s*Action\s*\d*\s*Input\s*\d*\s*:\s*(.*?)\s*"
+    r"(?=\n\s*(?:Action\s*\d*\s*:|Observation|Thought|Final Answer)|$)",
+    re.DOTALL,
+)
+_FINAL = re.compile(r"Final Answer\s*:\s*(.*)", re.DOTALL)
+
+
+def parse_actions(text: str) -> Tuple[List[AgentAction], Optional[str]]:
+    """解析模型輸出：回傳 (多個 AgentAction, Final Answer)；有 Action 時優先執行 Action"""
+    actions = [AgentAction(tool=name.strip(), tool_input=value.strip().strip('"'), log=text)
+               for name, value in _ACTION.findall(text)]
+    final = _FINAL.search(text)
+    return actions, (final.group(1).strip() if final and not actions else None)
+
+
+class ParallelToolAgent:
+    """一步可執行多個工具的 ReAct Agent，工具在執行緒池中並行、各自逾時"""
+
+    def __init__(self, llm, tools: List[BaseTool], max_workers: int = 4,
+                 tool_timeouts: Optional[Dict[str, float]] = None, default_timeout: float = 30.0,
+                 max_iterations: int = 6, max_repeats: int = 2,
+                 prompt: PromptTemplate = PARALLEL_REACT_PROMPT, tool_cache: Optional[ToolCache] = None,
+                 verbose: bool = True):
+        # tool_cache：傳入時會在每次執行前清空「本次執行」的快取（工具需先以 tool_cache.wrap 包裝）
+        self.tool_cache = tool_cache
+        self.tools = {tool.name: tool for tool in tools}
+        self.tool_timeouts = tool_timeouts or {}
+        self.default_timeout = default_timeout
+        self.max_iterations = max_iterations
+        self.max_repeats = max_repeats
+        self.verbose = verbose
+        self.chain = prompt.partial(
+            tools="\n".join(f"{tool.name}: {tool.description}" for tool in tools),
+            tool_names=", ".join(self.tools),
+        ) | llm.bind(stop=["\nObservation"]) | StrOutputParser()
+        # 逾時的工具仍會在背景跑完，因此執行緒池不隨每次呼叫關閉
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+
+    @staticmethod
+    def _timed(tool: BaseTool, tool_input: Any, started: threading.Event, clock: List[float]) -> Any:
+        # 記錄工具真正開始執行的時間：排隊等待執行緒的時間不算在它的逾時內
+        clock.append(time.monotonic())
+        started.set()
+        return tool.invoke(tool_input)
+
+    def _run_tools(self, actions: List[AgentAction]) -> List[str]:
+        jobs = []
+        for action in actions:
+            tool = self.tools.get(action.tool)
+            if tool is None:
+                jobs.append(None)
+            else:
+                started, clock = threading.Event(), []
+                # 複製目前的 context：執行緒池裡的工具才找得到這次執行的 ToolRun（本次快取與步驟紀錄）
+                context = contextvars.copy_context()
+                jobs.append((self._pool.submit(context.run, self._timed, tool, action.tool_input, started, clock),
+                             started, clock))
+        observations = []
+        for action, job in zip(actions, jobs):
+            if job is None:
+                observations.append(f"{action.tool} 不是可用的工具，請從 [{', '.join(self.tools)}] 中選擇")
+                continue
+            future, started, clock = job
+            timeout = self.tool_timeouts.get(action.tool, self.default_timeout)
+            # 執行緒都被佔用時工具會先排隊；排隊超過同樣的時間仍未開始就放棄，避免整個 Agent 卡住
+            if not started.wait(timeout) and future.cancel():
+                observations.append(f"{action.tool} 等待 {timeout} 秒仍未開始執行")
+                continue
+            started.wait()  # cancel 失敗代表工具剛好開始執行
+            # 逾時從工具開始執行的時間起算
+            remaining = max(0.0, timeout - (time.monotonic() - clock[0]))
+            try:
+                observations.append(str(future.result(timeout=remaining)))
+            except FutureTimeout:
+                observations.append(f"{action.tool} 超過 {timeout} 秒沒有回應")
+            except Exception as e:
+                observations.append(f"{action.tool} 執行失敗：{e}")
+        return observations
+
+    def invoke(self, question: Any) -> Dict[str, Any]:
+        inputs = question if isinstance(question, dict) else {"input": question}
+        if self.tool_cache is not None:
+            self.tool_cache.start_run()
+        detector = RepeatDetector(self.max_repeats)
+        scratchpad = ""
+        steps: List[Tuple[AgentAction, str]] = []
+        for iteration in range(1, self.max_iterations + 1):
+            text = self.chain.invoke({**inputs, "agent_scratchpad": scratchpad})
+            actions, final = parse_actions(text)
+            if self.verbose:
+                print(f"\n🧠 第 {iteration} 輪（{len(actions)} 個工具呼叫）：{text.strip()}")
+            if final is not None:
+                return {**inputs, "output": final, "intermediate_steps": steps, "llm_calls": iteration}
+            if not actions:
+                # 模型沒有照格式回答，把整段輸出當成答案
+                return {**inputs, "output": text.strip(), "intermediate_steps": steps, "llm_calls": iteration}
+
+            started = time.perf_counter()
+            observations = self._run_tools(actions)
+            if self.verbose:
+                print(f"⚡ 並行執行 {len(actions)} 個工具，共 {time.perf_counter() - started:.3f}s")
+            repeated = [detector.is_repeat(action) for action in actions]
+            scratchpad += text.rstrip()
+            for action, observation in zip(actions, observations):
+                steps.append((action, observation))
+                scratchpad += f"\nObservation ({action.tool}): {observation}"
+            scratchpad += "\nThought:"
+            if all(repeated):
+                if self.verbose:
+                    print("🔁 偵測到重複的動作，提早結束")
+                return {**inputs, "output": "\n".join(observations), "intermediate_steps": steps,
+                        "llm_calls": iteration, "stopped_early": True}
+        return {**inputs, "output": "Agent stopped due to iteration limit.", "intermediate_steps": steps,
+                "llm_calls": self.max_iterations}
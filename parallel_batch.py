@@ -0,0 +1,143 @@
+# 🎬 RunnableParallel 的非同步批次執行器
+# C10 一部電影會分岔成五條 prompt | llm | parser 子鏈；要跑上千部電影時：
+# - 所有子鏈共用一個全域並行上限，並可依模型設定每秒請求數（rate limit），不會壓垮本機模型伺服器
+# - 每條子鏈都是獨立的 task，某一條特別慢也不會卡住其他電影
+# - 每部電影的五個子結果到齊就立刻回傳（串流），不必等整批跑完
+# - 相同（子鏈, 輸入）的結果會被快取，重複出現的電影不會再問一次模型
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from langchain_core.runnables import Runnable, RunnableParallel, RunnableSequence
+
+
+def find_model_key(runnable: Runnable) -> str:
+    """從 prompt | llm | parser 這類子鏈中找出模型名稱，用來套用各模型的速率限制"""
+    steps = runnable.steps if isinstance(runnable, RunnableSequence) else [runnable]
+    for step in steps:
+        model = getattr(step, "model", None) or getattr(step, "model_name", None)
+        if isinstance(model, str):
+            return model
+    return "default"
+
+
+class AsyncRateLimiter:
+    """簡單的權杖桶（token bucket）：平均每秒最多 rate 個請求"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class FanOutBatchRunner:
+    """以單一全域並行上限，批次執行 RunnableParallel（或子鏈字典）的扇出"""
+
+    def __init__(self, branches, max_concurrency: int = 8,
+                 rate_limits: Optional[Dict[str, float]] = None,
+                 max_cached_results: int = 10_000, return_exceptions: bool = False):
+        if isinstance(branches, RunnableParallel):
+            branches = branches.steps__
+        self.branches: Dict[str, Runnable] = dict(branches)
+        self.model_keys = {name: find_model_key(chain) for name, chain in self.branches.items()}
+        self.max_concurrency = max_concurrency
+        self.rate_limits = rate_limits or {}
+        self.max_cached_results = max_cached_results
+        self.return_exceptions = return_exceptions
+        self._results: "OrderedDict[Tuple[str, str], Any]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.stats = {"titles": 0, "branch_calls": 0, "cache_hits": 0, "errors": 0}
+
+    async def _call_branch(self, key: Tuple[str, str], inputs: Any,
+                           semaphore: asyncio.Semaphore, limiters: Dict[str, AsyncRateLimiter]) -> Any:
+        name = key[0]
+        limiter = limiters.get(self.model_keys[name])
+        try:
+            # 先取得並行名額再拿速率權杖：否則排隊等名額的期間，拿到的權杖會白白過期、請求擠在一起送出
+            async with semaphore:
+                if limiter is not None:
+                    await limiter.acquire()
+                self.stats["branch_calls"] += 1
+                result = await self.branches[name].ainvoke(inputs)
+        finally:
+            self._inflight.pop(key, None)
+        # 只快取成功的結果，失敗的子鏈下次會重新執行
+        self._results[key] = result
+        while len(self._results) > self.max_cached_results:
+            self._results.popitem(last=False)
+        return result
+
+    def _branch_future(self, name: str, inputs: Any, semaphore, limiters) -> asyncio.Future:
+        # 🔑 相同的（子鏈, 輸入）只會送出一次：已完成的直接取結果，執行中的共用同一個 future
+        key = (name, json.dumps(inputs, ensure_ascii=False, sort_keys=True, default=str))
+        if key in self._results:
+            self._results.move_to_end(key)
+            self.stats["cache_hits"] += 1
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(self._results[key])
+            return future
+        if key in self._inflight:
+            self.stats["cache_hits"] += 1
+            return self._inflight[key]
+        future = asyncio.ensure_future(self._call_branch(key, inputs, semaphore, limiters))
+        self._inflight[key] = future
+        return future
+
+    async def _run_one(self, index: int, inputs: Any, semaphore, limiters):
+        futures = {name: self._branch_future(name, inputs, semaphore, limiters)
+                   for name in self.branches}
+        results = await asyncio.gather(*futures.values(), return_exceptions=True)
+        output = {}
+        for name, result in zip(futures, results):
+            if isinstance(result, BaseException):
+                self.stats["errors"] += 1
+                if not self.return_exceptions:
+                    raise result
+            output[name] = result
+        self.stats["titles"] += 1
+        return index, inputs, output
+
+    async def astream(self, inputs_list: List[Any]) -> AsyncIterator[Tuple[int, Any, Dict[str, Any]]]:
+        """依完成順序逐筆產生 (原始索引, 輸入, 各子鏈結果)"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        limiters = {model: AsyncRateLimiter(rate) for model, rate in self.rate_limits.items()}
+        # 🚦 同時處理中的電影數量也有上限，避免一次建立上千個 task
+        window = self.max_concurrency * 2
+        pending, done = set(), set()
+        position = 0
+        try:
+            while position < len(inputs_list) or pending:
+                while position < len(inputs_list) and len(pending) < window:
+                    pending.add(asyncio.ensure_future(
+                        self._run_one(position, inputs_list[position], semaphore, limiters)))
+                    position += 1
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                while done:
+                    yield done.pop().result()
+        finally:
+            # 💥 出錯（或呼叫端提早停止）時，取消其他還在跑的 task 並等它們結束，不留下背景中的模型呼叫
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, *done, return_exceptions=True)
+
+    async def abatch(self, inputs_list: List[Any]) -> List[Dict[str, Any]]:
+        """跑完整批後依輸入順序回傳結果"""
+        results: List[Dict[str, Any]] = [None] * len(inputs_list)
+        async for index, _, output in self.astream(inputs_list):
+            results[index] = output
+        return results
@@ -0,0 +1,52 @@
+# 📄 平行、逐頁串流的 PDF 載入器
+# PyMuPDFLoader(...).load() 會先把整份 PDF 的每一頁都讀進記憶體
+# 這裡改成：多個行程（process）同時抽取不同頁段的文字，主程式依頁碼順序逐頁 yield 出 Document
+# 同時在途的頁段數量有上限，所以就算是上千頁的 PDF，記憶體用量也大致固定
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Tuple
+
+import pymupdf
+from langchain_core.documents import Document
+
+
+def _extract_pages(path: str, start: int, stop: int) -> List[Tuple[int, str]]:
+    """在子行程中開啟 PDF，抽取 [start, stop) 範圍的頁面文字"""
+    with pymupdf.open(path) as pdf:
+        return [(number, pdf[number].get_text()) for number in range(start, stop)]
+
+
+def _page_document(path: str, number: int, text: str, total: int, info: dict) -> Document:
+    # 與 PyMuPDFLoader 相同的欄位（page 從 0 開始），下游的 IncrementalIndex 依 page 比對變動
+    metadata = {"source": path, "file_path": path, "page": number, "total_pages": total}
+    metadata.update(info)
+    return Document(page_content=text, metadata=metadata)
+
+
+def iter_pdf_pages(path: str, workers: int = None, pages_per_task: int = 16,
+                   max_pending: int = None) -> Iterator[Document]:
+    """逐頁產生 PDF 的 Document，文字抽取分散在多個 CPU 核心上執行"""
+    with pymupdf.open(path) as pdf:
+        total = pdf.page_count
+        info = {k: v for k, v in (pdf.metadata or {}).items() if v and isinstance(v, str)}
+
+    workers = workers or os.cpu_count() or 1
+    # 📏 頁數不多時直接在主行程抽取，省下建立行程池的成本
+    if workers == 1 or total <= pages_per_task:
+        for number, text in _extract_pages(path, 0, total):
+            yield _page_document(path, number, text, total, info)
+        return
+
+    # 🚦 最多同時有 max_pending 個頁段在處理，達到上限就先等最早的頁段完成（背壓）
+    max_pending = max_pending or workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for start in range(0, total, pages_per_task):
+            pending.append(pool.submit(_extract_pages, path, start, min(start + pages_per_task, total)))
+            if len(pending) >= max_pending:
+                for number, text in pending.popleft().result():
+                    yield _page_document(path, number, text, total, info)
+        while pending:
+            for number, text in pending.popleft().result():
+                yield _page_document(path, number, text, total, info)
@@ -0,0 +1,240 @@
+# 🧩 預先編譯的提示詞模板（Compiled Prompt）與渲染結果快取
+# PromptTemplate / ChatPromptTemplate 每次 invoke 都要重新解析模板字串、驗證變數、建立訊息物件並觸發 callbacks
+# C10 的五個電影提示詞、C11 的城市模板、C13 的提示詞組合在高請求量時，這些固定成本會重複上萬次
+# compile_prompt(prompt) 回傳可直接放進 chain 的 CompiledPrompt：
+# - 建立時就把模板解析成固定文字與變數欄位，渲染只剩一次 str.format_map（C 實作）
+# - partial 變數（例如 format_instructions）在編譯時直接寫進固定文字，之後每次渲染都不必再代入
+# - 相同輸入的渲染結果（訊息類別與文字，不可變的 tuple）放進 LRU 快取，重複的請求不必再代入；
+#   每次呼叫仍會建立新的訊息物件，呼叫端修改回傳的訊息清單不會影響之後的渲染
+# - 只有變數值都是字串時才使用快取（1、1.0、True 彼此相等，共用快取鍵會渲染出不同的文字）；
+#   數字、訊息清單（MessagesPlaceholder 有傳入歷史訊息）等其他值每次都直接渲染
+# - 預設不觸發 callbacks（提示詞步驟不會出現在追蹤紀錄）；需要追蹤時設定 trace=True
+# - 只支援 f-string 格式的文字模板；jinja2 / mustache、圖片訊息、{obj.attr} 這類欄位會拋出 ValueError
+# 與原本渲染方式的效能比較：python bench_prompts.py
+from functools import lru_cache
+from functools import partial as bind
+from string import Formatter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, ChatMessage, HumanMessage, SystemMessage, convert_to_messages
+from langchain_core.messages import BaseMessage
+from langchain_core.prompt_values import ChatPromptValue, PromptValue, StringPromptValue
+from langchain_core.prompts import (
+    AIMessagePromptTemplate, BasePromptTemplate, ChatMessagePromptTemplate, ChatPromptTemplate,
+    HumanMessagePromptTemplate, MessagesPlaceholder, PromptTemplate, SystemMessagePromptTemplate,
+)
+from langchain_core.runnables import RunnableConfig, RunnableSerializable
+from pydantic import PrivateAttr
+
+_MESSAGE_CLASSES = {
+    HumanMessagePromptTemplate: HumanMessage,
+    SystemMessagePromptTemplate: SystemMessage,
+    AIMessagePromptTemplate: AIMessage,
+}
+
+def _copy_message(message: BaseMessage) -> BaseMessage:
+    return message.model_copy()
+
+
+def _same_message(message: BaseMessage) -> BaseMessage:
+    return message
+
+
+# 編譯後的模板片段：("text", 訊息類別或 None, format_map 用的模板)、("static", 訊息, None)、("placeholder", MessagesPlaceholder, 是否可省略)
+Part = Tuple[str, Any, Any]
+
+
+def _escape(text: str) -> str:
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+def parse_template(template: str) -> List[Tuple[str, Optional[str]]]:
+    """把 f-string 模板解析成 [(固定文字, 變數名稱或 None), ...]"""
+    segments = []
+    for literal, field, spec, conversion in Formatter().parse(template):
+        if field is not None and (not field.isidentifier() or spec or conversion):
+            raise ValueError(f"不支援的模板欄位：{{{field}}}")
+        segments.append((literal, field))
+    return segments
+
+
+def bake(template: str, values: Dict[str, Any]) -> str:
+    """把已知的變數值寫進模板的固定文字（值裡的大括號會被跳脫），其他欄位保留"""
+    out = []
+    for literal, field in parse_template(template):
+        out.append(_escape(literal))
+        if field is not None:
+            out.append(_escape(str(values[field])) if field in values else f"{{{field}}}")
+    return "".join(out)
+
+
+def _template_text(prompt: Any) -> str:
+    if not isinstance(prompt, PromptTemplate) or prompt.template_format != "f-string":
+        raise ValueError(f"只能編譯 f-string 格式的文字模板：{type(prompt).__name__}")
+    return prompt.template
+
+
+def _compile_parts(prompt: BasePromptTemplate) -> Tuple[List[Part], bool]:
+    if isinstance(prompt, PromptTemplate):
+        return [("text", None, _template_text(prompt))], False
+    if not isinstance(prompt, ChatPromptTemplate):
+        raise ValueError(f"不支援的提示詞類型：{type(prompt).__name__}")
+    parts: List[Part] = []
+    for message in prompt.messages:
+        if isinstance(message, BaseMessage):
+            parts.append(("static", message, None))
+        elif isinstance(message, MessagesPlaceholder):
+            parts.append(("placeholder", message, message.optional))
+        elif isinstance(message, ChatMessagePromptTemplate):
+            parts.append(("text", bind(ChatMessage, role=message.role), _template_text(message.prompt)))
+        elif type(message) in _MESSAGE_CLASSES:
+            parts.append(("text", _MESSAGE_CLASSES[type(message)], _template_text(message.prompt)))
+        else:
+            raise ValueError(f"不支援的訊息模板：{type(message).__name__}")
+    return parts, True
+
+
+class PromptRenderer:
+    """渲染用的狀態放在一般的類別裡：pydantic 模型的私有屬性每次存取都要經過 __getattr__，在熱路徑上很慢"""
+
+    __slots__ = ("parts", "chat", "static", "dynamic", "input_variables", "optional", "names", "cached")
+
+    def __init__(self, parts: List[Part], chat: bool, partials: Dict[str, Any], cache_size: int,
+                 dynamic: Optional[Dict[str, Callable[[], Any]]] = None):
+        self.dynamic = dict(dynamic or {})
+        self.dynamic.update({k: v for k, v in partials.items() if callable(v)})
+        self.static = {k: v for k, v in partials.items() if not callable(v)}
+        self.parts = [("text", kind, bake(template, self.static)) if tag == "text" else (tag, kind, template)
+                      for tag, kind, template in parts]
+        self.chat = chat
+        variables, self.optional = set(), []
+        for tag, kind, template in self.parts:
+            if tag == "text":
+                variables.update(field for _, field in parse_template(template) if field)
+            elif tag == "placeholder":
+                # optional=True 的 placeholder 在原本的模板裡是預設為 [] 的 partial，但仍可從輸入覆蓋
+                if template or kind.variable_name in self.static:
+                    self.optional.append(kind.variable_name)
+                else:
+                    variables.add(kind.variable_name)
+        self.input_variables = sorted(variables - self.dynamic.keys())
+        self.names = self.input_variables + self.optional + list(self.dynamic)
+        self.cached = lru_cache(maxsize=cache_size)(self.render_key)
+
+    def values(self, inputs: Any) -> Tuple[Any, ...]:
+        if not isinstance(inputs, dict):
+            if len(self.input_variables) != 1:
+                raise TypeError(f"輸入必須是 dict，需要的變數：{self.input_variables}")
+            inputs = {self.input_variables[0]: inputs}
+        try:
+            values = tuple([inputs[name] for name in self.input_variables])
+        except KeyError:
+            missing = sorted(set(self.input_variables) - inputs.keys())
+            raise KeyError(f"提示詞缺少變數 {missing}，收到的變數為 {sorted(inputs)}") from None
+        if self.optional:
+            # 沒有傳入時用 None 代替預設的 []，才能雜湊、使用快取
+            values += tuple([inputs.get(name, self.static.get(name) or None) for name in self.optional])
+        if self.dynamic:
+            values += tuple([fn() for fn in self.dynamic.values()])
+        return values
+
+    def render_key(self, key: Tuple[Any, ...]) -> Any:
+        """代入變數，回傳可以安全快取的結果：文字模板為字串，聊天模板為 ((建立訊息的函式, 參數), ...)"""
+        values = dict(zip(self.names, key))
+        if not self.chat:
+            return self.parts[0][2].format_map(values)
+        spec = []
+        for tag, kind, template in self.parts:
+            if tag == "text":
+                spec.append((kind, template.format_map(values)))
+            elif tag == "static":
+                spec.append((_copy_message, kind))
+            else:
+                value = values[kind.variable_name]
+                if value is None:
+                    continue
+                value = convert_to_messages(value)
+                # 與原本的模板相同，歷史訊息直接放進結果（這類輸入本來就不會進快取）
+                spec.extend((_same_message, m) for m in (value[-kind.n_messages:] if kind.n_messages else value))
+        return tuple(spec)
+
+    def render(self, inputs: Any) -> PromptValue:
+        key = self.values(inputs)
+        for value in key:
+            if value is not None and type(value) is not str:
+                # 只快取字串值：1、1.0、True（或 0.0 與 -0.0）彼此相等、雜湊也相同，放進同一個快取鍵會渲染出錯誤的文字；
+                # 訊息清單等無法雜湊的值也一樣直接渲染
+                spec = self.render_key(key)
+                break
+        else:
+            spec = self.cached(key)
+        if not self.chat:
+            return StringPromptValue(text=spec)
+        return ChatPromptValue(messages=[build(arg) for build, arg in spec])
+
+
+class CompiledPrompt(RunnableSerializable[Any, PromptValue]):
+    """預先解析的提示詞模板，輸出與原本的模板相同（StringPromptValue / ChatPromptValue）"""
+
+    input_variables: List[str]
+    cache_size: int = 1024
+    trace: bool = False
+    model_config = {"arbitrary_types_allowed": True}
+
+    _renderer: PromptRenderer = PrivateAttr(default=None)
+
+    @classmethod
+    def from_prompt(cls, prompt: BasePromptTemplate, cache_size: int = 1024, trace: bool = False,
+                    **partial_variables: Any) -> "CompiledPrompt":
+        parts, chat = _compile_parts(prompt)
+        renderer = PromptRenderer(parts, chat, {**prompt.partial_variables, **partial_variables}, cache_size)
+        return cls._wrap(renderer, cache_size, trace)
+
+    @classmethod
+    def _wrap(cls, renderer: PromptRenderer, cache_size: int, trace: bool) -> "CompiledPrompt":
+        compiled = cls(input_variables=renderer.input_variables, cache_size=cache_size, trace=trace)
+        compiled._renderer = renderer
+        return compiled
+
+    def partial(self, **kwargs: Any) -> "CompiledPrompt":
+        """與 BasePromptTemplate.partial 相同：固定部分變數，並把它們寫進編譯後的固定文字"""
+        r = self._renderer
+        renderer = PromptRenderer(r.parts, r.chat, {**r.static, **kwargs}, self.cache_size, r.dynamic)
+        return self._wrap(renderer, self.cache_size, self.trace)
+
+    def render(self, inputs: Any) -> PromptValue:
+        return self._renderer.render(inputs)
+
+    def cache_info(self):
+        return self._renderer.cached.cache_info()
+
+    # ---------- Runnable 介面 ----------
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> PromptValue:
+        if self.trace:
+            return self._call_with_config(self.render, input, config, run_type="prompt")
+        return self._renderer.render(input)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> PromptValue:
+        # 渲染只是字串處理，不必像預設實作一樣丟到執行緒池
+        return self.invoke(input, config, **kwargs)
+
+    def batch(self, inputs: List[Any], config: Any = None, *, return_exceptions: bool = False,
+              **kwargs: Any) -> List[Any]:
+        if self.trace:
+            return super().batch(inputs, config, return_exceptions=return_exceptions, **kwargs)
+        render = self._renderer.render
+        results = []
+        for item in inputs:
+            try:
+                results.append(render(item))
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results.append(e)
+        return results
+
+
+def compile_prompt(prompt: BasePromptTemplate, cache_size: int = 1024, trace: bool = False,
+                   **partial_variables: Any) -> CompiledPrompt:
+    """編譯 PromptTemplate / ChatPromptTemplate；partial_variables 會直接寫進固定文字"""
+    return CompiledPrompt.from_prompt(prompt, cache_size=cache_size, trace=trace, **partial_variables)
@@ -0,0 +1,189 @@
+# 📚 增量式 Chroma 索引（Incremental Index）
+# 把 Chroma 向量資料庫存到磁碟（chroma_db/），並另外記錄一份「來源檔案清單」(manifest)
+# 重新啟動時只重新切割、嵌入有變動的檔案或頁面，被移除的來源會一併刪除對應段落
+# 同一次寫入也會更新關鍵字倒排索引（chroma_db/{集合}.lexical.db），供 HybridRetriever 使用
+import hashlib
+import json
+import os
+from typing import Callable, Dict, Iterable, Iterator, List
+
+from langchain_community.document_loaders import TextLoader
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from lexical_index import HybridRetriever, InvertedIndex
+from pdf_stream import iter_pdf_pages
+
+
+def default_loader(path: str) -> Iterator[Document]:
+    """依副檔名挑選載入器，逐頁讀取（PDF 以多行程平行抽取文字）"""
+    if path.lower().endswith(".pdf"):
+        return iter_pdf_pages(path)
+    return TextLoader(path, encoding="utf-8").lazy_load()
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IncrementalIndex:
+    """持久化的 Chroma 集合 + 來源清單，依變動量而不是語料大小來決定啟動成本"""
+
+    def __init__(self, embedding: Embeddings, text_splitter, collection_name: str,
+                 persist_directory: str = "chroma_db",
+                 loader: Callable[[str], Iterable[Document]] = default_loader,
+                 batch_size: int = 256, lexical: bool = True):
+        self.embedding = embedding
+        self.text_splitter = text_splitter
+        self.loader = loader
+        self.batch_size = batch_size
+        self.vectorstore = Chroma(
+            collection_name=collection_name,
+            embedding_function=embedding,
+            persist_directory=persist_directory,
+        )
+        os.makedirs(persist_directory, exist_ok=True)
+        self.manifest_path = os.path.join(persist_directory, f"{collection_name}.manifest.json")
+        self.manifest = self._load_manifest()
+        self.lexical = None
+        if lexical:
+            self.lexical = InvertedIndex(os.path.join(persist_directory, f"{collection_name}.lexical.db"))
+            if not len(self.lexical) and self.manifest["files"]:
+                self._backfill_lexical()
+
+    # ---------- manifest ----------
+    def _signature(self) -> str:
+        # 切割參數或嵌入模型改變時，舊的段落全部作廢
+        splitter = self.text_splitter
+        model = getattr(self.embedding, "model_name", None) or getattr(self.embedding, "model", "")
+        return json.dumps([
+            type(splitter).__name__,
+            getattr(splitter, "_chunk_size", None),
+            getattr(splitter, "_chunk_overlap", None),
+            getattr(splitter, "_add_start_index", None),
+            model,
+        ])
+
+    def version(self) -> str:
+        """索引內容的版本：切割設定、嵌入模型或任何來源檔案改變時就會不同（可當作下游快取鍵的一部分）"""
+        files = sorted((path, entry["sha256"]) for path, entry in self.manifest["files"].items())
+        return hashlib.sha256(json.dumps([self.manifest["signature"], files]).encode("utf-8")).hexdigest()[:16]
+
+    def _load_manifest(self) -> dict:
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {"signature": None, "files": {}}
+
+    def _save_manifest(self) -> None:
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    # ---------- chunks ----------
+    def _backfill_lexical(self) -> None:
+        # 既有的向量索引還沒有關鍵字索引時，直接從 Chroma 讀出段落補建，不必重新嵌入
+        collection = self.vectorstore._collection
+        total = collection.count()
+        for offset in range(0, total, self.batch_size):
+            batch = collection.get(include=["documents"], limit=self.batch_size, offset=offset)
+            self.lexical.add(batch["ids"], batch["documents"])
+
+    def _delete(self, chunk_ids: List[str]) -> None:
+        for start in range(0, len(chunk_ids), self.batch_size):
+            self.vectorstore.delete(ids=chunk_ids[start:start + self.batch_size])
+        if self.lexical is not None:
+            self.lexical.remove(chunk_ids)
+        self.stats["chunks_deleted"] += len(chunk_ids)
+
+    def _flush(self) -> None:
+        if self._pending_chunks:
+            self.vectorstore.add_documents(self._pending_chunks, ids=self._pending_ids)
+            if self.lexical is not None:
+                self.lexical.add(self._pending_ids, [c.page_content for c in self._pending_chunks])
+            self.stats["chunks_added"] += len(self._pending_chunks)
+            self._pending_chunks, self._pending_ids = [], []
+
+    def _add_unit(self, path: str, unit: str, doc: Document) -> List[str]:
+        chunks = self.text_splitter.split_documents([doc])
+        # 🔑 段落 ID 由「檔案 + 頁碼 + 序號」決定，方便之後精準刪除
+        prefix = hashlib.sha1(path.encode("utf-8")).hexdigest()[:16]
+        ids = [f"{prefix}:{unit}:{i}" for i in range(len(chunks))]
+        # 🚰 跨頁累積成一批再嵌入：頁面一邊載入、一邊切割、一邊送去嵌入，緩衝區大小固定
+        self._pending_chunks.extend(chunks)
+        self._pending_ids.extend(ids)
+        if len(self._pending_chunks) >= self.batch_size:
+            self._flush()
+        return ids
+
+    def _sync_file(self, path: str) -> None:
+        stat = os.stat(path)
+        entry = self.manifest["files"].get(path)
+        if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            self.stats["files_skipped"] += 1
+            return
+        sha = file_sha256(path)
+        if entry and entry["sha256"] == sha:
+            entry["mtime"], entry["size"] = stat.st_mtime, stat.st_size
+            self.stats["files_skipped"] += 1
+            return
+
+        old_units: Dict[str, dict] = entry["units"] if entry else {}
+        units = {}
+        for i, doc in enumerate(self.loader(path)):
+            unit = str(doc.metadata.get("page", i))
+            unit_sha = hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+            old = old_units.pop(unit, None)
+            if old and old["sha256"] == unit_sha:
+                units[unit] = old
+                continue
+            # 🔄 只有內容變動的頁面才重新切割與嵌入
+            if old:
+                self._delete(old["chunk_ids"])
+            units[unit] = {"sha256": unit_sha, "chunk_ids": self._add_unit(path, unit, doc)}
+            self.stats["units_updated"] += 1
+        # 🗑️ 檔案變短、頁面消失時，刪除多出來的段落
+        for old in old_units.values():
+            self._delete(old["chunk_ids"])
+
+        self.manifest["files"][path] = {
+            "mtime": stat.st_mtime, "size": stat.st_size, "sha256": sha, "units": units,
+        }
+        self.stats["files_updated"] += 1
+
+    def sync(self, paths: List[str]) -> dict:
+        """讓索引與指定的來源檔案一致，回傳這次同步的統計"""
+        self.stats = {"files_skipped": 0, "files_updated": 0, "files_removed": 0,
+                      "units_updated": 0, "chunks_added": 0, "chunks_deleted": 0}
+        self._pending_chunks, self._pending_ids = [], []
+        files = self.manifest["files"]
+        signature = self._signature()
+        if self.manifest["signature"] != signature:
+            for entry in files.values():
+                for unit in entry["units"].values():
+                    self._delete(unit["chunk_ids"])
+            files.clear()
+            self.manifest["signature"] = signature
+
+        wanted = [os.path.abspath(p) for p in paths]
+        for path in wanted:
+            self._sync_file(path)
+        for path in set(files) - set(wanted):
+            for unit in files.pop(path)["units"].values():
+                self._delete(unit["chunk_ids"])
+            self.stats["files_removed"] += 1
+
+        self._flush()
+        self._save_manifest()
+        return self.stats
+
+    def as_hybrid_retriever(self, k: int = 4, fetch_k: int = 20, rrf_k: int = 60) -> HybridRetriever:
+        """向量 + 關鍵字的混合檢索器（需要 lexical=True）"""
+        return HybridRetriever(vectorstore=self.vectorstore, lexical=self.lexical,
+                               k=k, fetch_k=max(fetch_k, k), rrf_k=rrf_k)
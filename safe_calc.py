@@ -0,0 +1,204 @@
+# 🧮 安全、可快取的算式計算引擎（取代 eval）
+# C08 的 Calculator 直接 eval(模型輸出)：既危險（可以執行任意程式碼），每次也都要重新編譯
+# - 算式先解析成 AST，只允許白名單內的運算子與函式（sqrt、pow、log…）與一般十進位數字，其他語法一律拒絕
+# - 次方在計算前先估計結果大小，整數結果限制在固定位元數內，避免 (9**9999)**9999 這類算式卡住工具
+# - 數字常數先抽出成參數，只解析算式的「結構」：「sqrt(144)」與「sqrt(169)」共用同一個編譯結果
+# - 編譯結果放進 LRU 快取，相同結構的算式不必再解析與檢查
+# - evaluate_batch 把同樣結構、常數都是浮點數的算式分成一組，以 NumPy 陣列一次算完；
+#   整數算式（大整數要算到精確值、結果型別要維持 int）與 floor、sin 等函式逐一計算，結果與 evaluate 完全相同
+import ast
+import math
+import operator
+import re
+from collections import defaultdict
+from functools import lru_cache, reduce
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+_BINARY_OPS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod, ast.Pow: operator.pow,
+}
+_UNARY_OPS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+_MAX_EXPONENT = 10_000  # 避免 9 ** 9 ** 9 這種算不完的算式
+_MAX_INT_BITS = 4096  # 整數結果的位元數上限；(9**9999)**9999 這類算式在計算前就拒絕
+
+
+def _check_size(value):
+    if isinstance(value, int) and value.bit_length() > _MAX_INT_BITS:
+        raise ValueError(f"結果過大（整數上限 {_MAX_INT_BITS} 位元）")
+    return value
+
+
+def _safe_pow(base, exponent):
+    if np.any(np.abs(exponent) > _MAX_EXPONENT):
+        raise ValueError(f"指數過大（上限 {_MAX_EXPONENT}）")
+    # 整數次方會算出完整的大整數：先以 底數位元數 × 指數 估計結果大小，太大就不計算
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0 \
+            and abs(base).bit_length() * exponent > _MAX_INT_BITS:
+        raise ValueError(f"結果過大（整數上限 {_MAX_INT_BITS} 位元）")
+    return _check_size(operator.pow(base, exponent))
+
+
+def _safe_binary(op):
+    # 乘法等運算也會讓整數變大，每一步都檢查結果大小
+    return lambda left, right: _check_size(op(left, right))
+
+
+SCALAR_FUNCTIONS: Dict[str, Callable] = {
+    "sqrt": math.sqrt, "pow": _safe_pow, "abs": abs, "round": round, "min": min, "max": max,
+    "exp": math.exp, "log": math.log, "log10": math.log10, "log2": math.log2,
+    "sin": math.sin, "cos": math.cos, "tan": math.tan, "floor": math.floor, "ceil": math.ceil,
+}
+VECTOR_FUNCTIONS: Dict[str, Callable] = {
+    "sqrt": np.sqrt, "pow": _safe_pow, "abs": np.abs, "round": np.round,
+    "min": lambda *xs: reduce(np.minimum, xs), "max": lambda *xs: reduce(np.maximum, xs),
+    "exp": np.exp, "log": lambda x, base=None: np.log(x) if base is None else np.log(x) / np.log(base),
+    "log10": np.log10, "log2": np.log2, "sin": np.sin, "cos": np.cos, "tan": np.tan,
+    "floor": np.floor, "ceil": np.ceil,
+}
+CONSTANTS = {"pi": math.pi, "e": math.e}
+# NumPy 版本與 math 版本結果完全相同的函式（floor、round 在 math 回傳 int；sin、log 等可能差在最後一位）
+_EXACT_VECTOR_FUNCTIONS = {"sqrt", "pow", "abs", "min", "max"}
+
+# 模型常輸出的全形符號與習慣寫法
+_REPLACEMENTS = str.maketrans({"×": "*", "÷": "/", "（": "(", "）": ")", "＋": "+", "－": "-", "，": ",", "^": "**"})
+_ROOT = re.compile(r"√\s*(\d+(?:\.\d+)?)")
+# 數字常數（不包含 log10、log2 這類名稱裡的數字）
+_NUMBER = re.compile(r"(?<![\w.])(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")
+# 算式裡所有看起來像數字的字面值；每一個都必須整段符合 _NUMBER（0x10、1_000、2j 只會被抽出一部分）
+_LITERAL = re.compile(r"(?<![\w.])[\d.](?:[eE][+-]|[\w.])*")
+
+
+def normalize_expression(text: str) -> str:
+    text = text.strip().strip("'\"`").translate(_REPLACEMENTS)
+    return _ROOT.sub(r"sqrt(\1)", text).replace("√", "sqrt")
+
+
+def _number(literal: str):
+    return float(literal) if any(c in literal for c in ".eE") else int(literal)
+
+
+def _compile(node: ast.AST, constants: List[float]) -> Callable:
+    """把 AST 節點編譯成 f(values, functions)；數字常數依出現順序放進 constants"""
+    if isinstance(node, ast.Expression):
+        return _compile(node.body, constants)
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        index = len(constants)
+        constants.append(node.value)
+        return lambda values, fns: values[index]
+    if isinstance(node, ast.Name) and node.id in CONSTANTS:
+        value = CONSTANTS[node.id]
+        return lambda values, fns: value
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+        op = _safe_pow if isinstance(node.op, ast.Pow) else _safe_binary(_BINARY_OPS[type(node.op)])
+        left, right = _compile(node.left, constants), _compile(node.right, constants)
+        return lambda values, fns: op(left(values, fns), right(values, fns))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+        op, operand = _UNARY_OPS[type(node.op)], _compile(node.operand, constants)
+        return lambda values, fns: op(operand(values, fns))
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+            and node.func.id in SCALAR_FUNCTIONS and not node.keywords):
+        name, args = node.func.id, [_compile(arg, constants) for arg in node.args]
+        return lambda values, fns: fns[name](*(arg(values, fns) for arg in args))
+    raise ValueError(f"不支援的語法：{ast.dump(node)[:60]}")
+
+
+@lru_cache(maxsize=4096)
+def _compile_template(template: str) -> Callable:
+    """解析並驗證算式結構（數字都已換成 0），回傳編譯後的函式"""
+    try:
+        tree = ast.parse(template, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"算式格式錯誤：{template}") from e
+    function = _compile(tree, [])
+    # 只用到四則運算與結果完全相同的函式時，才能交給 evaluate_batch 以 NumPy 計算
+    function.vectorizable = all(node.func.id in _EXACT_VECTOR_FUNCTIONS
+                                for node in ast.walk(tree) if isinstance(node, ast.Call))
+    return function
+
+
+@lru_cache(maxsize=4096)
+def compile_expression(expression: str) -> Tuple[Callable, Tuple[float, ...]]:
+    """回傳 (編譯後的函式, 常數)；數字依出現順序抽出，與 AST 的走訪順序一致"""
+    normalized = normalize_expression(expression)
+    for literal in _LITERAL.findall(normalized):
+        if not _NUMBER.fullmatch(literal):
+            # 否則抽出的數字與 AST 裡的常數對不上，會默默算出錯的結果
+            raise ValueError(f"只支援一般的十進位數字：{literal}")
+    constants = tuple(_number(literal) for literal in _NUMBER.findall(normalized))
+    return _compile_template(_NUMBER.sub("0", normalized)), constants
+
+
+def evaluate(expression: str) -> Any:
+    function, constants = compile_expression(expression)
+    return function(constants, SCALAR_FUNCTIONS)
+
+
+def evaluate_batch(expressions: Sequence[str]) -> List[Any]:
+    """結果與逐一呼叫 evaluate 相同，依輸入順序回傳；無法計算的算式回傳 ValueError / ArithmeticError / TypeError"""
+    results: List[Any] = [None] * len(expressions)
+    groups: Dict[Callable, List[Tuple[int, Tuple[float, ...]]]] = defaultdict(list)
+    for i, expression in enumerate(expressions):
+        try:
+            function, constants = compile_expression(expression)
+        except ValueError as e:
+            results[i] = e
+            continue
+        if function.vectorizable and all(type(c) is float for c in constants):
+            groups[function].append((i, constants))
+        else:
+            # 整數要保留精確值與 int 型別（2**60+1、7//2），不能轉成 float64
+            results[i] = _evaluate_one(function, constants)
+    for function, members in groups.items():
+        columns = [np.asarray(column, dtype=np.float64) for column in zip(*(c for _, c in members))]
+        try:
+            with np.errstate(divide="raise", invalid="raise", over="raise"):
+                values = np.broadcast_to(function(columns, VECTOR_FUNCTIONS), (len(members),))
+            for (i, _), value in zip(members, values.tolist()):
+                results[i] = value
+        except (ValueError, ArithmeticError, TypeError):
+            # 這一組裡有除以零等錯誤，逐一計算找出是哪一個
+            for i, constants in members:
+                results[i] = _evaluate_one(function, constants)
+    return results
+
+
+def _evaluate_one(function: Callable, constants: Tuple[float, ...]) -> Any:
+    try:
+        return function(constants, SCALAR_FUNCTIONS)
+    except (ValueError, ArithmeticError, TypeError) as e:
+        return e
+
+
+def format_number(value: Any) -> str:
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return str(value)
+
+
+def calculator(query: str) -> str:
+    """給 Agent 使用的計算機工具"""
+    try:
+        return f"{query} 的結果是：{format_number(evaluate(query))}"
+    except (ValueError, ArithmeticError, TypeError) as e:
+        return f"無法計算：{e}"
+
+
+if __name__ == "__main__":
+    # ✅ 自我檢查：evaluate_batch 的結果（值與型別）必須與逐一 evaluate 完全相同
+    def _outcome(value: Any) -> Any:
+        return (type(value), str(value)) if isinstance(value, Exception) else (type(value), value)
+
+    samples = ["2**60+1", "7//2", "7/2", "1.5*2", "2.5*4.0", "sqrt(2.0)", "sqrt(16)", "floor(2.5)", "round(2.5)",
+               "1/0", "1.0/0.0", "sqrt(-1.0)", "max(1.0, 2.0)", "abs(-3)", "2.0**0.5", "pi*2.0", "10 % 3",
+               "10.5 % 3.0", "-7.0 // 2.0", "1e308*10.0", "2.0**2000", "sin(1.0)", "log(8.0, 2.0)", "0x10"]
+    batch = evaluate_batch(samples)
+    for expression, value in zip(samples, batch):
+        try:
+            expected = evaluate(expression)
+        except (ValueError, ArithmeticError, TypeError) as e:
+            expected = e
+        assert _outcome(value) == _outcome(expected), f"{expression}: {value!r} != {expected!r}"
+    print(f"✅ evaluate_batch 與 evaluate 結果一致（{len(samples)} 個算式）")
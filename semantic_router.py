@@ -0,0 +1,86 @@
+# 🧭 以嵌入向量分類意圖的路由器（取代關鍵字判斷 + RunnableBranch）
+# C12 用 any(k in question for k in [...]) 判斷任務，「幫我把這段改成英文」「這個詞代表什麼」這類沒寫到關鍵字的問題就會分錯
+# RunnableBranch 也是依序檢查每個條件，路線越多越慢
+# SemanticRouter：
+# - 每條路線只需要幾個範例問題；範例一次嵌入後取平均（質心），所有質心放在同一個矩陣
+# - 分類 = 問題的嵌入向量 × 質心矩陣，取分數最高的路線；分數低於門檻就走預設路線
+# - 相同問題的路由結果放進 LRU 快取；分派以 dict 查詢目標 chain（O(1)），不必逐一檢查條件
+# - 新增路線只要呼叫 add_route(名稱, 範例, chain)
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables import Runnable, RunnableLambda
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+class SemanticRouter:
+    """以範例問題的質心向量分類意圖，並分派到對應的 chain"""
+
+    def __init__(self, embedding: Embeddings, default: Runnable, threshold: float = 0.2,
+                 cache_size: int = 1024, input_key: str = "question"):
+        # threshold：與最接近的質心的餘弦相似度低於此值時走預設路線（依嵌入模型調整）
+        self.embedding = embedding
+        self.default = default
+        self.threshold = threshold
+        self.cache_size = cache_size
+        self.input_key = input_key
+        self.names: List[str] = []
+        self.chains: Dict[str, Runnable] = {"default": default}
+        self._examples: Dict[str, np.ndarray] = {}
+        self._centroids = np.zeros((0, 0), dtype=np.float32)
+        self._cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self.stats = {"classified": 0, "cache_hits": 0, "embed_seconds": 0.0}
+
+    def add_route(self, name: str, examples: Sequence[str], chain: Runnable) -> "SemanticRouter":
+        """新增（或取代）一條路線；範例以一次 embed_documents 呼叫嵌入"""
+        vectors = _normalize(np.asarray(self.embedding.embed_documents(list(examples)), dtype=np.float32))
+        if name not in self._examples:
+            self.names.append(name)
+        self._examples[name] = vectors
+        self.chains[name] = chain
+        self._centroids = _normalize(np.stack([self._examples[n].mean(axis=0) for n in self.names]))
+        self._cache.clear()
+        return self
+
+    def classify(self, question: str) -> Tuple[str, float]:
+        """回傳 (路線名稱, 相似度)；沒有路線或分數低於門檻時為 ("default", 分數)"""
+        key = question.strip()
+        hit = self._cache.get(key)
+        if hit is not None:
+            self._cache.move_to_end(key)
+            self.stats["cache_hits"] += 1
+            return hit
+        if not self.names:
+            return "default", 0.0
+        started = time.perf_counter()
+        vector = _normalize(np.asarray(self.embedding.embed_query(key), dtype=np.float32))
+        self.stats["embed_seconds"] += time.perf_counter() - started
+        self.stats["classified"] += 1
+        scores = self._centroids @ vector
+        best = int(scores.argmax())
+        score = float(scores[best])
+        result = (self.names[best] if score >= self.threshold else "default", score)
+        self._cache[key] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+    def route(self, inputs: Dict[str, Any]) -> Runnable:
+        return self.chains[self.classify(inputs[self.input_key])[0]]
+
+    def as_runnable(self) -> Runnable:
+        """RunnableLambda 回傳的 Runnable 會以同樣的輸入直接執行，所以這就是完整的「分類 → 分支」"""
+        return RunnableLambda(self.route, name="SemanticRouter")
+
+    def evaluate(self, labelled: Sequence[Tuple[str, str]]) -> float:
+        """以 (問題, 正確路線) 計算準確率，方便調整範例與門檻"""
+        if not labelled:
+            return 0.0
+        return sum(self.classify(q)[0] == label for q, label in labelled) / len(labelled)
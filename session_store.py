@@ -0,0 +1,197 @@
+# 👥 有上限、會淘汰的 session 儲存區（給 RunnableWithMessageHistory 使用）
+# C14 原本用一個 dict 保存所有 session 的 ChatMessageHistory，使用者越多、聊越久，記憶體就無限成長
+# - 最多保留 max_sessions 個 session（LRU），閒置超過 idle_ttl 秒的 session 也會被淘汰
+# - 每個 session 的訊息數與 token 數都有上限，超過時從最舊的對話開始裁切
+# - 可選擇把被淘汰的 session 寫進 SQLite（spill），下次同一個 session_id 出現時再載回來
+# - 被淘汰時仍在使用中的對話紀錄（例如正在等模型回應的請求）之後寫入新訊息，會自動放回儲存區，訊息不會遺失
+# - start_sweeper()：在背景定期淘汰閒置的 session，不必等到下一次 get() 才清理
+import json
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+from langchain_core.chat_history import InMemoryChatMessageHistory
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict, trim_messages
+from pydantic import PrivateAttr
+
+from token_counter import count_message_tokens
+
+
+class BoundedChatMessageHistory(InMemoryChatMessageHistory):
+    """訊息數與 token 數都有上限的記憶體對話紀錄"""
+
+    max_messages: Optional[int] = None
+    max_tokens: Optional[int] = None
+
+    # 寫入新訊息後呼叫（SessionStore 用來把已被淘汰、但仍在使用中的紀錄放回儲存區）
+    _on_change: Optional[Callable[["BoundedChatMessageHistory"], None]] = PrivateAttr(default=None)
+
+    def add_messages(self, messages: List[BaseMessage]) -> None:
+        self.messages.extend(messages)
+        self._trim()
+        if self._on_change is not None:
+            self._on_change(self)
+
+    def add_message(self, message: BaseMessage) -> None:
+        self.add_messages([message])
+
+    def _trim(self) -> None:
+        messages = self.messages
+        if self.max_messages is not None and len(messages) > self.max_messages:
+            messages = messages[-self.max_messages:]
+        if self.max_tokens is not None and count_message_tokens(messages) > self.max_tokens:
+            # ✂️ 保留 system 訊息與最近的對話，並確保第一則是使用者的發言
+            messages = trim_messages(
+                messages,
+                max_tokens=self.max_tokens,
+                token_counter=count_message_tokens,
+                strategy="last",
+                start_on="human",
+                include_system=True,
+            )
+        self.messages = list(messages)
+
+
+class SessionStore:
+    """LRU + 閒置逾時 + 每個 session 的訊息上限，並提供記憶體用量與淘汰統計"""
+
+    def __init__(self, max_sessions: int = 1000, idle_ttl: Optional[float] = 30 * 60,
+                 max_messages: Optional[int] = 50, max_tokens: Optional[int] = 3000,
+                 spill_path: Optional[str] = None):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_messages = max_messages
+        self.max_tokens = max_tokens
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()  # session_id -> (history, 最後使用時間)
+        # 已淘汰但呼叫端還握著的紀錄：同一個 session 再出現時沿用同一個物件，不載入較舊的 spill 內容
+        self._detached: "weakref.WeakValueDictionary[str, BoundedChatMessageHistory]" = weakref.WeakValueDictionary()
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._sweeper: Optional[threading.Thread] = None
+        self._stats = {"created": 0, "reloaded": 0, "reattached": 0,
+                       "evicted_lru": 0, "evicted_idle": 0, "spilled": 0}
+        self._conn = None
+        if spill_path:
+            self._conn = sqlite3.connect(spill_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS spilled_sessions ("
+                "session_id TEXT PRIMARY KEY, messages TEXT, updated_at REAL)"
+            )
+            self._conn.commit()
+
+    def _new_history(self, session_id: str, messages: List[BaseMessage] = None) -> BoundedChatMessageHistory:
+        history = BoundedChatMessageHistory(max_messages=self.max_messages, max_tokens=self.max_tokens)
+        if messages:
+            history.add_messages(messages)
+        history._on_change = lambda h: self._touch(session_id, h)
+        return history
+
+    def _touch(self, session_id: str, history: BoundedChatMessageHistory) -> None:
+        # 📌 已被淘汰的紀錄又寫入新訊息：放回儲存區（成為最近使用的 session），磁碟上的舊版本作廢
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None and entry[0] is history:
+                self._sessions[session_id] = (history, now)
+                self._sessions.move_to_end(session_id)
+                return
+            self._sessions.pop(session_id, None)
+            self._detached.pop(session_id, None)
+            self._discard_spill(session_id)
+            self._stats["reattached"] += 1
+            self._sessions[session_id] = (history, now)
+            self._evict(now)
+
+    def _spill(self, session_id: str, history: BoundedChatMessageHistory) -> None:
+        if self._conn is None or not history.messages:
+            return
+        self._conn.execute(
+            "INSERT OR REPLACE INTO spilled_sessions (session_id, messages, updated_at) VALUES (?, ?, ?)",
+            (session_id, json.dumps(messages_to_dict(history.messages), ensure_ascii=False), time.time()),
+        )
+        self._conn.commit()
+        self._stats["spilled"] += 1
+
+    def _discard_spill(self, session_id: str) -> None:
+        if self._conn is not None:
+            self._conn.execute("DELETE FROM spilled_sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def _reload(self, session_id: str) -> Optional[List[BaseMessage]]:
+        if self._conn is None:
+            return None
+        row = self._conn.execute(
+            "SELECT messages FROM spilled_sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        self._discard_spill(session_id)
+        return messages_from_dict(json.loads(row[0]))
+
+    def _evict(self, now: float) -> None:
+        # ⌛ OrderedDict 依使用時間排序，最前面的就是最久沒用的，逐一檢查即可
+        while self._sessions:
+            session_id, (history, last_used) = next(iter(self._sessions.items()))
+            if len(self._sessions) > self.max_sessions:
+                self._stats["evicted_lru"] += 1
+            elif self.idle_ttl is not None and now - last_used > self.idle_ttl:
+                self._stats["evicted_idle"] += 1
+            else:
+                break
+            del self._sessions[session_id]
+            self._spill(session_id, history)
+            self._detached[session_id] = history
+
+    def get(self, session_id: str) -> BoundedChatMessageHistory:
+        """取得（或建立）session 的對話紀錄，可直接當作 get_session_history 使用"""
+        now = time.time()
+        with self._lock:
+            if session_id in self._sessions:
+                history = self._sessions.pop(session_id)[0]
+            elif session_id in self._detached:
+                # 被淘汰時仍在使用中，記憶體裡的物件比磁碟上的快照新
+                history = self._detached.pop(session_id)
+                self._discard_spill(session_id)
+                self._stats["reattached"] += 1
+            else:
+                messages = self._reload(session_id)
+                self._stats["reloaded" if messages else "created"] += 1
+                history = self._new_history(session_id, messages)
+            self._sessions[session_id] = (history, now)
+            self._evict(now)
+            return history
+
+    def sweep(self) -> None:
+        """淘汰閒置與超過數量上限的 session"""
+        with self._lock:
+            self._evict(time.time())
+
+    def start_sweeper(self, interval: float = 60.0) -> None:
+        """在背景每 interval 秒淘汰一次閒置的 session（沒有新請求時記憶體也會被釋放）"""
+        if self._sweeper and self._sweeper.is_alive():
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.wait(interval):
+                self.sweep()
+        self._sweeper = threading.Thread(target=loop, name="session-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> dict:
+        """目前的 session 數、訊息數、估計的 token 數與位元組數，以及累計淘汰次數"""
+        with self._lock:
+            histories = [history for history, _ in self._sessions.values()]
+            return {
+                **self._stats,
+                "sessions": len(histories),
+                "messages": sum(len(h.messages) for h in histories),
+                "tokens": sum(count_message_tokens(h.messages) for h in histories),
+                "bytes": sum(len(str(m.content).encode("utf-8")) for h in histories for m in h.messages),
+            }
@@ -0,0 +1,149 @@
+# 🗂️ 可分頁讀取的 SQL 對話紀錄（Windowed SQL Chat History）
+# 建立在 SQLChatMessageHistory 之上，資料表格式完全相容（id, session_id, message）
+# - 為 (session_id, id) 建立複合索引：id 依寫入順序遞增，因此也就是訊息的時間順序
+# - 另建一張 <table>_sessions 表（由 trigger 自動維護），記錄每個 session 的訊息數、最後一則 id 與時間
+#   列出所有助理只需要掃描 sessions 表，不必對整張對話表做 SELECT DISTINCT
+# - 支援「最後 N 則」、「某個 id 之後的訊息」等視窗讀取，長期使用的 session 也能固定時間載入
+# - <table>_summaries 表保存摘要檢查點（摘要內容 + 已摘要到的最後一則訊息 id）
+import time
+from typing import List, Optional, Tuple
+
+from langchain_community.chat_message_histories import SQLChatMessageHistory
+from langchain_core.messages import BaseMessage
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+
+# SQLite 沒有 unixepoch() 的舊版本也能用的「目前時間（秒）」寫法
+_NOW = "((julianday('now') - 2440587.5) * 86400.0)"
+
+
+def ensure_history_schema(engine: Engine, table_name: str) -> None:
+    """建立索引、sessions 表、摘要檢查點表與維護它們的 trigger（重複執行也不會有副作用）"""
+    t, s = table_name, f"{table_name}_sessions"
+    with engine.begin() as conn:
+        conn.execute(text(
+            f'CREATE TABLE IF NOT EXISTS "{t}" '
+            f'(id INTEGER NOT NULL PRIMARY KEY, session_id TEXT, message TEXT)'
+        ))
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS "ix_{t}_session_id_id" ON "{t}" (session_id, id)'))
+        conn.execute(text(
+            f'CREATE TABLE IF NOT EXISTS "{s}" ('
+            f'session_id TEXT PRIMARY KEY, message_count INTEGER NOT NULL DEFAULT 0, '
+            f'last_message_id INTEGER, created_at REAL, updated_at REAL)'
+        ))
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS "ix_{s}_updated_at" ON "{s}" (updated_at)'))
+        conn.execute(text(
+            f'CREATE TABLE IF NOT EXISTS "{t}_summaries" ('
+            f'session_id TEXT PRIMARY KEY, summary TEXT, last_message_id INTEGER, updated_at REAL)'
+        ))
+        # 🔄 第一次啟用時，從既有的對話紀錄回填 sessions 表
+        if conn.execute(text(f'SELECT COUNT(*) FROM "{s}"')).scalar() == 0:
+            conn.execute(text(
+                f'INSERT OR IGNORE INTO "{s}" '
+                f'SELECT session_id, COUNT(*), MAX(id), {_NOW}, {_NOW} FROM "{t}" GROUP BY session_id'
+            ))
+        conn.execute(text(
+            f'CREATE TRIGGER IF NOT EXISTS "trg_{t}_insert" AFTER INSERT ON "{t}" BEGIN '
+            f'INSERT INTO "{s}" (session_id, message_count, last_message_id, created_at, updated_at) '
+            f'VALUES (NEW.session_id, 1, NEW.id, {_NOW}, {_NOW}) '
+            f'ON CONFLICT(session_id) DO UPDATE SET message_count = message_count + 1, '
+            f'last_message_id = NEW.id, updated_at = excluded.updated_at; END'
+        ))
+        conn.execute(text(
+            f'CREATE TRIGGER IF NOT EXISTS "trg_{t}_delete" AFTER DELETE ON "{t}" BEGIN '
+            f'UPDATE "{s}" SET message_count = message_count - 1 WHERE session_id = OLD.session_id; '
+            f'DELETE FROM "{s}" WHERE session_id = OLD.session_id AND message_count <= 0; END'
+        ))
+
+
+def list_sessions(connection: str, table_name: str = "message_store") -> List[str]:
+    """列出所有 session（最近使用的排前面），成本只和 session 數量有關"""
+    engine = create_engine(connection)
+    ensure_history_schema(engine, table_name)
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            f'SELECT session_id FROM "{table_name}_sessions" ORDER BY updated_at DESC'
+        )).fetchall()
+    engine.dispose()
+    return [row[0] for row in rows]
+
+
+class WindowedSQLChatMessageHistory(SQLChatMessageHistory):
+    """只讀取需要的那一段訊息的 SQLChatMessageHistory"""
+
+    def __init__(self, session_id: str, connection: str, table_name: str = "message_store",
+                 window_size: Optional[int] = None, **kwargs):
+        super().__init__(session_id=session_id, connection=connection, table_name=table_name, **kwargs)
+        self.table_name = table_name
+        # window_size：messages 只回傳最後 N 則；since_id：只回傳 id 大於它的訊息
+        self.window_size = window_size
+        self.since_id: Optional[int] = None
+        ensure_history_schema(self.engine, table_name)
+
+    def _query(self, after_id: Optional[int] = None, limit: Optional[int] = None,
+               newest: bool = False) -> List[Tuple[int, BaseMessage]]:
+        model = self.sql_model_class
+        with self._make_sync_session() as session:
+            query = session.query(model).where(
+                getattr(model, self.session_id_field_name) == self.session_id
+            )
+            if after_id is not None:
+                query = query.where(model.id > after_id)
+            # 取最後 N 則：倒序取 N 筆再反轉，走 (session_id, id) 索引
+            query = query.order_by(model.id.desc() if newest else model.id.asc())
+            if limit is not None:
+                query = query.limit(limit)
+            records = [(record.id, self.converter.from_sql_model(record)) for record in query]
+        return records[::-1] if newest else records
+
+    @property
+    def messages(self) -> List[BaseMessage]:  # type: ignore[override]
+        if self.window_size is None and self.since_id is None:
+            return super().messages
+        return [m for _, m in self._query(self.since_id, self.window_size, newest=True)]
+
+    def get_last_messages(self, n: int) -> List[BaseMessage]:
+        """最後 n 則訊息（依時間順序）"""
+        return [m for _, m in self._query(limit=n, newest=True)]
+
+    def get_messages_after(self, message_id: Optional[int],
+                           limit: Optional[int] = None) -> List[Tuple[int, BaseMessage]]:
+        """id 大於 message_id 的訊息，回傳 (id, 訊息)，可用 limit 分頁"""
+        return self._query(after_id=message_id, limit=limit)
+
+    def _session_row(self):
+        with self.engine.connect() as conn:
+            return conn.execute(text(
+                f'SELECT message_count, last_message_id FROM "{self.table_name}_sessions" '
+                f'WHERE session_id = :sid'
+            ), {"sid": self.session_id}).fetchone()
+
+    def get_summary_checkpoint(self) -> Tuple[str, Optional[int]]:
+        """回傳 (摘要內容, 已摘要到的最後一則訊息 id)；尚未摘要過時為 ("", None)"""
+        with self.engine.connect() as conn:
+            row = conn.execute(text(
+                f'SELECT summary, last_message_id FROM "{self.table_name}_summaries" '
+                f'WHERE session_id = :sid'
+            ), {"sid": self.session_id}).fetchone()
+        return (row[0], row[1]) if row else ("", None)
+
+    def save_summary_checkpoint(self, summary: str, last_message_id: Optional[int]) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                f'INSERT OR REPLACE INTO "{self.table_name}_summaries" '
+                f'(session_id, summary, last_message_id, updated_at) VALUES (:sid, :summary, :last_id, :now)'
+            ), {"sid": self.session_id, "summary": summary, "last_id": last_message_id, "now": time.time()})
+
+    def clear(self) -> None:
+        super().clear()
+        with self.engine.begin() as conn:
+            conn.execute(text(f'DELETE FROM "{self.table_name}_summaries" WHERE session_id = :sid'),
+                         {"sid": self.session_id})
+
+    def message_count(self) -> int:
+        row = self._session_row()
+        return row[0] if row else 0
+
+    def last_message_id(self) -> Optional[int]:
+        row = self._session_row()
+        return row[1] if row else None
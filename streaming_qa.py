@@ -0,0 +1,134 @@
+# 🌊 串流式 RAG 問答（取代 RetrievalQA.invoke 一次等完整答案）
+# 流程：檢索 → 先送出來源段落 → 模型一邊生成一邊送出文字 → 最後送出這次請求的延遲指標
+# 指標包含：檢索耗時（time_to_retrieval）、首字延遲（time_to_first_token）、生成速度（tokens_per_sec）
+# 使用者感受到的等待時間取決於「多快看到第一個字」，而不是整段回答多久生成完
+# llm.stream 不會經過 LLM 快取，這裡自己查詢 / 寫入（llm.cache 或 set_llm_cache 設定的全域快取），命中時整段回答一次送出
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from langchain.chains.retrieval_qa.prompt import PROMPT as DEFAULT_QA_PROMPT
+from langchain_core.caches import BaseCache
+from langchain_core.documents import Document
+from langchain_core.globals import get_llm_cache
+from langchain_core.language_models import BaseChatModel, BaseLLM
+from langchain_core.load import dumps
+from langchain_core.messages import AIMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.outputs import ChatGeneration, Generation
+from langchain_core.prompt_values import PromptValue
+from langchain_core.prompts import BasePromptTemplate
+from langchain_core.retrievers import BaseRetriever
+
+from token_counter import count_tokens
+
+
+def format_documents(documents: List[Document]) -> str:
+    return "\n\n".join(doc.page_content for doc in documents)
+
+
+def _resolve_cache(llm) -> Optional[BaseCache]:
+    """與 LangChain 相同：llm.cache 為 BaseCache 時用它，為 False 時不快取，否則用全域快取"""
+    cache = getattr(llm, "cache", None)
+    if isinstance(cache, BaseCache):
+        return cache
+    return None if cache is False else get_llm_cache()
+
+
+def _cache_entry(llm, prompt: PromptValue) -> Optional[Tuple[str, str]]:
+    """回傳與 llm.invoke 相同的快取鍵（提示詞, llm_string）；不支援的模型類型回傳 None"""
+    if isinstance(llm, BaseChatModel):
+        return dumps(prompt.to_messages()), llm._get_llm_string()
+    if isinstance(llm, BaseLLM):
+        return prompt.to_string(), str(sorted({**llm.dict(), "stop": None}.items()))
+    return None
+
+
+class StreamingRetrievalQA:
+    """檢索後先回傳來源，再逐字串流回答；每次請求都記錄延遲指標"""
+
+    def __init__(self, llm, retriever: BaseRetriever,
+                 prompt: BasePromptTemplate = DEFAULT_QA_PROMPT, max_history: int = 1000):
+        self.retriever = retriever
+        self.llm = llm
+        self.prompt = prompt
+        self.answer_chain = prompt | llm | StrOutputParser()
+        self.max_history = max_history
+        self.history: List[Dict[str, float]] = []
+
+    def stream(self, question: str) -> Iterator[Dict[str, Any]]:
+        """依序產生 {"type": "sources"}、多個 {"type": "token"}、最後一個 {"type": "metrics"} 事件"""
+        started = time.perf_counter()
+        documents = self.retriever.invoke(question)
+        retrieved = time.perf_counter()
+        yield {"type": "sources", "documents": documents}
+
+        inputs = {"context": format_documents(documents), "question": question}
+        cache = _resolve_cache(self.llm)
+        entry = _cache_entry(self.llm, self.prompt.invoke(inputs)) if cache is not None else None
+        cached = cache.lookup(*entry) if entry is not None else None
+
+        first_token: Optional[float] = None
+        parts = []
+        if cached:
+            # 💾 快取命中：整段回答當成一個片段送出
+            first_token = time.perf_counter()
+            parts.append("".join(generation.text for generation in cached))
+            yield {"type": "token", "text": parts[0]}
+        else:
+            for text in self.answer_chain.stream(inputs):
+                if not text:
+                    continue
+                if first_token is None:
+                    first_token = time.perf_counter()
+                parts.append(text)
+                yield {"type": "token", "text": text}
+        finished = time.perf_counter()
+        answer = "".join(parts)
+        if entry is not None and not cached:
+            generation = (ChatGeneration(message=AIMessage(content=answer))
+                          if isinstance(self.llm, BaseChatModel) else Generation(text=answer))
+            cache.update(*entry, [generation])
+
+        tokens = count_tokens(answer)
+        # 第一個字之後的生成速度；只有一個片段時改以整段生成時間（檢索完成到結束）計算，命中快取時不計
+        generating = finished - (first_token or finished)
+        if generating <= 0:
+            generating = finished - retrieved
+        metrics = {
+            "time_to_retrieval": round(retrieved - started, 4),
+            "time_to_first_token": round((first_token or finished) - started, 4),
+            "total_seconds": round(finished - started, 4),
+            "tokens": tokens,
+            "tokens_per_sec": round(tokens / generating, 1) if generating > 0 and not cached else None,
+            "cached": bool(cached),
+            "sources": len(documents),
+        }
+        self.history.append(metrics)
+        del self.history[:-self.max_history]
+        yield {"type": "metrics", "metrics": metrics}
+
+    def invoke(self, question: str) -> Dict[str, Any]:
+        """不需要串流時使用，回傳格式與 RetrievalQA（return_source_documents=True）相同"""
+        result = {"query": question, "result": "", "source_documents": []}
+        for event in self.stream(question):
+            if event["type"] == "sources":
+                result["source_documents"] = event["documents"]
+            elif event["type"] == "token":
+                result["result"] += event["text"]
+            else:
+                result["metrics"] = event["metrics"]
+        return result
+
+    def stats(self) -> Dict[str, float]:
+        """最近請求的首字延遲 p50 / p95 與平均生成速度"""
+        if not self.history:
+            return {"requests": 0}
+        ttft = sorted(m["time_to_first_token"] for m in self.history)
+        rates = [m["tokens_per_sec"] for m in self.history if m["tokens_per_sec"] is not None]
+        return {
+            "requests": len(self.history),
+            "ttft_p50": ttft[len(ttft) // 2],
+            "ttft_p95": ttft[min(len(ttft) - 1, int(len(ttft) * 0.95))],
+            "avg_time_to_retrieval": round(sum(m["time_to_retrieval"] for m in self.history) / len(self.history), 4),
+            "avg_tokens_per_sec": round(sum(rates) / len(rates), 1) if rates else None,
+        }
@@ -0,0 +1,134 @@
+# 🧾 串流式結構化輸出（Streaming Structured Output）
+# `prompt | llm | PydanticOutputParser` 要等模型全部生成完才開始解析，格式有一點錯整個請求就失敗
+# StructuredStreamer：
+# - 模型一邊生成一邊解析 JSON，欄位一有內容就送出部分結果（表單可以先填上已完成的欄位）
+# - 解析失敗時先在本機修復（去掉 ```json 區塊、補上括號、移除多餘逗號、字串與清單互轉），最後才請模型重寫
+# - 每個 Pydantic 類別的 parser 與格式說明只建立一次（快取）
+import json
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterator, Optional, Type, Union, get_origin
+
+from langchain.output_parsers import OutputFixingParser, PydanticOutputParser
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import BasePromptTemplate
+from langchain_core.utils.json import parse_partial_json
+from pydantic import BaseModel, ValidationError
+
+from prompt_compiler import CompiledPrompt
+
+_FENCE = re.compile(r"```(?:json)?", re.IGNORECASE)
+_TRAILING_COMMA = re.compile(r",\s*([\]}])")
+_LIST_SPLIT = re.compile(r"[、,，;；\n]+")
+_STRUCTURAL = set('",]}:')
+
+
+@lru_cache(maxsize=None)
+def get_parser(model: Type[BaseModel]) -> PydanticOutputParser:
+    return PydanticOutputParser(pydantic_object=model)
+
+
+@lru_cache(maxsize=None)
+def get_format_instructions(model: Type[BaseModel]) -> str:
+    """格式說明會把整個 JSON schema 序列化，同一個類別只需要做一次"""
+    return get_parser(model).get_format_instructions()
+
+
+def _json_body(text: str) -> Optional[str]:
+    text = _FENCE.sub("", text)
+    start = text.find("{")
+    return text[start:] if start >= 0 else None
+
+
+def parse_partial(text: str) -> Optional[Dict[str, Any]]:
+    """解析尚未生成完的 JSON：未結束的字串、清單與物件會自動補齊"""
+    body = _json_body(text)
+    if body is None:
+        return None
+    try:
+        data = parse_partial_json(_TRAILING_COMMA.sub(r"\1", body))
+    except json.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _coerce(model: Type[BaseModel], data: Dict[str, Any]) -> Dict[str, Any]:
+    """依欄位型別修正常見的格式錯誤：清單欄位給了字串就拆開，字串欄位給了清單就接起來"""
+    fixed = dict(data)
+    for name, field in model.model_fields.items():
+        value = fixed.get(name)
+        if value is None:
+            continue
+        if get_origin(field.annotation) is list and isinstance(value, str):
+            fixed[name] = [part.strip(" -•") for part in _LIST_SPLIT.split(value) if part.strip(" -•")]
+        elif field.annotation is str and isinstance(value, list):
+            fixed[name] = "、".join(str(v) for v in value)
+        elif field.annotation is str and not isinstance(value, str):
+            fixed[name] = str(value)
+    return fixed
+
+
+def repair(model: Type[BaseModel], text: str) -> BaseModel:
+    """在本機修復模型輸出；修不好時拋出 OutputParserException"""
+    data = parse_partial(text)
+    if data is None:
+        raise OutputParserException(f"找不到 JSON 物件：{text[:80]}")
+    # 有些模型會把結果包在 {"properties": {...}} 之類的外層裡
+    if not set(data) & set(model.model_fields) and len(data) == 1 and isinstance(next(iter(data.values())), dict):
+        data = next(iter(data.values()))
+    try:
+        return model.model_validate(_coerce(model, data))
+    except ValidationError as e:
+        raise OutputParserException(str(e), llm_output=text) from e
+
+
+class StructuredStreamer:
+    """prompt（需要 {format_instructions}）| llm 的串流版本，邊生成邊解析成 Pydantic 物件"""
+
+    def __init__(self, prompt: Union[BasePromptTemplate, CompiledPrompt], llm, model: Type[BaseModel], max_reasks: int = 1):
+        self.model = model
+        self.parser = get_parser(model)
+        self.chain = prompt.partial(format_instructions=get_format_instructions(model)) | llm | StrOutputParser()
+        self.fixer = OutputFixingParser.from_llm(llm=llm, parser=self.parser, max_retries=max_reasks)
+        self.stats = {"parsed": 0, "repaired": 0, "reasked": 0, "failed": 0}
+
+    def stream(self, inputs: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """產生 {"type": "partial", "data": 目前解析出的欄位} 事件，最後是 {"type": "final", "result": 物件}"""
+        text, last = "", None
+        for chunk in self.chain.stream(inputs):
+            text += chunk
+            if not _STRUCTURAL.intersection(chunk):
+                continue  # 沒有新的結構符號，欄位內容不會有實質變化，省下一次解析
+            data = parse_partial(text)
+            if data and data != last:
+                last = data
+                yield {"type": "partial", "data": data}
+        yield {"type": "final", **self._finish(text)}
+
+    def _finish(self, text: str) -> Dict[str, Any]:
+        try:
+            result = self.parser.parse(text)
+            self.stats["parsed"] += 1
+            return {"result": result, "repaired": False, "reasked": False}
+        except OutputParserException:
+            pass
+        try:
+            result = repair(self.model, text)
+            self.stats["repaired"] += 1
+            return {"result": result, "repaired": True, "reasked": False}
+        except OutputParserException:
+            pass
+        # 🆘 最後手段：把錯誤與格式說明交給模型重寫一次
+        try:
+            result = self.fixer.parse(text)
+        except OutputParserException:
+            self.stats["failed"] += 1
+            raise
+        self.stats["reasked"] += 1
+        return {"result": result, "repaired": True, "reasked": True}
+
+    def invoke(self, inputs: Dict[str, Any]) -> BaseModel:
+        for event in self.stream(inputs):
+            if event["type"] == "final":
+                return event["result"]
@@ -0,0 +1,33 @@
+# 🔢 快速的本機 token 估算
+# 不需要下載任何 tokenizer：中日韓文字大約一字一個 token，英數字大約每 4 個字元一個 token
+# 只用來做「預算」與「裁切」的判斷，誤差幾個 token 不影響結果，但速度比真正的 tokenizer 快很多
+import re
+from typing import Iterable
+
+from langchain_core.messages import BaseMessage
+
+_CJK = re.compile(r"[぀-ヿ㐀-䶿一-鿿豈-﫿가-힯]")
+_WORD = re.compile(r"[A-Za-z0-9_]+")
+_SPACE = re.compile(r"\s")
+_MESSAGE_OVERHEAD = 4  # 每則訊息的角色標記等額外 token
+
+
+def count_tokens(text: str) -> int:
+    cjk = len(_CJK.findall(text))
+    words = _WORD.findall(text)
+    word_chars = sum(len(w) for w in words)
+    # 其餘的標點與符號，每個算一個 token（空白不算）
+    others = len(text) - cjk - word_chars - len(_SPACE.findall(text))
+    return cjk + sum((len(w) + 3) // 4 for w in words) + max(0, others)
+
+
+def _content_text(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return " ".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+
+
+def count_message_tokens(messages: Iterable[BaseMessage]) -> int:
+    """估算一串訊息的 token 數（可直接當作 trim_messages 的 token_counter）"""
+    return sum(count_tokens(_content_text(m)) + _MESSAGE_OVERHEAD for m in messages)
@@ -0,0 +1,181 @@
+# 🧰 Agent 工具結果快取與迴圈偵測
+# ReAct Agent 常在同一次執行裡，用同樣的輸入重複呼叫同一個工具（例如 RAG_DocQA、duckduckgo_search）
+# 每一次重複都是一次完整的文件問答或網路搜尋，又慢又浪費
+# - ToolCache.wrap(tools)：同一次執行內相同輸入只呼叫一次；有設定 TTL 的工具結果另外存進 SQLite，跨執行共用
+#   結果取決於外部資料的工具（例如 RAG_DocQA 依賴的索引）可設定 versions，資料改變後舊的跨執行結果就不會再被使用
+# - run_agent()：以 agent.iter() 逐步執行，偵測到重複的 Thought/Action（同工具 + 同輸入）就提早結束
+# - 每一步工具呼叫的耗時與快取來源都會記錄下來（run_agent 回傳的 tool_steps），方便找出最慢的工具
+# - 「本次執行」的快取與步驟紀錄存在 ToolRun 裡（以 contextvars 追蹤），同時執行多個 Agent 也不會互相覆蓋
+import contextvars
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from langchain_core.agents import AgentAction
+from langchain_core.tools import BaseTool
+
+
+def normalize_tool_input(tool_input: Any) -> str:
+    """Agent 產生的輸入常帶有多餘的引號與空白，正規化後才能判斷是不是「同一個問題」"""
+    if isinstance(tool_input, str):
+        return " ".join(tool_input.strip().strip("'\"`").split())
+    return json.dumps(tool_input, ensure_ascii=False, sort_keys=True, default=str)
+
+
+class MemoizedTool(BaseTool):
+    """包住原本的工具：名稱、說明與參數格式不變，呼叫前先查快取"""
+
+    inner: BaseTool
+    cache: Any
+
+    def _run(self, *args: Any, **kwargs: Any) -> Any:
+        kwargs.pop("run_manager", None)
+        tool_input = args[0] if args else kwargs
+        return self.cache.call(self.inner, tool_input)
+
+
+class ToolRun:
+    """一次 Agent 執行的狀態：同一次執行內的快取與每一步的工具紀錄"""
+
+    def __init__(self):
+        self.cache: Dict[Tuple[str, str], Any] = {}
+        self.steps: List[dict] = []
+
+
+# 目前這個執行緒 / async task 正在進行的 ToolRun；沒有呼叫 start_run 時為 None（只使用跨執行快取）
+_current_run: contextvars.ContextVar[Optional[ToolRun]] = contextvars.ContextVar("tool_run", default=None)
+
+
+class ToolCache:
+    """工具結果快取：同一次執行內的記憶體快取 + 依工具設定 TTL 的 SQLite 跨執行快取"""
+
+    def __init__(self, db_path: str = "tool_cache.db", ttls: Optional[Dict[str, float]] = None,
+                 verbose: bool = True, versions: Optional[Dict[str, Union[str, Callable[[], str]]]] = None):
+        # ttls：工具名稱 → 跨執行快取的秒數；沒有列出的工具只在同一次執行內快取
+        # versions：工具名稱 → 資料版本（字串或回傳字串的函式，例如 IncrementalIndex.version），會加進跨執行快取的鍵
+        self.ttls = ttls or {}
+        self.versions = versions or {}
+        self.verbose = verbose
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tool_cache ("
+            "tool TEXT NOT NULL, input TEXT NOT NULL, output TEXT NOT NULL, created_at REAL NOT NULL, "
+            "PRIMARY KEY (tool, input))"
+        )
+        self._conn.commit()
+        self.totals = Counter()
+
+    def wrap(self, tools: List[BaseTool]) -> List[BaseTool]:
+        """只傳入結果固定（deterministic）的工具；會隨時間變動的工具請設定較短的 TTL"""
+        return [MemoizedTool(name=t.name, description=t.description, args_schema=t.args_schema,
+                             return_direct=t.return_direct, inner=t, cache=self) for t in tools]
+
+    def start_run(self) -> ToolRun:
+        """每次 Agent 執行前呼叫：在目前的 context 開始新的一次執行（新的快取與步驟紀錄）"""
+        run = ToolRun()
+        _current_run.set(run)
+        return run
+
+    @property
+    def steps(self) -> List[dict]:
+        """目前 context 這次執行的步驟紀錄"""
+        run = _current_run.get()
+        return list(run.steps) if run is not None else []
+
+    def _disk_key(self, name: str, key: str) -> str:
+        version = self.versions.get(name)
+        if version is None:
+            return key
+        return f"{version() if callable(version) else version}\0{key}"
+
+    def _lookup(self, run: Optional[ToolRun], name: str, key: str) -> Tuple[Optional[str], Any]:
+        disk_key = self._disk_key(name, key)
+        with self._lock:
+            if run is not None and (name, key) in run.cache:
+                return "run", run.cache[(name, key)]
+            ttl = self.ttls.get(name)
+            if not ttl:
+                return None, None
+            row = self._conn.execute(
+                "SELECT output, created_at FROM tool_cache WHERE tool = ? AND input = ?", (name, disk_key)
+            ).fetchone()
+        if row and time.time() - row[1] <= ttl:
+            return "disk", json.loads(row[0])
+        return None, None
+
+    def _store(self, run: Optional[ToolRun], name: str, key: str, output: Any) -> None:
+        disk_key = self._disk_key(name, key) if self.ttls.get(name) else None
+        with self._lock:
+            if run is not None:
+                run.cache[(name, key)] = output
+            if disk_key is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO tool_cache (tool, input, output, created_at) VALUES (?, ?, ?, ?)",
+                    (name, disk_key, json.dumps(output, ensure_ascii=False, default=str), time.time()),
+                )
+                self._conn.commit()
+
+    def call(self, tool: BaseTool, tool_input: Any) -> Any:
+        key = normalize_tool_input(tool_input)
+        run = _current_run.get()
+        started = time.perf_counter()
+        source, output = self._lookup(run, tool.name, key)
+        if source is None:
+            source = "call"
+            output = tool.invoke(tool_input)
+            self._store(run, tool.name, key, output)
+        elif source == "disk" and run is not None:
+            with self._lock:
+                run.cache[(tool.name, key)] = output
+        seconds = time.perf_counter() - started
+        with self._lock:
+            steps = run.steps if run is not None else []
+            step = {"step": len(steps) + 1, "tool": tool.name, "input": key,
+                    "seconds": round(seconds, 4), "source": source}
+            steps.append(step)
+            self.totals[source] += 1
+        if self.verbose:
+            label = {"call": "實際呼叫", "run": "本次快取", "disk": "跨執行快取"}[source]
+            print(f"\n⏱️ 第 {step['step']} 步 {tool.name}（{label}）：{step['seconds']}s")
+        return output
+
+    def stats(self) -> dict:
+        calls = sum(self.totals.values())
+        return {**self.totals, "hit_rate": round(1 - self.totals["call"] / calls, 3) if calls else 0.0}
+
+
+class RepeatDetector:
+    """同一個工具 + 同一個輸入出現 max_repeats 次，就判定 Agent 在原地打轉"""
+
+    def __init__(self, max_repeats: int = 2):
+        self.max_repeats = max_repeats
+        self._seen = Counter()
+
+    def is_repeat(self, action: AgentAction) -> bool:
+        key = (action.tool, normalize_tool_input(action.tool_input))
+        self._seen[key] += 1
+        return self._seen[key] >= self.max_repeats
+
+
+def run_agent(agent_executor, question: Any, cache: Optional[ToolCache] = None,
+              max_repeats: int = 2, verbose: Optional[bool] = None) -> Dict[str, Any]:
+    """逐步執行 Agent；偵測到重複的動作時提早結束，最後一次的工具結果放在 observation（不當成答案）"""
+    if verbose is None:
+        verbose = cache.verbose if cache is not None else True
+    inputs = question if isinstance(question, dict) else {"input": question}
+    run = cache.start_run() if cache is not None else ToolRun()
+    detector = RepeatDetector(max_repeats)
+    for step in agent_executor.iter(inputs):
+        if "intermediate_step" not in step:
+            return {**inputs, **{k: v for k, v in step.items() if k != "messages"}, "tool_steps": run.steps}
+        for action, observation in step["intermediate_step"]:
+            if detector.is_repeat(action):
+                if verbose:
+                    print(f"\n🔁 偵測到重複的動作 {action.tool}({normalize_tool_input(action.tool_input)})，提早結束")
+                return {**inputs, "output": f"Agent 重複執行相同的動作（{action.tool}），已提早結束，沒有產生最終答案。",
+                        "observation": str(observation), "stopped_early": True, "tool_steps": run.steps}
+    return {**inputs, "output": "Agent stopped due to iteration limit or time limit.", "tool_steps": run.steps}
@@ -0,0 +1,105 @@
+# 🗺️ 全台縣市天氣批次預取與日報
+# C18 的 get_weather 一次只查一個縣市，chain 也是一個縣市跑一次 LLM；做 22 縣市日報就要串行 22 輪
+# - WeatherPrefetcher：以執行緒池同時查詢所有縣市，結果放進 http_runtime 的共用快取；可在背景定期更新
+# - trim_weather：只保留提示詞需要的欄位，並輸出緊湊的 JSON，減少 prompt 的 token 數
+# - summarize_counties：每個縣市一份摘要，以有上限的並行數一次送出，結果依縣市順序回傳
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+TAIWAN_COUNTIES = [
+    "臺北市", "新北市", "桃園市", "臺中市", "臺南市", "高雄市",
+    "基隆市", "新竹市", "嘉義市",
+    "新竹縣", "苗栗縣", "彰化縣", "南投縣", "雲林縣", "嘉義縣", "屏東縣",
+    "宜蘭縣", "花蓮縣", "臺東縣", "澎湖縣", "金門縣", "連江縣",
+]
+
+# 天氣 API 的欄位名稱並不固定，這裡列出常見的名稱；可以依實際的回應格式傳入自己的欄位清單
+WEATHER_FIELDS = {
+    "city", "county", "locationName", "location", "records", "forecast", "data", "weatherElement",
+    "date", "time", "startTime", "endTime", "elementName", "elementValue", "parameter", "parameterName",
+    "weather", "description", "Wx", "min_temp", "max_temp", "MinT", "MaxT", "T", "temperature",
+    "rain_prob", "PoP", "PoP12h", "CI", "humidity", "RH", "value",
+}
+# 只描述地點、時間或欄位名稱的鍵：裁切後只剩這些，代表真正的天氣數值都被丟掉了
+_CONTEXT_FIELDS = {"city", "county", "locationName", "location", "date", "time", "startTime", "endTime", "elementName"}
+
+
+def _trim(value: Any, fields: set) -> Any:
+    if isinstance(value, dict):
+        return {k: _trim(v, fields) for k, v in value.items() if k in fields}
+    if isinstance(value, list):
+        return [_trim(v, fields) for v in value]
+    return value
+
+
+def _has_weather(value: Any, key: Optional[str] = None) -> bool:
+    """裁切後是否還留有任何天氣數值（地點、時間等描述欄位不算）"""
+    if isinstance(value, dict):
+        return any(_has_weather(v, k) for k, v in value.items())
+    if isinstance(value, list):
+        return any(_has_weather(v, key) for v in value)
+    return key not in _CONTEXT_FIELDS and value not in (None, "")
+
+
+def trim_weather(data: Any, fields: Optional[Iterable[str]] = None) -> str:
+    """保留指定欄位並輸出緊湊的 JSON 字串；若裁切後沒有留下任何天氣數值（格式不同），就保留原始資料"""
+    trimmed = _trim(data, set(fields or WEATHER_FIELDS))
+    if not _has_weather(trimmed):
+        trimmed = data
+    return json.dumps(trimmed, ensure_ascii=False, separators=(",", ":"))
+
+
+class WeatherPrefetcher:
+    """同時預取多個縣市的天氣，並可在背景定期更新共用快取"""
+
+    def __init__(self, fetch: Callable[..., Any], counties: List[str] = TAIWAN_COUNTIES,
+                 max_workers: int = 8):
+        # fetch(city, refresh=False)：例如 lambda city, refresh=False: http_runtime.get_json(url, {"city": city}, refresh)
+        self.fetch = fetch
+        self.counties = counties
+        self.max_workers = max_workers
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.errors: Dict[str, str] = {}
+
+    def prefetch(self, counties: Optional[List[str]] = None, refresh: bool = False) -> Dict[str, Any]:
+        """同時查詢所有縣市，回傳 {縣市: 天氣資料}；失敗的縣市記錄在 self.errors"""
+        counties = counties or self.counties
+        results: Dict[str, Any] = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {city: pool.submit(self.fetch, city, refresh) for city in counties}
+        for city, future in futures.items():
+            try:
+                results[city] = future.result()
+                self.errors.pop(city, None)
+            except Exception as e:
+                self.errors[city] = str(e)
+        return results
+
+    def start(self, interval: float = 9 * 60) -> None:
+        """在背景每 interval 秒強制更新一次（比快取的有效時間短一點，使用者就不會遇到過期的資料）"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.wait(interval):
+                self.prefetch(refresh=True)
+        self._thread = threading.Thread(target=loop, name="weather-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def summarize_counties(chain, weather_by_city: Dict[str, Any], max_concurrency: int = 4,
+                       fields: Optional[Iterable[str]] = None) -> Dict[str, str]:
+    """每個縣市產生一份摘要；chain 的輸入為 {"city", "weather"}，以執行緒池限制同時送出的數量"""
+    cities = list(weather_by_city)
+    inputs = [{"city": city, "weather": trim_weather(weather_by_city[city], fields)} for city in cities]
+    # ⚠️ LLM.batch 在同一批內仍是逐一生成，改用執行緒池才會真的並行
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        summaries = list(pool.map(chain.invoke, inputs))
+    return dict(zip(cities, summaries))